@@ -0,0 +1,244 @@
+#!/usr/bin/env python3
+"""
+Analyze a stress_benchmark.py per-request result CSV (bench_*.result.csv).
+
+Replaces calc_result.sh: success/failure counts, exact latency percentiles
+(nearest rank, as calc_p99.awk picks them, but without bucketing on the raw
+float strings), mean/variance and TPS. The file is read in chunks of rows
+with np.loadtxt, in parallel worker processes, so soak tests with millions of
+requests take seconds.
+
+Columns: question_len, answer_len, first_chunk, overall, err, code, tm_start,
+tm_end, client. Latency statistics use successful (code 200) requests.
+
+TPS is requests / (last tm_end - first tm_start) as in calc_result.sh. The
+steady-state TPS only counts requests finished while every client was
+running: after the last client sent its first request and before the first
+client finished its last one, so worker start-up (-u) and the drain at the
+end do not dilute it. --skip_start/--skip_end trim fixed seconds instead.
+
+Example:
+    python analyze_results.py bench_0620-1030_c-64.result.csv --json bench_0620-1030_c-64.analysis.json
+"""
+
+import argparse
+import csv
+import io
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+COLUMNS = ["question_len", "answer_len", "first_chunk", "overall", "err", "code", "tm_start", "tm_end", "client"]
+# every column but err, which is free text
+NUMERIC = [name for name in COLUMNS if name != "err"]
+USECOLS = [COLUMNS.index(name) for name in NUMERIC]
+PERCENTILES = [50, 66, 80, 85, 90, 95, 98, 99, 99.9, 99.99, 100]
+CHUNK_BYTES = 64 * 1024 * 1024
+
+
+def _csv_rows(text):
+    """Slow path: numeric columns of the well-formed rows, via the csv module."""
+    rows = []
+    for row in csv.reader(io.StringIO(text)):
+        if len(row) < len(COLUMNS):
+            continue
+        try:
+            rows.append([float(row[i] or "nan") for i in USECOLS])
+        except ValueError:
+            # header or a broken line
+            continue
+    return np.array(rows, dtype=np.float64).reshape(-1, len(USECOLS))
+
+
+def parse_chunk(text):
+    """
+    (rows, numeric columns) array of a block of whole CSV lines.
+
+    Empty fields (None results) become NaN; np.loadtxt parses everything in C
+    and skips err, quoted or not. Blocks it rejects (a header, a broken line,
+    an error message spanning lines) fall back to the csv module.
+    """
+    if not text.endswith("\n"):
+        text += "\n"
+    filled = ("\n" + text).replace(",,", ",nan,").replace(",,", ",nan,").replace(",\n", ",nan\n")
+    filled = filled.replace("\n,", "\nnan,")
+    try:
+        return np.loadtxt(io.StringIO(filled), delimiter=",", usecols=USECOLS, quotechar='"', ndmin=2)
+    except ValueError:
+        return _csv_rows(text)
+
+
+def parse_range(path, start, end):
+    """Parse the lines starting in bytes [start, end) of the file."""
+    with open(path, "rb") as f:
+        if start:
+            # the line running over start belongs to the previous range
+            f.seek(start - 1)
+            f.readline()
+        data = f.read(max(end - f.tell(), 0)) if f.tell() < end else b""
+        if data and not data.endswith(b"\n"):
+            data += f.readline()
+    return parse_chunk(data.decode("utf8", errors="replace")) if data else np.empty((0, len(USECOLS)))
+
+
+def read_chunks(path, chunk_bytes=CHUNK_BYTES, workers=1):
+    """Yield {column: array} per chunk_bytes of the file, parsed by workers processes."""
+    size = os.path.getsize(path)
+    ranges = [(start, min(start + chunk_bytes, size)) for start in range(0, size, chunk_bytes)]
+    if workers > 1 and len(ranges) > 1:
+        pool = ProcessPoolExecutor(max_workers=workers)
+        arrays = pool.map(parse_range, *zip(*[(path, start, end) for start, end in ranges]))
+    else:
+        pool = None
+        arrays = (parse_range(path, start, end) for start, end in ranges)
+    try:
+        for array in arrays:
+            yield {name: array[:, i] for i, name in enumerate(NUMERIC)}
+    finally:
+        if pool:
+            pool.shutdown()
+
+
+def load_results(path, chunk_bytes=CHUNK_BYTES, workers=1):
+    """Concatenated columns: all requests' code/timestamps/client, successful requests' latencies."""
+    parts = {"code": [], "tm_start": [], "tm_end": [], "client": [], "first_chunk": [], "overall": [],
+             "question_len": []}
+    for chunk in read_chunks(path, chunk_bytes, workers):
+        ok = chunk["code"] == 200
+        for name in ["code", "tm_start", "tm_end", "question_len"]:
+            parts[name].append(chunk[name])
+        parts["client"].append(np.nan_to_num(chunk["client"], nan=-1).astype(np.int64))
+        for name in ["first_chunk", "overall"]:
+            parts[name].append(chunk[name][ok])
+    return {name: np.concatenate(arrays) if arrays else np.empty(0) for name, arrays in parts.items()}
+
+
+def latency_stats(values, percentiles=PERCENTILES):
+    """Exact nearest-rank percentiles with the number of requests at or below each, plus mean and variance."""
+    values = np.sort(values[~np.isnan(values)])
+    n = len(values)
+    if n == 0:
+        return None
+    rows = []
+    for p in percentiles:
+        value = values[max(int(np.ceil(n * p / 100)) - 1, 0)]
+        rows.append({"percentile": p, "value": float(value),
+                     "count": int(np.searchsorted(values, value, side="right"))})
+    return {
+        "count": n,
+        "min": float(values[0]),
+        "max": float(values[-1]),
+        "mean": float(values.mean()),
+        "variance": float(values.var(ddof=1)) if n > 1 else 0.0,
+        "std": float(values.std(ddof=1)) if n > 1 else 0.0,
+        "percentiles": rows,
+    }
+
+
+def steady_window(tm_start, tm_end, client, skip_start=None, skip_end=None):
+    """(start, end) of the steady-state window, see the module docstring."""
+    run_start, run_end = np.nanmin(tm_start), np.nanmax(tm_end)
+    if skip_start is not None or skip_end is not None:
+        return run_start + (skip_start or 0.0), run_end - (skip_end or 0.0)
+    clients, index = np.unique(client, return_inverse=True)
+    first_start = np.full(len(clients), np.inf)
+    last_end = np.full(len(clients), -np.inf)
+    np.minimum.at(first_start, index, np.nan_to_num(tm_start, nan=np.inf))
+    np.maximum.at(last_end, index, np.nan_to_num(tm_end, nan=-np.inf))
+    return float(first_start.max()), float(last_end.min())
+
+
+def analyze(results, skip_start=None, skip_end=None):
+    code, tm_start, tm_end = results["code"], results["tm_start"], results["tm_end"]
+    total = len(code)
+    if total == 0:
+        raise ValueError("no requests in the result file")
+    success = int(np.count_nonzero(code == 200))
+    codes, code_counts = np.unique(np.nan_to_num(code, nan=-1).astype(np.int64), return_counts=True)
+
+    run_start, run_end = float(np.nanmin(tm_start)), float(np.nanmax(tm_end))
+    window_start, window_end = steady_window(tm_start, tm_end, results["client"], skip_start, skip_end)
+    in_window = (tm_end >= window_start) & (tm_end <= window_end)
+    window = window_end - window_start
+    steady = int(np.count_nonzero(in_window))
+    steady_success = int(np.count_nonzero(in_window & (code == 200)))
+
+    return {
+        "total_requests": total,
+        "success": success,
+        "failed": total - success,
+        "status_codes": {("none" if c == -1 else str(c)): int(n) for c, n in zip(codes, code_counts)},
+        "run_start": run_start,
+        "run_end": run_end,
+        "duration": run_end - run_start,
+        "tps": total / (run_end - run_start) if run_end > run_start else 0.0,
+        "steady_start": window_start,
+        "steady_end": window_end,
+        "steady_requests": steady,
+        "steady_tps": steady / window if window > 0 else 0.0,
+        "steady_success_tps": steady_success / window if window > 0 else 0.0,
+        "overall": latency_stats(results["overall"]),
+        "first_chunk": latency_stats(results["first_chunk"]),
+        "question_len": latency_stats(results["question_len"], [50, 90, 99, 100]),
+    }
+
+
+def print_latency(name, stats):
+    print(f"\n{name} distribution ({stats['count']} successful requests):")
+    print(f"{'static':<8}{'cost':>14}{'count':>12}{'diffPre':>12}")
+    previous = 0
+    for row in stats["percentiles"]:
+        print(f"P{row['percentile']:<7}{row['value']:>14.6f}{row['count']:>12}{row['count'] - previous:>12}")
+        previous = row["count"]
+    print(f"average cost: {stats['mean']:.6f}")
+    print(f"variance cost: {stats['variance']:.6f} (std {stats['std']:.6f})")
+    print(f"min/max cost: {stats['min']:.6f} / {stats['max']:.6f}")
+
+
+def print_report(report):
+    print(f"SUCCESS:{report['success']}")
+    print(f"FAILED:{report['failed']}")
+    if report["failed"]:
+        print("Status codes: " + ", ".join(f"{c}={n}" for c, n in report["status_codes"].items()))
+    for name in ["overall", "first_chunk"]:
+        if report[name]:
+            print_latency(name, report[name])
+    print(f"\nTPS: {report['tps']:.2f} ({report['total_requests']} requests in {report['duration']:.2f}s)")
+    window = report["steady_end"] - report["steady_start"]
+    if window > 0:
+        print(f"Steady-state TPS: {report['steady_tps']:.2f} (successful: {report['steady_success_tps']:.2f}), "
+              f"{report['steady_requests']} requests in {window:.2f}s "
+              f"[+{report['steady_start'] - report['run_start']:.2f}s, "
+              f"-{report['run_end'] - report['steady_end']:.2f}s]")
+    else:
+        print("Steady-state TPS: no window where all clients were running")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Analyze a stress_benchmark.py result CSV",
+                                     formatter_class=argparse.RawDescriptionHelpFormatter, epilog=__doc__)
+    parser.add_argument("result_csv", type=str, help="bench_*.result.csv file")
+    parser.add_argument("--skip_start", type=float, default=None,
+                        help="Seconds to drop at the start instead of the automatic steady-state window")
+    parser.add_argument("--skip_end", type=float, default=None,
+                        help="Seconds to drop at the end instead of the automatic steady-state window")
+    parser.add_argument("--chunk_mb", type=int, default=CHUNK_BYTES // 1024 // 1024, help="MB of the file per chunk")
+    parser.add_argument("--workers", type=int, default=min(os.cpu_count() or 1, 8),
+                        help="Processes parsing chunks in parallel (default: CPUs, at most 8)")
+    parser.add_argument("--json", type=str, default=None, help="Also write the analysis to this JSON file")
+    args = parser.parse_args()
+
+    start = time.time()
+    report = analyze(load_results(args.result_csv, args.chunk_mb * 1024 * 1024, args.workers), args.skip_start, args.skip_end)
+    print_report(report)
+    print(f"\nAnalyzed {report['total_requests']} rows in {time.time() - start:.2f}s")
+    if args.json:
+        with open(args.json, "w", encoding="utf8") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
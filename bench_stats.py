@@ -0,0 +1,96 @@
+"""
+Bootstrap confidence intervals for benchmark results, vectorized with NumPy.
+
+Every resampling draws all resamples at once as an index (or multinomial count)
+matrix, so 10000 resamples of a few thousand requests take milliseconds.
+Resampled statistics are returned as arrays, so derived quantities (ratios,
+differences) are computed resample by resample before taking the interval.
+"""
+
+import numpy as np
+
+N_RESAMPLES = 10000
+CONFIDENCE = 0.95
+
+
+def _rng(seed):
+    return seed if isinstance(seed, np.random.Generator) else np.random.default_rng(seed)
+
+
+def bootstrap_means(samples, n_resamples=N_RESAMPLES, seed=None):
+    """Means of n_resamples resamples (with replacement) of samples."""
+    samples = np.asarray(samples, dtype=np.float64)
+    index = _rng(seed).integers(0, len(samples), size=(n_resamples, len(samples)))
+    return samples[index].mean(axis=1)
+
+
+def histogram_means(le, counts, n_resamples=N_RESAMPLES, seed=None):
+    """
+    Means of resampled requests from a latency histogram.
+
+    le are the bucket upper bounds, the last one may be inf (overflow); a
+    bucket's requests count at its geometric midpoint, the overflow at its
+    lower bound. Resampling is a multinomial draw of the bucket counts.
+    """
+    le = np.asarray(le, dtype=np.float64)
+    counts = np.asarray(counts, dtype=np.float64)
+    lower = np.concatenate(([le[0] / 2], le[:-1]))
+    values = np.sqrt(lower * np.where(np.isinf(le), lower, le))
+    total = int(counts.sum())
+    draws = _rng(seed).multinomial(total, counts / total, size=n_resamples)
+    return draws @ values / total
+
+
+def interval(resampled, confidence=CONFIDENCE):
+    """(low, high) percentile interval of resampled statistics."""
+    tail = (1 - confidence) / 2 * 100
+    low, high = np.nanpercentile(resampled, [tail, 100 - tail])
+    return float(low), float(high)
+
+
+def histogram_percentiles(counts, le, percentiles):
+    """
+    Percentiles of rows of histogram counts, {p: array with one value per row}.
+
+    counts is (rows, buckets) for the upper bounds le (the last may be inf).
+    Within a bucket the value is interpolated geometrically, so the buckets'
+    2^(1/4) spacing does not quantize the result.
+    """
+    le = np.asarray(le, dtype=np.float64)
+    counts = np.atleast_2d(np.asarray(counts, dtype=np.float64))
+    lower = np.concatenate(([le[0] / 2], le[:-1]))
+    upper = np.where(np.isinf(le), lower, le)
+    cumulative = counts.cumsum(axis=1)
+    total = cumulative[:, -1]
+    rows = np.arange(len(counts))
+    result = {}
+    for p in percentiles:
+        rank = np.maximum(np.ceil(total * p / 100), 1)
+        bucket = (cumulative >= rank[:, None]).argmax(axis=1)
+        before = cumulative[rows, bucket] - counts[rows, bucket]
+        fraction = (rank - before) / np.maximum(counts[rows, bucket], 1)
+        result[p] = lower[bucket] * (upper[bucket] / lower[bucket]) ** fraction
+    return result
+
+
+def bootstrap_histogram_percentiles(trial_counts, le, percentiles, n_resamples=N_RESAMPLES, seed=None):
+    """
+    Resampled percentiles of the requests of one or more trials, {p: array of n_resamples}.
+
+    trial_counts is (trials, buckets). With several trials the resampling is
+    two-level: trials with replacement, then requests from the pooled
+    histogram of the picked trials, so run-to-run noise widens the interval.
+    """
+    rng = _rng(seed)
+    trial_counts = np.atleast_2d(np.asarray(trial_counts, dtype=np.float64))
+    trials = len(trial_counts)
+    picked = trial_counts[rng.integers(0, trials, size=(n_resamples, trials))].sum(axis=1)
+    totals = picked.sum(axis=1, keepdims=True)
+    total = int(trial_counts.sum())
+    draws = rng.multinomial(total, picked / np.maximum(totals, 1))
+    return histogram_percentiles(draws, le, percentiles)
+
+
+def relative_width(low, high, point):
+    """CI width relative to the point estimate, inf when the point is 0."""
+    return (high - low) / abs(point) if point else float("inf")
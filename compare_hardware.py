@@ -0,0 +1,234 @@
+#!/usr/bin/env python3
+"""
+Cross-hardware comparison (e.g. Xeon vs Gaudi) from the results database.
+
+Runs are joined across the hardware tag on (tool, model, dataset,
+concurrency); runs without a throughput (e.g. imported rerank logs lacking
+the test time) are left out, so a cell needs runs with one on both sides.
+Per cell the report gives the throughput of both sides, the target/baseline
+speedup with a bootstrap confidence interval, throughput per compute unit
+and the per-unit ratio, so the cost question "how many Xeon cores does one
+card replace" is answered directly.
+
+Compute units come from the run tags the loop scripts record:
+  devices   HABANA_VISIBLE_DEVICES of the serving container ("0", "0,1"),
+            counted as cards (the run environment's HABANA_VISIBLE_DEVICES
+            is used when the tag is missing)
+  cpuset    cpuset of the serving container ("24-55,136-167"), counted as
+            logical CPUs
+--units hardware=N overrides both, e.g. for runs recorded without the tags.
+
+The confidence interval resamples the trials when both sides have two or
+more, otherwise the requests of the latency histogram, turned into QPS by
+Little's law (QPS x mean latency is constant in a closed loop); the latter
+only covers request-level noise, not run-to-run noise. Speedups whose
+interval contains 1 are marked "n.s.".
+
+Example:
+    python compare_hardware.py --baseline xeon --target hpu -o hardware_report.html
+"""
+
+import argparse
+import os
+
+import numpy as np
+
+from bench_stats import CONFIDENCE, N_RESAMPLES, bootstrap_means, histogram_means, interval
+from report_html import line_chart, page, table
+from results_db import (DEFAULT_DB, LATENCY_BUCKETS, LATENCY_HISTOGRAM, connect, histogram_counts, query_runs,
+                        run_metrics)
+
+
+def count_cpus(cpuset):
+    """Logical CPUs in a cpuset list such as "24-55,136-167"."""
+    total = 0
+    for part in cpuset.split(","):
+        low, _, high = part.strip().partition("-")
+        if low:
+            total += int(high or low) - int(low) + 1
+    return total
+
+
+def run_units(run, overrides):
+    """(count, unit name) of the compute the run's server used, (None, None) if unknown."""
+    hardware = run["tags"].get("hardware", "")
+    if hardware in overrides:
+        return overrides[hardware], "unit"
+    devices = run["tags"].get("devices") or run["environment"].get("env", {}).get("HABANA_VISIBLE_DEVICES")
+    if devices and devices != "all":
+        return len([d for d in devices.split(",") if d.strip()]), "card"
+    if run["tags"].get("cpuset"):
+        return count_cpus(run["tags"]["cpuset"]), "cpu"
+    return None, None
+
+
+def join_cells(runs, baseline, target):
+    """{(tool, model, dataset, concurrency): {hardware: [runs]}} of cells with a QPS on both sides."""
+    cells = {}
+    for run in runs:
+        hardware = run["tags"].get("hardware")
+        # as in trials.aggregate, a run without requests_per_sec has no QPS to compare
+        if hardware in (baseline, target) and run["concurrency"] is not None and run_metrics(run)["qps"]:
+            # sweep.py variants (e.g. pooling modes) of one model are separate cells
+            model = (run["model"] or "") + (f"@{run['tags']['variant']}" if run["tags"].get("variant") else "")
+            key = (run["tool"], model, run["dataset"] or "", run["concurrency"])
+            cells.setdefault(key, {}).setdefault(hardware, []).append(run)
+    return {key: sides for key, sides in cells.items() if baseline in sides and target in sides}
+
+
+def resampled_qps(conn, runs, method, n_resamples, rng):
+    """Bootstrap distribution of a side's mean QPS."""
+    if method == "trials":
+        return bootstrap_means([run_metrics(r)["qps"] for r in runs], n_resamples, rng)
+    per_trial = []
+    for run in runs:
+        metrics = run_metrics(run)
+        counts = histogram_counts(conn, run["run_id"], LATENCY_HISTOGRAM[run["tool"]])
+        if not counts or not metrics["mean"]:
+            per_trial.append(np.full(n_resamples, metrics["qps"]))
+            continue
+        means = histogram_means(LATENCY_BUCKETS + [float("inf")], counts, n_resamples, rng)
+        # relative to the resampled means' own centre, so the bucketing bias cancels
+        per_trial.append(metrics["qps"] * means.mean() / means)
+    return np.mean(per_trial, axis=0)
+
+
+def side_summary(conn, runs, method, overrides, n_resamples, rng):
+    metrics = [run_metrics(r) for r in runs]
+    units, unit = run_units(runs[0], overrides)
+    means = [m["mean"] for m in metrics if m["mean"]]
+    return {
+        "trials": len(runs),
+        "qps": float(np.mean([m["qps"] for m in metrics])),
+        "mean": float(np.mean(means)) if means else None,
+        "units": units,
+        "unit": unit,
+        "resampled": resampled_qps(conn, runs, method, n_resamples, rng),
+    }
+
+
+def comparison_row(base, target, baseline, target_name, confidence):
+    """Speedup, its interval and per-unit throughput of target over base side summaries."""
+    speedup = target["qps"] / base["qps"]
+    low, high = interval(target["resampled"] / base["resampled"], confidence)
+    per_unit = speedup * base["units"] / target["units"] if base["units"] and target["units"] else None
+    return {
+        f"{baseline} qps": base["qps"],
+        f"{target_name} qps": target["qps"],
+        "speedup": speedup,
+        "ci low": low,
+        "ci high": high,
+        f"{baseline} qps/{base['unit'] or 'unit'}": base["qps"] / base["units"] if base["units"] else None,
+        f"{target_name} qps/{target['unit'] or 'unit'}": target["qps"] / target["units"] if target["units"] else None,
+        "per-unit ratio": per_unit,
+        # > 1 means the target answers faster
+        "latency ratio": base["mean"] / target["mean"] if base["mean"] and target["mean"] else None,
+        "flag": "n.s." if low <= 1 <= high else "",
+    }
+
+
+def compare_group(conn, levels, baseline, target, overrides, confidence, n_resamples, rng):
+    """Rows per concurrency plus a "peak" row comparing the best QPS of each side."""
+    rows, best = [], {}
+    for concurrency in sorted(levels):
+        sides = levels[concurrency]
+        method = "trials" if len(sides[baseline]) > 1 and len(sides[target]) > 1 else "requests"
+        summaries = {hw: side_summary(conn, sides[hw], method, overrides, n_resamples, rng)
+                     for hw in (baseline, target)}
+        for hw, summary in summaries.items():
+            if hw not in best or summary["qps"] > best[hw][1]["qps"]:
+                best[hw] = (concurrency, summary)
+        rows.append({"concurrency": concurrency,
+                     "trials": f"{summaries[baseline]['trials']}/{summaries[target]['trials']}",
+                     **comparison_row(summaries[baseline], summaries[target], baseline, target, confidence),
+                     "ci from": method})
+    (base_c, base), (target_c, tgt) = best[baseline], best[target]
+    rows.append({"concurrency": f"peak {base_c}/{target_c}", "trials": "",
+                 **comparison_row(base, tgt, baseline, target, confidence), "ci from": ""})
+    return rows
+
+
+def group_section(key, rows, baseline, target, confidence):
+    tool, model, dataset = key
+    levels = [r for r in rows if isinstance(r["concurrency"], int)]
+    chart = line_chart([("speedup", [(r["concurrency"], r["speedup"]) for r in levels], False),
+                        (f"{confidence:.0%} CI low", [(r["concurrency"], r["ci low"]) for r in levels], True),
+                        (f"{confidence:.0%} CI high", [(r["concurrency"], r["ci high"]) for r in levels], True)],
+                       f"{target} / {baseline} throughput", "concurrency", "speedup", log_x=True)
+    peak = rows[-1]
+    note = (f"Peak throughput speedup {peak['speedup']:.2f}x [{peak['ci low']:.2f}, {peak['ci high']:.2f}]"
+            + (f", {peak['per-unit ratio']:.2f}x per unit" if peak["per-unit ratio"] else ""))
+    return f"<h2>{model} / {dataset} ({tool})</h2>\n<p class=\"note\">{note}</p>\n" + chart + table(rows)
+
+
+def print_group(key, rows, baseline, target):
+    tool, model, dataset = key
+    unit_keys = [k for k in rows[0] if "qps/" in k]
+    print(f"\n=== {model} / {dataset} ({tool}): {target} vs {baseline} ===")
+    print(f"{'users':>10} {'trials':>6} {baseline + ' qps':>12} {target + ' qps':>12} {'speedup':>8} "
+          f"{'CI':>15} " + " ".join(f"{k:>18}" for k in unit_keys) + f" {'per-unit':>9} {'latency':>8}")
+    for r in rows:
+        fields = [f"{str(r['concurrency']):>10}", f"{r['trials']:>6}", f"{r[baseline + ' qps']:>12.2f}",
+                  f"{r[target + ' qps']:>12.2f}", f"{r['speedup']:>8.2f}",
+                  f"{'[' + format(r['ci low'], '.2f') + ', ' + format(r['ci high'], '.2f') + ']':>15}"]
+        for name, width in [(k, 18) for k in unit_keys] + [("per-unit ratio", 9), ("latency ratio", 8)]:
+            fields.append(f"{r[name]:>{width}.2f}" if r[name] is not None else "-".rjust(width))
+        print(" ".join(fields) + (f"  {r['flag']}" if r["flag"] else ""))
+
+
+def parse_units(items):
+    units = {}
+    for item in items or []:
+        hardware, sep, count = item.partition("=")
+        if not sep:
+            raise ValueError(f"--units '{item}' is not hardware=N")
+        units[hardware] = float(count)
+    return units
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Cross-hardware throughput comparison",
+                                     formatter_class=argparse.RawDescriptionHelpFormatter, epilog=__doc__)
+    parser.add_argument("--db", type=str, default=DEFAULT_DB, help=f"Results database (default: {DEFAULT_DB})")
+    parser.add_argument("--baseline", type=str, default="xeon", help="Hardware tag of the baseline (default: xeon)")
+    parser.add_argument("--target", type=str, default="hpu", help="Hardware tag compared to it (default: hpu)")
+    parser.add_argument("--tool", type=str, default=None, choices=["stress_benchmark", "concurrent_bench"],
+                        help="Only runs of this load generator")
+    parser.add_argument("--model", type=str, default=None, help="Only runs of this model")
+    parser.add_argument("--units", type=str, nargs="*", default=None,
+                        help="Compute units per hardware tag, e.g. xeon=64 hpu=1, instead of the recorded ones")
+    parser.add_argument("--confidence", type=float, default=CONFIDENCE, help="Confidence level (default: 0.95)")
+    parser.add_argument("--resamples", type=int, default=N_RESAMPLES, help="Bootstrap resamples (default: 10000)")
+    parser.add_argument("--seed", type=int, default=0, help="Bootstrap random seed")
+    parser.add_argument("-o", "--output", type=str, default="hardware_report.html", help="HTML report file")
+    args = parser.parse_args()
+
+    conn = connect(args.db)
+    runs = query_runs(conn, args.tool, "model = ?" if args.model else "", [args.model] if args.model else [])
+    groups = {}
+    for (tool, model, dataset, concurrency), sides in join_cells(runs, args.baseline, args.target).items():
+        groups.setdefault((tool, model, dataset), {})[concurrency] = sides
+    if not groups:
+        print(f"No model/dataset/concurrency measured on both {args.baseline} and {args.target}")
+        conn.close()
+        return
+
+    rng = np.random.default_rng(args.seed)
+    overrides = parse_units(args.units)
+    sections = []
+    for key, levels in sorted(groups.items()):
+        rows = compare_group(conn, levels, args.baseline, args.target, overrides, args.confidence,
+                             args.resamples, rng)
+        print_group(key, rows, args.baseline, args.target)
+        sections.append(group_section(key, rows, args.baseline, args.target, args.confidence))
+    conn.close()
+    with open(args.output, "w", encoding="utf8") as f:
+        f.write(page(f"{args.target} vs {args.baseline}",
+                     [f'<p class="note">{len(runs)} runs from {os.path.abspath(args.db)}, '
+                      f"{args.confidence:.0%} bootstrap confidence intervals, {args.resamples} resamples</p>"]
+                     + sections))
+    print(f"\nReport saved to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,231 @@
+#!/usr/bin/env python3
+"""
+Regression check between two benchmark runs or two sets of runs.
+
+Each side is one of
+  <run id>                  a run in the results database
+  <name>.run.json           a run record file (stress_benchmark.py / concurrent_bench.py)
+  <name>.result.csv         a stress_benchmark.py per-request result file; its cell
+                            (model, dataset, concurrency) comes from the .run.json
+                            written next to it, a CSV without one is compared only
+                            with another single run or CSV
+  key=value[,key=value]     every run in the database with these tags, e.g. a
+                            whole sweep tagged image=tei_hpu_0729 (BENCH_TAGS / --tag)
+
+Sets are joined on (tool, model, dataset, concurrency), trials of a cell are
+pooled; two single runs are compared directly. Per cell the latency
+distributions are compared at the request level:
+
+  p50/p90/p99   relative change candidate vs baseline, with a bootstrap CI
+                (trials, then requests resampled from the latency histograms)
+  Mann-Whitney  two-sided p-value of the distribution shift (normal
+                approximation with tie correction over histogram buckets) and
+                P(candidate > baseline), 0.5 means no shift
+
+A cell is a regression when a --check percentile got slower by more than
+--threshold and its CI lies entirely above zero, an improvement when one got
+faster by more than --threshold with the CI entirely below zero and nothing
+regressed. The exit status is 1 if any cell regressed.
+
+Example:
+    python compare_runs.py image=tei_hpu_0729 image=tei_hpu_0815 --threshold 0.05
+    python compare_runs.py old/bench_0620-1030_c-64.result.csv bench_0801-0915_c-64.result.csv
+"""
+
+import argparse
+import json
+import math
+import re
+import sys
+
+import numpy as np
+
+from analyze_results import load_results
+from bench_stats import CONFIDENCE, N_RESAMPLES, bootstrap_histogram_percentiles, histogram_percentiles, interval
+from results_db import (DEFAULT_DB, LATENCY_BUCKETS, LATENCY_HISTOGRAM, connect, histogram_counts, insert_record,
+                        query_runs, run_metrics)
+
+PERCENTILES = [50, 90, 99]
+LE = LATENCY_BUCKETS + [float("inf")]
+
+
+def record_runs(path):
+    """Runs of a .run.json record file, through an in-memory database."""
+    with open(path, encoding="utf8") as f:
+        record = json.load(f)
+    memory = connect(":memory:")
+    insert_record(memory, record)
+    return memory, query_runs(memory)
+
+
+def csv_trial(path):
+    """A result CSV as a trial: successful requests' latency histogram and successful requests/s."""
+    results = load_results(path)
+    # load_results keeps latencies of successful requests only
+    latencies = results["overall"][~np.isnan(results["overall"])]
+    counts = np.bincount(np.searchsorted(LATENCY_BUCKETS, latencies, side="left"), minlength=len(LE))
+    duration = np.nanmax(results["tm_end"]) - np.nanmin(results["tm_start"])
+    match = re.search(r"_c-(\d+)\.result\.csv$", path)
+    key = ("stress_benchmark", "", "", int(match.group(1)) if match else None)
+    try:
+        memory, runs = record_runs(path[:-len(".result.csv")] + ".run.json")
+        memory.close()
+        if runs:
+            run = runs[0]
+            key = (run["tool"], run["model"] or "", run["dataset"] or "", run["concurrency"])
+    except FileNotFoundError:
+        pass
+    return {"key": key, "counts": counts, "qps": len(latencies) / duration if duration > 0 else None}
+
+
+def db_trials(conn, runs):
+    trials = []
+    for run in runs:
+        counts = histogram_counts(conn, run["run_id"], LATENCY_HISTOGRAM.get(run["tool"], ""))
+        if counts and sum(counts):
+            trials.append({"key": (run["tool"], run["model"] or "", run["dataset"] or "", run["concurrency"]),
+                           "counts": np.asarray(counts), "qps": run_metrics(run)["qps"]})
+    return trials
+
+
+def load_side(conn, spec):
+    """(trials, single) of a side spec, see the module docstring; single is True for one run or file."""
+    if spec.endswith(".csv"):
+        return [csv_trial(spec)], True
+    if spec.endswith(".json"):
+        memory, runs = record_runs(spec)
+        trials = db_trials(memory, runs)
+        memory.close()
+        return trials, True
+    if "=" in spec:
+        conditions, params = [], []
+        for item in spec.split(","):
+            key, _, value = item.partition("=")
+            conditions.append(f"json_extract(config, '$.tags.{key.strip()}') = ?")
+            params.append(value.strip())
+        return db_trials(conn, query_runs(conn, None, " AND ".join(conditions), params)), False
+    return db_trials(conn, query_runs(conn, None, "run_id = ?", [spec])), True
+
+
+def mann_whitney(base_counts, cand_counts):
+    """(two-sided p-value, P(candidate > baseline)) from two histograms over the same buckets."""
+    base_counts = np.asarray(base_counts, dtype=np.float64)
+    cand_counts = np.asarray(cand_counts, dtype=np.float64)
+    n1, n2 = base_counts.sum(), cand_counts.sum()
+    # U of the candidate: pairs where it is slower, ties (same bucket) count half
+    below = np.concatenate(([0.0], np.cumsum(base_counts)[:-1]))
+    u = float(np.sum(cand_counts * (below + 0.5 * base_counts)))
+    ties = base_counts + cand_counts
+    n = n1 + n2
+    variance = n1 * n2 / 12 * ((n + 1) - np.sum(ties ** 3 - ties) / (n * (n - 1)))
+    if variance <= 0:
+        return 1.0, 0.5
+    z = (u - n1 * n2 / 2) / math.sqrt(variance)
+    return math.erfc(abs(z) / math.sqrt(2)), u / (n1 * n2)
+
+
+def compare_cell(base, cand, threshold, check, confidence, n_resamples, rng):
+    base_counts = np.array([t["counts"] for t in base])
+    cand_counts = np.array([t["counts"] for t in cand])
+    base_point = histogram_percentiles(base_counts.sum(axis=0), LE, PERCENTILES)
+    cand_point = histogram_percentiles(cand_counts.sum(axis=0), LE, PERCENTILES)
+    base_resampled = bootstrap_histogram_percentiles(base_counts, LE, PERCENTILES, n_resamples, rng)
+    cand_resampled = bootstrap_histogram_percentiles(cand_counts, LE, PERCENTILES, n_resamples, rng)
+    p_value, shift = mann_whitney(base_counts.sum(axis=0), cand_counts.sum(axis=0))
+    base_qps = [t["qps"] for t in base if t["qps"]]
+    cand_qps = [t["qps"] for t in cand if t["qps"]]
+    row = {"trials": f"{len(base)}/{len(cand)}",
+           "qps change": np.mean(cand_qps) / np.mean(base_qps) - 1 if base_qps and cand_qps else None}
+    regressed, improved = [], []
+    for p in PERCENTILES:
+        change = float(cand_point[p][0] / base_point[p][0] - 1)
+        low, high = interval(cand_resampled[p] / base_resampled[p] - 1, confidence)
+        row[f"p{p} ms"] = float(base_point[p][0]) * 1000
+        row[f"p{p} new ms"] = float(cand_point[p][0]) * 1000
+        row[f"p{p} change"] = (change, low, high)
+        if f"p{p}" in check:
+            if change > threshold and low > 0:
+                regressed.append(f"p{p}")
+            elif change < -threshold and high < 0:
+                improved.append(f"p{p}")
+    row["mw p"] = p_value
+    row["P(slower)"] = shift
+    row["verdict"] = ("regression (" + ", ".join(regressed) + ")" if regressed
+                      else "improvement (" + ", ".join(improved) + ")" if improved else "no change")
+    return row
+
+
+def print_rows(rows):
+    print(f"{'cell':<44} {'trials':>6} " + " ".join(f"{f'p{p} change':>24}" for p in PERCENTILES)
+          + f" {'qps':>7} {'MW p':>8} {'P(slower)':>9}  verdict")
+    for label, row in rows:
+        fields = [f"{label:<44.44}", f"{row['trials']:>6}"]
+        for p in PERCENTILES:
+            change, low, high = row[f"p{p} change"]
+            fields.append(f"{f'{change:+.1%} [{low:+.1%}, {high:+.1%}]':>24}")
+        fields.append(f"{row['qps change']:>+7.1%}" if row["qps change"] is not None else "-".rjust(7))
+        fields.append(f"{row['mw p']:>8.2g}")
+        fields.append(f"{row['P(slower)']:>9.3f}")
+        print(" ".join(fields) + f"  {row['verdict']}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare two runs or run sets for latency regressions",
+                                     formatter_class=argparse.RawDescriptionHelpFormatter, epilog=__doc__)
+    parser.add_argument("baseline", type=str, help="Baseline run id, .run.json, .result.csv or key=value tags")
+    parser.add_argument("candidate", type=str, help="Candidate, same forms as the baseline")
+    parser.add_argument("--db", type=str, default=DEFAULT_DB, help=f"Results database (default: {DEFAULT_DB})")
+    parser.add_argument("--threshold", type=float, default=0.05,
+                        help="Relative percentile change that counts as a regression (default: 0.05)")
+    parser.add_argument("--check", type=str, nargs="+", default=["p50", "p99"],
+                        help="Percentiles that decide the verdict (default: p50 p99)")
+    parser.add_argument("--confidence", type=float, default=CONFIDENCE, help="Confidence level (default: 0.95)")
+    parser.add_argument("--resamples", type=int, default=N_RESAMPLES, help="Bootstrap resamples (default: 10000)")
+    parser.add_argument("--seed", type=int, default=0, help="Bootstrap random seed")
+    parser.add_argument("--json", type=str, default=None, help="Also write the comparison to this JSON file")
+    args = parser.parse_args()
+
+    conn = connect(args.db)
+    base, base_single = load_side(conn, args.baseline)
+    cand, cand_single = load_side(conn, args.candidate)
+    conn.close()
+    if not base or not cand:
+        print(f"No runs with latency data for {args.baseline if not base else args.candidate}")
+        sys.exit(2)
+
+    if base_single and cand_single:
+        pairs = {base[0]["key"]: (base, cand)}
+    else:
+        pairs = {}
+        for side, trials in enumerate([base, cand]):
+            for trial in trials:
+                pairs.setdefault(trial["key"], ([], []))[side].append(trial)
+        pairs = {key: sides for key, sides in pairs.items() if sides[0] and sides[1]}
+        if not pairs:
+            print("No (tool, model, dataset, concurrency) cell present in both sets"
+                  + (", a .result.csv needs its .run.json to join a run set"
+                     if args.baseline.endswith(".csv") or args.candidate.endswith(".csv") else ""))
+            sys.exit(2)
+
+    rng = np.random.default_rng(args.seed)
+    rows = []
+    for key, (base_trials, cand_trials) in sorted(pairs.items(), key=lambda item: str(item[0])):
+        tool, model, dataset, concurrency = key
+        label = " ".join(str(v) for v in [model, dataset] if v) + (f" c={concurrency}" if concurrency else "")
+        rows.append((label, compare_cell(base_trials, cand_trials, args.threshold, args.check, args.confidence,
+                                         args.resamples, rng)))
+    print(f"{args.candidate} vs {args.baseline}: threshold {args.threshold:.0%} on {', '.join(args.check)}, "
+          f"{args.confidence:.0%} bootstrap CI")
+    print_rows(rows)
+    regressions = [label for label, row in rows if row["verdict"].startswith("regression")]
+    if args.json:
+        with open(args.json, "w", encoding="utf8") as f:
+            json.dump([{"cell": label, **row} for label, row in rows], f, indent=2)
+    if regressions:
+        print(f"\n{len(regressions)} of {len(rows)} cells regressed: {', '.join(regressions)}")
+        sys.exit(1)
+    print(f"\nNo regression in {len(rows)} cells")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,51 +1,41 @@
-import re
+import argparse
 import csv
+import os
+import sys
 
-def extract_log_data(log_file_path):
-    # 定义匹配模式
-    pattern = re.compile(
-        r'Run embedding with queries .*?, (\d+) users.*?'
-        r'===== 请求统计结果 =====.*?'
-        r'总请求数: (\d+).*?'
-        r'成功率: ([\d.]+)%.*?'
-        r'错误率: ([\d.]+)%.*?'
-        r'QPS: ([\d.]+).*?'
-        r'总耗时: ([\d.]+) 秒.*?'
-        r'===== First Chunk 统计 =====.*?'
-        r'平均值: ([\d.]+)s.*?'
-        r'中位数: ([\d.]+)s.*?'
-        r'P90: ([\d.]+)s.*?'
-        r'P95: ([\d.]+)s.*?'
-        r'===== Question Length 统计 =====.*?'
-        r'最小值: (\d+).*?'
-        r'最大值: (\d+).*?'
-        r'平均值: ([\d.]+)',
-        re.DOTALL
-    )
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from results_db import DEFAULT_DB, connect, query_runs
 
-    data = []
 
-    with open(log_file_path, 'r', encoding='utf-8') as file:
-        log_content = file.read()
-        matches = pattern.finditer(log_content)
+def extract_run_data(db_path, dataset=None):
+    # 从结果数据库读取 stress_benchmark.py 的运行记录，可按数据集过滤
+    conn = connect(db_path)
+    if dataset:
+        runs = query_runs(conn, 'stress_benchmark', "dataset = ?", (dataset,))
+    else:
+        runs = query_runs(conn, 'stress_benchmark')
+    conn.close()
 
-        for match in matches:
-            data.append({
-                'Users': int(match.group(1)),
-                'TotalRequests': int(match.group(2)),
-                'SuccessRate': float(match.group(3)),
-                'ErrorRate': float(match.group(4)),
-                'QPS': float(match.group(5)),
-                'TotalTime': float(match.group(6)),
-                'AvgLatency': float(match.group(7)),
-                'MedianLatency': float(match.group(8)),
-                'P90Latency': float(match.group(9)),
-                'P95Latency': float(match.group(10)),
-                'MinLength': int(match.group(11)),
-                'MaxLength': int(match.group(12)),
-                'AvgLength': float(match.group(13))
-            })
-    print(f"log {data}")
+    data = []
+    for run in runs:
+        stats = run['summary']
+        if 'total_requests' not in stats:
+            continue
+        data.append({
+            'Users': run['concurrency'],
+            'TotalRequests': stats['total_requests'],
+            'SuccessRate': stats['success_rate'] * 100,
+            'ErrorRate': stats['error_rate'] * 100,
+            'QPS': stats['requests_per_sec'],
+            'TotalTime': stats['total_duration'],
+            'AvgLatency': stats.get('first_chunk_avg'),
+            'MedianLatency': stats.get('first_chunk_median'),
+            'P90Latency': stats.get('first_chunk_p90'),
+            'P95Latency': stats.get('first_chunk_p95'),
+            'MinLength': stats.get('question_len_min'),
+            'MaxLength': stats.get('question_len_max'),
+            'AvgLength': stats.get('question_len_avg')
+        })
 
     return data
 
@@ -63,18 +53,21 @@ def save_to_csv(data, output_file_path):
         writer.writerows(data)
 
 if __name__ == "__main__":
-    input_log_file = "tripe.txt1"  # 替换为你的日志文件路径
-    output_csv_file = "extracted_data.csv"
+    parser = argparse.ArgumentParser(description="导出 stress_benchmark.py 运行结果")
+    parser.add_argument("--db", type=str, default=DEFAULT_DB, help="结果数据库路径")
+    parser.add_argument("--dataset", type=str, default=None, help="只导出该数据集的运行，例如 21_512")
+    parser.add_argument("-o", "--output", type=str, default="extracted_data.csv", help="输出 CSV 文件")
+    args = parser.parse_args()
 
-    print(f"正在处理日志文件: {input_log_file}")
-    extracted_data = extract_log_data(input_log_file)
+    print(f"正在查询结果数据库: {args.db}")
+    extracted_data = extract_run_data(args.db, args.dataset)
 
     if not extracted_data:
-        print("未找到匹配的数据模式，请检查日志格式。")
+        print("未找到匹配的运行记录。")
     else:
-        save_to_csv(extracted_data, output_csv_file)
+        save_to_csv(extracted_data, args.output)
         print(f"成功提取 {len(extracted_data)} 条记录")
-        print(f"数据已保存到: {output_csv_file}")
+        print(f"数据已保存到: {args.output}")
         print("\n示例数据:")
         for key, value in extracted_data[0].items():
             print(f"{key}: {value}")
@@ -0,0 +1,269 @@
+#!/usr/bin/env python3
+"""
+Generate synthetic documents with exact token lengths from a local tokenizer's vocabulary.
+
+Documents are built from vocabulary entries that survive a decode/encode round
+trip, grouped by script (CJK, Latin, digits, other), so the language mix and the
+token-length distribution can be controlled independently of any corpus.
+Output uses the same schema as the 21_*.json splits produced by tokenize_split.py.
+
+Example:
+    python synthetic_dataset.py -m /mnt/disk1/models/bge-m3 -o syn_lognormal.json \\
+        --distribution lognormal --length 1024 --sigma 0.5 --mix cjk=0.5,latin=0.5 -n 500
+"""
+
+import argparse
+import json
+import logging
+import os
+import re
+import sys
+from typing import Any, Dict, List
+
+import numpy as np
+from transformers import AutoTokenizer
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from dataset_mmap import build_dataset
+
+CATEGORIES = ("cjk", "latin", "digit", "other")
+# pieces of these categories are separated by a space, CJK is written without one
+SPACED_CATEGORIES = ("latin", "digit")
+
+_CJK_RE = re.compile(r"^[\u3400-\u4dbf\u4e00-\u9fff\uf900-\ufaff]+$")
+_LATIN_RE = re.compile(r"^[A-Za-z]+$")
+_DIGIT_RE = re.compile(r"^[0-9]+$")
+
+
+def classify_piece(piece: str) -> str:
+    """Return the script category of a decoded vocabulary entry."""
+    if _CJK_RE.match(piece):
+        return "cjk"
+    if _LATIN_RE.match(piece):
+        return "latin"
+    if _DIGIT_RE.match(piece):
+        return "digit"
+    return "other"
+
+
+def build_vocab_pools(tokenizer) -> Dict[str, List[str]]:
+    """
+    Group round-trip stable vocabulary entries by script category.
+
+    An entry is kept only if its decoded text encodes back to the same single
+    token, so concatenated pieces have a predictable token count.
+    """
+    special_ids = set(tokenizer.all_special_ids)
+    ids = [i for i in range(len(tokenizer)) if i not in special_ids]
+    pieces = [p.strip() for p in tokenizer.batch_decode([[i] for i in ids])]
+    encoded = tokenizer(pieces, add_special_tokens=False)["input_ids"]
+
+    pools = {category: [] for category in CATEGORIES}
+    for piece, enc in zip(pieces, encoded):
+        if not piece or len(enc) != 1 or not piece.isprintable():
+            continue
+        pools[classify_piece(piece)].append(piece)
+    return pools
+
+
+def parse_mix(mix: str) -> Dict[str, float]:
+    """Parse 'cjk=0.5,latin=0.5' into normalised category weights."""
+    weights = {}
+    for item in mix.split(","):
+        name, _, value = item.partition("=")
+        name = name.strip()
+        if name not in CATEGORIES:
+            raise ValueError(f"unknown vocabulary category '{name}', expected one of {CATEGORIES}")
+        weights[name] = float(value) if value else 1.0
+    total = sum(weights.values())
+    if total <= 0:
+        raise ValueError(f"mix '{mix}' has no positive weight")
+    return {name: weight / total for name, weight in weights.items()}
+
+
+def sample_lengths(rng, distribution: str, count: int, length: int, min_length: int, max_length: int,
+                   sigma: float) -> np.ndarray:
+    """Sample target token lengths for count documents."""
+    if distribution == "fixed":
+        lengths = np.full(count, length)
+    elif distribution == "uniform":
+        lengths = rng.integers(min_length, max_length + 1, size=count)
+    elif distribution == "lognormal":
+        # length is the median of the distribution
+        lengths = np.rint(rng.lognormal(np.log(length), sigma, size=count))
+    else:
+        raise ValueError(f"unsupported distribution {distribution}")
+    return np.clip(lengths, min_length, max_length).astype(int)
+
+
+class PieceSampler:
+    """Draw (category, piece) pairs according to the mix, optionally cycling a short unit."""
+
+    def __init__(self, rng, pools: Dict[str, List[str]], weights: Dict[str, float], repeat_unit: int = 0):
+        self.rng = rng
+        self.pools = pools
+        self.categories = [c for c in weights if pools.get(c)]
+        missing = set(weights) - set(self.categories)
+        if missing:
+            logging.warning(f"Tokenizer vocabulary has no stable pieces for {sorted(missing)}")
+        if not self.categories:
+            raise ValueError("no vocabulary pieces available for the requested mix")
+        probs = np.array([weights[c] for c in self.categories])
+        self.probs = probs / probs.sum()
+        self.repeat_unit = repeat_unit
+
+    def draw(self, count: int) -> List[tuple]:
+        n = min(count, self.repeat_unit) if self.repeat_unit else count
+        categories = self.rng.choice(len(self.categories), size=n, p=self.probs)
+        pieces = []
+        for c in categories:
+            pool = self.pools[self.categories[c]]
+            pieces.append((self.categories[c], pool[self.rng.integers(len(pool))]))
+        if self.repeat_unit:
+            pieces = [pieces[i % n] for i in range(count)]
+        return pieces
+
+    def extend(self, pieces: List[tuple], count: int) -> List[tuple]:
+        """Append count pieces, continuing the repeated unit if there is one."""
+        if self.repeat_unit and pieces:
+            unit = pieces[:self.repeat_unit]
+            return pieces + [unit[(len(pieces) + i) % len(unit)] for i in range(count)]
+        return pieces + self.draw(count)
+
+
+def join_pieces(pieces: List[tuple]) -> str:
+    parts = []
+    prev = None
+    for category, piece in pieces:
+        if parts and (category in SPACED_CATEGORIES or prev in SPACED_CATEGORIES):
+            parts.append(" ")
+        parts.append(piece)
+        prev = category
+    return "".join(parts)
+
+
+def generate_document(tokenizer, sampler: PieceSampler, target: int, max_rounds: int = 16):
+    """
+    Build a document that encodes to exactly target tokens (without special tokens).
+
+    Pieces are added or removed in proportion to the remaining difference
+    until the re-encoded length matches. Returns (text, token count).
+    """
+    pieces = sampler.draw(target)
+    count = 0
+    text = ""
+    for _ in range(max_rounds):
+        text = join_pieces(pieces)
+        count = len(tokenizer.encode(text, add_special_tokens=False))
+        if count == target:
+            break
+        if count > target:
+            drop = max(1, count - target)
+            pieces = pieces[:max(1, len(pieces) - drop)]
+        else:
+            pieces = sampler.extend(pieces, target - count)
+    return text, count
+
+
+def generate(tokenizer, lengths: np.ndarray, sampler: PieceSampler) -> List[Dict[str, Any]]:
+    special = tokenizer.num_special_tokens_to_add()
+    chunks = []
+    start_idx = 0
+    for chunk_id, target in enumerate(lengths):
+        text, count = generate_document(tokenizer, sampler, int(target))
+        if count != target:
+            logging.warning(f"Document {chunk_id} has {count} tokens instead of {target}")
+        chunks.append({
+            "id": chunk_id,
+            "text": text,
+            "tokens": count,
+            "server_tokens": count + special,
+            "start_token": start_idx,
+            "end_token": start_idx + count,
+            "original_length": len(text),
+        })
+        start_idx += count
+    return chunks
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate synthetic exact-length documents from tokenizer vocabulary")
+    parser.add_argument("--model", "-m", type=str, required=True, help="Local tokenizer/model path")
+    parser.add_argument("--output", "-o", type=str, required=True, help="Output JSON file path")
+    parser.add_argument("--num_docs", "-n", type=int, default=500, help="Number of documents (default: 500)")
+    parser.add_argument("--distribution", "-d", choices=["fixed", "uniform", "lognormal"], default="fixed",
+                        help="Token length distribution (default: fixed)")
+    parser.add_argument("--length", "-l", type=int, default=512,
+                        help="Length for fixed, median for lognormal (default: 512)")
+    parser.add_argument("--min_length", type=int, default=1, help="Lower bound of lengths (default: 1)")
+    parser.add_argument("--max_length", type=int, default=8192, help="Upper bound of lengths (default: 8192)")
+    parser.add_argument("--sigma", type=float, default=0.5, help="Lognormal shape parameter (default: 0.5)")
+    parser.add_argument("--mix", type=str, default="cjk=1",
+                        help=f"Vocabulary mix over {','.join(CATEGORIES)}, e.g. cjk=0.7,latin=0.3 (default: cjk=1)")
+    parser.add_argument("--repeat_unit", type=int, default=0,
+                        help="Repeat a unit of N pieces to build highly repetitive input (default: off)")
+    parser.add_argument("--seed", type=int, default=0, help="Random seed (default: 0)")
+    parser.add_argument("--mmap", action="store_true", help="Also write the memory-mapped binary dataset")
+    parser.add_argument("--verbose", "-v", action="store_true", help="Enable verbose logging")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.DEBUG if args.verbose else logging.INFO,
+                        format='%(asctime)s - %(levelname)s - %(message)s')
+
+    try:
+        if args.distribution == "fixed":
+            args.min_length = min(args.min_length, args.length)
+            args.max_length = max(args.max_length, args.length)
+        if args.min_length < 1 or args.min_length > args.max_length:
+            raise ValueError(f"invalid length range [{args.min_length}, {args.max_length}]")
+
+        tokenizer = AutoTokenizer.from_pretrained(args.model, local_files_only=True)
+        rng = np.random.default_rng(args.seed)
+        weights = parse_mix(args.mix)
+
+        logging.info("Building vocabulary pools...")
+        pools = build_vocab_pools(tokenizer)
+        logging.info("Stable pieces per category: " + ", ".join(f"{c}={len(p)}" for c, p in pools.items()))
+
+        sampler = PieceSampler(rng, pools, weights, args.repeat_unit)
+        lengths = sample_lengths(rng, args.distribution, args.num_docs, args.length,
+                                 args.min_length, args.max_length, args.sigma)
+        chunks = generate(tokenizer, lengths, sampler)
+
+        metadata = {
+            "original_file": "synthetic",
+            "total_chunks": len(chunks),
+            "max_tokens_per_chunk": int(lengths.max()) if len(lengths) else 0,
+            "tokenizer": args.model,
+            "total_original_chars": sum(chunk["original_length"] for chunk in chunks),
+            "synthetic": {
+                "distribution": args.distribution,
+                "length": args.length,
+                "min_length": args.min_length,
+                "max_length": args.max_length,
+                "sigma": args.sigma,
+                "mix": weights,
+                "repeat_unit": args.repeat_unit,
+                "seed": args.seed,
+            },
+            "chunks": chunks,
+        }
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(metadata, f, ensure_ascii=False, indent=2)
+
+        if args.mmap:
+            mmap_path = f"{os.path.splitext(args.output)[0]}.mmap"
+            build_dataset(mmap_path, [chunk["text"] for chunk in chunks], tokenizer,
+                          {k: v for k, v in metadata.items() if k != "chunks"})
+            logging.info(f"Memory-mapped dataset saved to {mmap_path}")
+
+        exact = sum(1 for chunk, target in zip(chunks, lengths) if chunk["tokens"] == target)
+        logging.info(f"Generated {len(chunks)} documents ({exact} exact length), saved to {args.output}")
+
+    except Exception as e:
+        logging.error(f"Failed to generate synthetic dataset: {e}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
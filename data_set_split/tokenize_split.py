@@ -5,13 +5,24 @@ Output is saved as JSON format with metadata for each chunk.
 """
 
 import argparse
+import hashlib
 import logging
 import json
-from typing import List, Dict, Any
+import shutil
+from typing import List, Dict, Any, Tuple
 from transformers import AutoTokenizer
 import sys
 import os
 
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from dataset_mmap import build_dataset, is_mmap_dataset, tokenizer_sha256
+
+# bump when the split output changes for identical inputs
+CACHE_VERSION = 2
+DEFAULT_CACHE_DIR = os.environ.get(
+    "EMBED_BENCH_CACHE_DIR",
+    os.path.join(os.path.expanduser("~"), ".cache", "embed_rerank_benchmark", "splits"))
+
 def load_bge_m3_tokenizer(model_path:str):
     """Load the bge-m3 tokenizer."""
     try:
@@ -76,7 +87,82 @@ def split_text_into_chunks(text: str, tokenizer, max_length: int) -> List[Dict[s
     
     return chunks
 
-def process_file(input_path: str, output_path: str, tokenizer, max_length: int = 512):
+def _decode_chunk(tokenizer, chunk_tokens: List[int]) -> str:
+    """Decode token ids and normalise whitespace the same way split_text_into_chunks does."""
+    return ' '.join(tokenizer.decode(chunk_tokens, skip_special_tokens=True).split())
+
+def split_text_into_verified_chunks(text: str, tokenizer, max_length: int, tolerance: int = 0,
+                                    max_adjust: int = 8) -> List[Dict[str, Any]]:
+    """
+    Split text into chunks whose decoded text re-encodes to max_length tokens.
+
+    Decoding a token slice and re-encoding the text rarely gives back the same
+    number of tokens (merges across the cut, byte-level fragments, whitespace
+    clean-up), so each chunk boundary is moved until the emitted text
+    re-tokenizes to between max_length - tolerance and max_length tokens. A chunk
+    never exceeds max_length, so the server does not truncate it.
+
+    Args:
+        text: Input text to split
+        tokenizer: Tokenizer instance (the one the server uses)
+        max_length: Target tokens per chunk
+        tolerance: Accepted shortfall below max_length
+        max_adjust: Maximum boundary adjustments per chunk
+
+    Returns:
+        List of dictionaries containing chunk data, with the verified token
+        count in "tokens" and the count including special tokens in "server_tokens"
+    """
+    tokens = tokenizer.encode(text, add_special_tokens=False)
+    special = tokenizer.num_special_tokens_to_add()
+
+    chunks = []
+    start_idx = 0
+    chunk_id = 0
+
+    while start_idx < len(tokens):
+        # the tail of the corpus may be shorter than max_length
+        target = min(max_length, len(tokens) - start_idx)
+        end_idx = start_idx + target
+        best = None
+
+        for _ in range(max_adjust):
+            chunk_text = _decode_chunk(tokenizer, tokens[start_idx:end_idx])
+            count = len(tokenizer.encode(chunk_text, add_special_tokens=False))
+            # prefer the longest chunk that fits, otherwise the least oversized one
+            fit = (count > max_length, count if count > max_length else -count)
+            if best is None or fit < best[0]:
+                best = (fit, end_idx, chunk_text, count)
+            if target - tolerance <= count <= target:
+                break
+            next_end = min(max(end_idx + target - count, start_idx + 1), len(tokens))
+            if next_end == end_idx:
+                break
+            end_idx = next_end
+
+        _, end_idx, chunk_text, count = best
+        if count > max_length:
+            logging.warning(f"Chunk at token {start_idx} re-encodes to {count} tokens (> {max_length})")
+
+        if chunk_text.strip():
+            chunks.append({
+                "id": chunk_id,
+                "text": chunk_text,
+                "tokens": count,
+                "server_tokens": count + special,
+                "start_token": start_idx,
+                "end_token": end_idx,
+                "original_length": len(chunk_text),
+                "verified": target - tolerance <= count <= target,
+            })
+            chunk_id += 1
+
+        start_idx = end_idx
+
+    return chunks
+
+def process_file(input_path: str, output_path: str, tokenizer, max_length: int = 512, mmap_path: str = None,
+                 verify: bool = False, tolerance: int = 0, extra_metadata: Dict[str, Any] = None):
     """
     Process the input file and save tokenized chunks as JSON.
     
@@ -85,6 +171,10 @@ def process_file(input_path: str, output_path: str, tokenizer, max_length: int =
         output_path: Path to output JSON file
         tokenizer: Tokenizer instance
         max_length: Maximum tokens per chunk
+        mmap_path: Optional directory for the memory-mapped binary dataset
+        verify: Adjust chunk boundaries until each chunk re-encodes to max_length tokens
+        tolerance: Accepted token shortfall per chunk in verify mode
+        extra_metadata: Additional metadata fields (e.g. the cache key)
     """
     try:
         # Read the entire file
@@ -94,15 +184,21 @@ def process_file(input_path: str, output_path: str, tokenizer, max_length: int =
         logging.info(f"Read {len(content)} characters from {input_path}")
         
         # Split into chunks
-        chunks = split_text_into_chunks(content, tokenizer, max_length)
+        if verify:
+            chunks = split_text_into_verified_chunks(content, tokenizer, max_length, tolerance)
+        else:
+            chunks = split_text_into_chunks(content, tokenizer, max_length)
         
         # Create metadata
         metadata = {
             "original_file": input_path,
             "total_chunks": len(chunks),
             "max_tokens_per_chunk": max_length,
-            "tokenizer": "bge-m3",
+            "tokenizer": getattr(tokenizer, "name_or_path", None) or "bge-m3",
             "total_original_chars": len(content),
+            "verified": verify,
+            "length_tolerance": tolerance if verify else None,
+            **(extra_metadata or {}),
             "chunks": chunks
         }
         
@@ -111,6 +207,11 @@ def process_file(input_path: str, output_path: str, tokenizer, max_length: int =
             json.dump(metadata, f, ensure_ascii=False, indent=2)
         
         logging.info(f"Created {len(chunks)} chunks, saved to {output_path}")
+
+        if mmap_path:
+            build_dataset(mmap_path, [chunk["text"] for chunk in chunks], tokenizer,
+                          {k: v for k, v in metadata.items() if k != "chunks"})
+            logging.info(f"Memory-mapped dataset saved to {mmap_path}")
         
         # Print statistics
         total_tokens = sum(chunk["tokens"] for chunk in chunks)
@@ -118,6 +219,9 @@ def process_file(input_path: str, output_path: str, tokenizer, max_length: int =
         
         logging.info(f"Total tokens processed: {total_tokens}")
         logging.info(f"Average tokens per chunk: {avg_tokens:.2f}")
+        if verify:
+            off_target = sum(1 for chunk in chunks if not chunk["verified"])
+            logging.info(f"Chunks outside tolerance after verification: {off_target}")
         
         return chunks
         
@@ -125,13 +229,95 @@ def process_file(input_path: str, output_path: str, tokenizer, max_length: int =
         logging.error(f"Error processing file: {e}")
         raise
 
+def file_sha256(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+def dataset_cache_key(input_path: str, tokenizer, max_length: int, verify: bool,
+                      tolerance: int) -> Tuple[str, Dict[str, Any]]:
+    """
+    Compute the content-addressed cache key of a split.
+
+    The tokenizer enters the key through its content hash only, so models that
+    share a tokenizer (e.g. bge-m3 and bge-reranker-v2-m3) share cached splits;
+    its name is recorded alongside for reference.
+
+    Returns:
+        (key, components) where components is stored in the JSON metadata
+    """
+    components = {
+        "version": CACHE_VERSION,
+        "corpus_sha256": file_sha256(input_path),
+        "tokenizer_sha256": tokenizer_sha256(tokenizer),
+        "length": max_length,
+        "options": {"verify": verify, "tolerance": tolerance if verify else None},
+    }
+    key = hashlib.sha256(json.dumps(components, sort_keys=True).encode('utf-8')).hexdigest()[:32]
+    return key, {**components, "tokenizer": getattr(tokenizer, "name_or_path", None)}
+
+def cached_process_file(input_path: str, output_path: str, tokenizer, max_length: int = 512, mmap_path: str = None,
+                        verify: bool = False, tolerance: int = 0, cache_dir: str = DEFAULT_CACHE_DIR) -> str:
+    """
+    Like process_file, but reuse a cached split for the same corpus, tokenizer, length and options.
+
+    The split is stored as <cache_dir>/<key>.json (and <key>.mmap) and copied to
+    output_path / mmap_path. The key is recorded in the JSON metadata.
+
+    Returns:
+        The cache key
+    """
+    key, components = dataset_cache_key(input_path, tokenizer, max_length, verify, tolerance)
+    os.makedirs(cache_dir, exist_ok=True)
+    cached_json = os.path.join(cache_dir, f"{key}.json")
+
+    if os.path.isfile(cached_json):
+        logging.info(f"Reusing cached split {cached_json}")
+    else:
+        # write to a temporary name so concurrent or interrupted runs never leave a partial entry
+        tmp_json = f"{cached_json}.{os.getpid()}.tmp"
+        process_file(input_path, tmp_json, tokenizer, max_length, None, verify, tolerance,
+                     {"cache_key": key, "cache": components})
+        os.replace(tmp_json, cached_json)
+
+    if os.path.abspath(output_path) != os.path.abspath(cached_json):
+        os.makedirs(os.path.dirname(os.path.abspath(output_path)), exist_ok=True)
+        shutil.copyfile(cached_json, output_path)
+
+    if mmap_path:
+        cached_mmap = os.path.join(cache_dir, f"{key}.mmap")
+        if not is_mmap_dataset(cached_mmap):
+            with open(cached_json, 'r', encoding='utf-8') as f:
+                metadata = json.load(f)
+            chunks = metadata.pop("chunks", [])
+            tmp_mmap = f"{cached_mmap}.{os.getpid()}.tmp"
+            build_dataset(tmp_mmap, [chunk["text"] for chunk in chunks], tokenizer, metadata)
+            shutil.rmtree(cached_mmap, ignore_errors=True)
+            os.replace(tmp_mmap, cached_mmap)
+        shutil.copytree(cached_mmap, mmap_path, dirs_exist_ok=True)
+        logging.info(f"Memory-mapped dataset saved to {mmap_path}")
+
+    return key
+
 def main():
     parser = argparse.ArgumentParser(description="Split text into fixed-length token chunks using bge-m3 tokenizer")
     parser.add_argument("--input_file","-i", help="Input text file path")
     parser.add_argument("--output", "-o", help="Output file path (default: input_file_tokenized.json)")
     parser.add_argument("--length", "-l", type=int, default=512, help="Token length per chunk (default: 512)")
     parser.add_argument("--verbose", "-v", action="store_true", help="Enable verbose logging")
-    parser.add_argument("--model", "-m", htype=str, default="BAAI/bge-m3",help="Tokenizer model")
+    parser.add_argument("--model", "-m", type=str, default="BAAI/bge-m3",help="Tokenizer model")
+    parser.add_argument("--mmap", action="store_true",
+                        help="Also write the memory-mapped binary dataset (<output>.mmap) for the benchmark tools")
+    parser.add_argument("--verify", action="store_true",
+                        help="Adjust chunk boundaries until every chunk re-encodes to exactly --length tokens")
+    parser.add_argument("--tolerance", type=int, default=0,
+                        help="Accepted token shortfall per chunk with --verify (default: 0)")
+    parser.add_argument("--cache", action="store_true",
+                        help="Reuse a cached split keyed by corpus, tokenizer, length and options")
+    parser.add_argument("--cache_dir", type=str, default=DEFAULT_CACHE_DIR,
+                        help=f"Split cache directory (default: {DEFAULT_CACHE_DIR})")
     
     args = parser.parse_args()
     
@@ -153,7 +339,12 @@ def main():
         logging.info("Tokenizer loaded successfully")
         
         # Process the file
-        process_file(args.input_file, output_file, tokenizer, args.length)
+        mmap_path = f"{os.path.splitext(output_file)[0]}.mmap" if args.mmap else None
+        if args.cache:
+            cached_process_file(args.input_file, output_file, tokenizer, args.length, mmap_path,
+                                args.verify, args.tolerance, args.cache_dir)
+        else:
+            process_file(args.input_file, output_file, tokenizer, args.length, mmap_path, args.verify, args.tolerance)
         
         print(f"✓ Successfully processed file. Output saved to: {output_file}")
         
@@ -0,0 +1,330 @@
+#!/usr/bin/env python3
+"""
+Memory-mapped binary dataset format shared by the benchmark tools.
+
+A dataset is a directory (by convention ``<name>.mmap``) holding:
+
+    meta.json          format version, counts, dtypes and source metadata
+    text.bin           UTF-8 text of every document, concatenated (uint8)
+    text_offsets.bin   byte offset of each document in text.bin (int64, n+1)
+    token_ids.bin      token ids without special tokens, concatenated (int32)
+    token_offsets.bin  offset of each document in token_ids.bin (int64, n+1)
+    token_counts.bin   tokens the server sees per document, special tokens
+                       included (int32, n)
+
+Every array is opened with ``numpy.memmap`` so loading is O(1), the pages are
+shared between processes reading the same dataset, and the stored token ids
+let the tools skip tokenization entirely. meta.json records the
+``tokenizer_sha256`` of the tokenizer that produced them; a consumer whose
+tokenizer hashes differently (another vocab, special tokens or normalizer)
+re-tokenizes the texts instead of feeding it foreign ids.
+
+Convert an existing JSON dataset with:
+
+    python dataset_mmap.py -i 21_512.json -o 21_512.mmap -m BAAI/bge-m3
+"""
+
+import argparse
+import hashlib
+import json
+import logging
+import os
+import sys
+from typing import Any, Dict, Iterable, List, Optional, Sequence
+
+import numpy as np
+
+FORMAT_NAME = "embed-bench-mmap"
+FORMAT_VERSION = 1
+
+TEXT_DTYPE = np.uint8
+OFFSET_DTYPE = np.int64
+TOKEN_DTYPE = np.int32
+
+META_FILE = "meta.json"
+TEXT_FILE = "text.bin"
+TEXT_OFFSETS_FILE = "text_offsets.bin"
+TOKEN_IDS_FILE = "token_ids.bin"
+TOKEN_OFFSETS_FILE = "token_offsets.bin"
+TOKEN_COUNTS_FILE = "token_counts.bin"
+
+
+class PretokenizedText(str):
+    """A document text that carries its stored token ids (no special tokens)."""
+
+    token_ids = None
+    token_count = None
+    tokenizer_sha256 = None
+
+# id(tokenizer) -> (tokenizer, sha256); the tokenizer is kept so its id is not reused
+_TOKENIZER_SHA256 = {}
+_warned = set()
+
+
+def is_mmap_dataset(path: str) -> bool:
+    """Return True if path is a directory written by write_dataset."""
+    return bool(path) and os.path.isfile(os.path.join(path, META_FILE))
+
+
+def tokenizer_sha256(tokenizer) -> str:
+    """Hash of the full tokenizer definition (vocab, merges, normalizer) when available, else of the vocab."""
+    backend = getattr(tokenizer, "backend_tokenizer", None)
+    if backend is not None:
+        data = backend.to_str()
+    else:
+        data = json.dumps(sorted(tokenizer.get_vocab().items()), ensure_ascii=False)
+    return hashlib.sha256(data.encode('utf-8')).hexdigest()
+
+
+def uses_stored_ids(tokenizer, texts: Sequence[PretokenizedText]) -> bool:
+    """
+    True if the stored token ids of texts were produced by tokenizer.
+
+    Compares the dataset's tokenizer_sha256 with the (cached) hash of
+    tokenizer; datasets written without one never match. A mismatch is
+    logged once per pair.
+    """
+    cached = _TOKENIZER_SHA256.get(id(tokenizer))
+    if cached is None:
+        cached = _TOKENIZER_SHA256[id(tokenizer)] = (tokenizer, tokenizer_sha256(tokenizer))
+    expected = cached[1]
+    for stored in {t.tokenizer_sha256 for t in texts}:
+        if stored != expected:
+            if (stored, expected) not in _warned:
+                _warned.add((stored, expected))
+                logging.warning(f"dataset token ids were built with another tokenizer "
+                                f"({stored[:16] + '...' if stored else 'no tokenizer_sha256'}, "
+                                f"{getattr(tokenizer, 'name_or_path', None)} is {expected[:16]}...), "
+                                f"re-tokenizing; rebuild the dataset with dataset_mmap.py to reuse its ids")
+            return False
+    return True
+
+
+def _write_array(path: str, values: np.ndarray):
+    with open(path, "wb") as f:
+        f.write(np.ascontiguousarray(values).tobytes())
+
+
+def write_dataset(output_dir: str, texts: Sequence[str], token_ids: Sequence[Sequence[int]],
+                  token_counts: Optional[Sequence[int]] = None,
+                  metadata: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    """
+    Write documents and their token ids in the memory-mapped format.
+
+    Args:
+        output_dir: Dataset directory to create
+        texts: Document texts
+        token_ids: Token ids of each document, without special tokens
+        token_counts: Server-side token count per document (defaults to len(token_ids))
+        metadata: Extra fields stored in meta.json (tokenizer, source file, ...)
+
+    Returns:
+        The meta.json content
+    """
+    if len(texts) != len(token_ids):
+        raise ValueError(f"got {len(texts)} texts but {len(token_ids)} token id lists")
+    if token_counts is None:
+        token_counts = [len(ids) for ids in token_ids]
+
+    os.makedirs(output_dir, exist_ok=True)
+
+    encoded = [text.encode("utf-8") for text in texts]
+    text_offsets = np.zeros(len(encoded) + 1, dtype=OFFSET_DTYPE)
+    np.cumsum([len(b) for b in encoded], out=text_offsets[1:])
+    token_offsets = np.zeros(len(token_ids) + 1, dtype=OFFSET_DTYPE)
+    np.cumsum([len(ids) for ids in token_ids], out=token_offsets[1:])
+
+    with open(os.path.join(output_dir, TEXT_FILE), "wb") as f:
+        for b in encoded:
+            f.write(b)
+    with open(os.path.join(output_dir, TOKEN_IDS_FILE), "wb") as f:
+        for ids in token_ids:
+            f.write(np.asarray(ids, dtype=TOKEN_DTYPE).tobytes())
+    _write_array(os.path.join(output_dir, TEXT_OFFSETS_FILE), text_offsets)
+    _write_array(os.path.join(output_dir, TOKEN_OFFSETS_FILE), token_offsets)
+    _write_array(os.path.join(output_dir, TOKEN_COUNTS_FILE), np.asarray(token_counts, dtype=TOKEN_DTYPE))
+
+    meta = {
+        **(metadata or {}),
+        "format": FORMAT_NAME,
+        "version": FORMAT_VERSION,
+        "num_docs": len(texts),
+        "text_bytes": int(text_offsets[-1]),
+        "num_tokens": int(token_offsets[-1]),
+        "text_dtype": np.dtype(TEXT_DTYPE).name,
+        "offset_dtype": np.dtype(OFFSET_DTYPE).name,
+        "token_dtype": np.dtype(TOKEN_DTYPE).name,
+    }
+    with open(os.path.join(output_dir, META_FILE), "w", encoding="utf-8") as f:
+        json.dump(meta, f, ensure_ascii=False, indent=2)
+    return meta
+
+
+def build_dataset(output_dir: str, texts: Sequence[str], tokenizer,
+                  metadata: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    """
+    Tokenize texts once with tokenizer and write them in the memory-mapped format.
+
+    Args:
+        output_dir: Dataset directory to create
+        texts: Document texts
+        tokenizer: HuggingFace tokenizer used by the server
+        metadata: Extra fields stored in meta.json
+
+    Returns:
+        The meta.json content
+    """
+    texts = list(texts)
+    token_ids = tokenizer(texts, add_special_tokens=False)["input_ids"] if texts else []
+    special = tokenizer.num_special_tokens_to_add()
+    token_counts = [len(ids) + special for ids in token_ids]
+    metadata = {"tokenizer": getattr(tokenizer, "name_or_path", None),
+                "tokenizer_sha256": tokenizer_sha256(tokenizer),
+                "special_tokens": special,
+                **(metadata or {})}
+    return write_dataset(output_dir, texts, token_ids, token_counts, metadata)
+
+
+def _open_array(path: str, dtype, count: int) -> np.ndarray:
+    # numpy refuses to map empty files
+    if count == 0:
+        return np.zeros(0, dtype=dtype)
+    return np.memmap(path, dtype=dtype, mode="r", shape=(count,))
+
+
+class MmapDataset:
+    """Read-only view of a memory-mapped dataset; items are PretokenizedText."""
+
+    def __init__(self, path: str):
+        with open(os.path.join(path, META_FILE), "r", encoding="utf-8") as f:
+            self.meta = json.load(f)
+        if self.meta.get("format") != FORMAT_NAME:
+            raise ValueError(f"{path} is not a {FORMAT_NAME} dataset")
+        if self.meta.get("version") != FORMAT_VERSION:
+            raise ValueError(f"unsupported {FORMAT_NAME} version {self.meta.get('version')} in {path}")
+
+        self.path = path
+        n = self.meta["num_docs"]
+        self.text = _open_array(os.path.join(path, TEXT_FILE), self.meta["text_dtype"], self.meta["text_bytes"])
+        self.text_offsets = _open_array(os.path.join(path, TEXT_OFFSETS_FILE), self.meta["offset_dtype"], n + 1)
+        self.token_ids = _open_array(os.path.join(path, TOKEN_IDS_FILE), self.meta["token_dtype"],
+                                     self.meta["num_tokens"])
+        self.token_offsets = _open_array(os.path.join(path, TOKEN_OFFSETS_FILE), self.meta["offset_dtype"], n + 1)
+        self.token_counts = _open_array(os.path.join(path, TOKEN_COUNTS_FILE), self.meta["token_dtype"], n)
+
+    def __len__(self) -> int:
+        return self.meta["num_docs"]
+
+    def __getitem__(self, idx):
+        if isinstance(idx, slice):
+            return [self[i] for i in range(*idx.indices(len(self)))]
+        n = len(self)
+        if idx < 0:
+            idx += n
+        if not 0 <= idx < n:
+            raise IndexError(f"document index {idx} out of range for {n} documents")
+        start, end = self.text_offsets[idx], self.text_offsets[idx + 1]
+        text = PretokenizedText(self.text[start:end].tobytes().decode("utf-8"))
+        text.token_ids = self.doc_token_ids(idx)
+        text.token_count = int(self.token_counts[idx])
+        text.tokenizer_sha256 = self.meta.get("tokenizer_sha256")
+        return text
+
+    def __iter__(self):
+        for idx in range(len(self)):
+            yield self[idx]
+
+    def doc_token_ids(self, idx: int) -> np.ndarray:
+        """Token ids of document idx (a view into the memory map)."""
+        return self.token_ids[self.token_offsets[idx]:self.token_offsets[idx + 1]]
+
+
+def load_texts(path: str) -> Sequence[str]:
+    """
+    Load documents from a memory-mapped dataset or any of the JSON layouts in this repo.
+
+    JSON may be a 21_*.json split (dict with "chunks"), a token_len_*.json
+    list of strings, or a list of chunk dicts.
+    """
+    if is_mmap_dataset(path):
+        return MmapDataset(path)
+
+    with open(path, "r", encoding="utf-8") as f:
+        data = json.load(f)
+    if isinstance(data, dict):
+        data = data.get("chunks", [])
+    return [item["text"] if isinstance(item, dict) else item
+            for item in data if isinstance(item, str) or "text" in item]
+
+
+def encode_pretokenized(tokenizer, texts: Iterable[PretokenizedText], max_length: Optional[int] = None,
+                        add_special_tokens: bool = True) -> List[List[int]]:
+    """Build model input ids from stored token ids, mirroring tokenizer(texts, truncation=True)."""
+    special = tokenizer.num_special_tokens_to_add() if add_special_tokens else 0
+    input_ids = []
+    for text in texts:
+        ids = text.token_ids.tolist()
+        if max_length is not None:
+            ids = ids[:max(max_length - special, 0)]
+        if add_special_tokens:
+            ids = tokenizer.build_inputs_with_special_tokens(ids)
+        input_ids.append(ids)
+    return input_ids
+
+
+def tokenize_texts(tokenizer, texts: Sequence[str], truncation: bool = True, max_length: Optional[int] = None,
+                   **pad_kwargs):
+    """
+    Drop-in replacement for tokenizer(texts, ...) that reuses stored token ids.
+
+    Falls back to the tokenizer when any text is not a PretokenizedText or
+    the stored ids come from another tokenizer (see uses_stored_ids).
+    pad_kwargs are padding, pad_to_multiple_of, return_tensors, ...
+    """
+    texts = list(texts)
+    if (not texts or not all(isinstance(t, PretokenizedText) for t in texts)
+            or not uses_stored_ids(tokenizer, texts)):
+        return tokenizer(texts, truncation=truncation, max_length=max_length, **pad_kwargs)
+    input_ids = encode_pretokenized(tokenizer, texts, max_length if truncation else None)
+    return tokenizer.pad({"input_ids": input_ids}, **pad_kwargs)
+
+
+class PretokenizedTokenizer:
+    """Tokenizer wrapper whose encode() returns stored ids for PretokenizedText inputs of the same tokenizer."""
+
+    def __init__(self, tokenizer):
+        self.tokenizer = tokenizer
+
+    def encode(self, text, add_special_tokens=True, **kwargs):
+        if isinstance(text, PretokenizedText) and not kwargs and uses_stored_ids(self.tokenizer, [text]):
+            return encode_pretokenized(self.tokenizer, [text], add_special_tokens=add_special_tokens)[0]
+        return self.tokenizer.encode(text, add_special_tokens=add_special_tokens, **kwargs)
+
+    def __getattr__(self, name):
+        return getattr(self.tokenizer, name)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Convert a JSON dataset to the memory-mapped binary format")
+    parser.add_argument("--input_file", "-i", required=True, help="21_*.json or token_len_*.json input")
+    parser.add_argument("--output", "-o", help="Output dataset directory (default: <input>.mmap)")
+    parser.add_argument("--model", "-m", type=str, default="BAAI/bge-m3", help="Tokenizer model")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    output_dir = args.output or f"{os.path.splitext(args.input_file)[0]}.mmap"
+
+    try:
+        from transformers import AutoTokenizer
+        tokenizer = AutoTokenizer.from_pretrained(args.model)
+        texts = load_texts(args.input_file)
+        meta = build_dataset(output_dir, texts, tokenizer, {"original_file": args.input_file})
+    except Exception as e:
+        logging.error(f"Failed to convert {args.input_file}: {e}")
+        sys.exit(1)
+
+    logging.info(f"Wrote {meta['num_docs']} documents, {meta['num_tokens']} tokens to {output_dir}")
+
+
+if __name__ == "__main__":
+    main()
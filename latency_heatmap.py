@@ -0,0 +1,181 @@
+#!/usr/bin/env python3
+"""
+Latency over time from a stress_benchmark.py per-request result CSV.
+
+Requests are binned by start time (offset from the first request) and
+latency (log-spaced) into a 2-D histogram, next to per-bin p50/p90/p99
+bands and completed requests per second. Pauses that an aggregate p95 hides,
+such as GC stalls, HPU recompiles or server batch stalls, show up as columns
+of high latency or gaps.
+
+Anomalous windows are found automatically: bins whose p99 lies more than
+--threshold robust standard deviations (MAD based) above the run's median
+p99, bins that completed less than half the median throughput, and bins whose
+error rate is above 1% and five times the run's. Neighbouring anomalous bins are merged into windows.
+
+Example:
+    python latency_heatmap.py bench_0620-1030_c-64.result.csv -o bench_0620-1030_c-64.heatmap.html
+"""
+
+import argparse
+import os
+
+import numpy as np
+
+from analyze_results import CHUNK_BYTES, read_chunks
+from report_html import heatmap, line_chart, page, table
+
+MAX_TIME_BINS = 600
+
+
+def load_requests(path, workers=1):
+    """(start offsets, latencies, ok) of all requests, latency tm_end - tm_start where overall is missing."""
+    starts, latencies, ok = [], [], []
+    for chunk in read_chunks(path, CHUNK_BYTES, workers):
+        latency = np.where(np.isnan(chunk["overall"]), chunk["tm_end"] - chunk["tm_start"], chunk["overall"])
+        starts.append(chunk["tm_start"])
+        latencies.append(latency)
+        ok.append(chunk["code"] == 200)
+    if not starts:
+        raise ValueError(f"no requests in {path}")
+    starts, latencies, ok = np.concatenate(starts), np.concatenate(latencies), np.concatenate(ok)
+    keep = ~np.isnan(starts) & ~np.isnan(latencies)
+    starts, latencies, ok = starts[keep], latencies[keep], ok[keep]
+    return starts - starts.min(), latencies, ok
+
+
+def time_edges(starts, bin_seconds):
+    """Time bin edges, coarsened so there are at most MAX_TIME_BINS bins; at least one bin."""
+    duration = float(starts.max()) if len(starts) else 0.0
+    bin_seconds = max(bin_seconds, duration / MAX_TIME_BINS)
+    nbins = max(int(np.ceil(duration / bin_seconds)), 1)
+    return np.arange(nbins + 1) * bin_seconds
+
+
+def binned_percentiles(bins, values, nbins, percentiles=(50, 90, 99)):
+    """Nearest-rank percentiles of values per bin index, NaN for empty bins."""
+    order = np.lexsort((values, bins))
+    sorted_values = values[order]
+    counts = np.bincount(bins, minlength=nbins)
+    offsets = np.concatenate(([0], np.cumsum(counts)[:-1]))
+    result = {}
+    for p in percentiles:
+        rank = np.maximum(np.ceil(counts * p / 100).astype(np.int64) - 1, 0)
+        picked = sorted_values[np.minimum(offsets + rank, len(sorted_values) - 1)] if len(sorted_values) else rank
+        result[f"p{p}"] = np.where(counts > 0, picked, np.nan)
+    return result, counts
+
+
+def robust_high(values, threshold):
+    """Values more than threshold MAD-scaled deviations above the median."""
+    valid = values[~np.isnan(values)]
+    if len(valid) == 0:
+        return np.zeros(len(values), dtype=bool)
+    median = np.median(valid)
+    mad = 1.4826 * np.median(np.abs(valid - median))
+    # a perfectly flat run has MAD 0, fall back to 10% of the median
+    scale = mad if mad > 0 else 0.1 * median
+    return np.nan_to_num(values, nan=-np.inf) > median + threshold * scale
+
+
+def find_anomalies(edges, bands, completed, errors, threshold=5.0):
+    """Merged windows of anomalous time bins, each with its reasons and worst p99."""
+    slow = robust_high(bands["p99"], threshold)
+    busy = completed[completed > 0]
+    # the first and last bin are partial, never call them stalls
+    stalled = completed < 0.5 * np.median(busy) if len(busy) else np.zeros(len(completed), dtype=bool)
+    stalled[[0, -1]] = False
+    # a steady trickle of errors is a property of the run, a burst is an anomaly
+    requests = completed + errors
+    run_rate = errors.sum() / max(requests.sum(), 1)
+    failing = errors > np.maximum(5 * run_rate, 0.01) * np.maximum(requests, 1)
+    flags = slow | stalled | failing
+
+    windows = []
+    i = 0
+    while i < len(flags):
+        if not flags[i]:
+            i += 1
+            continue
+        j = i
+        while j + 1 < len(flags) and flags[j + 1]:
+            j += 1
+        reasons = [name for name, mask in [("p99 spike", slow), ("throughput drop", stalled), ("errors", failing)]
+                   if mask[i:j + 1].any()]
+        window_p99 = bands["p99"][i:j + 1]
+        windows.append({
+            "start s": float(edges[i]),
+            "end s": float(edges[j + 1]),
+            "reason": ", ".join(reasons),
+            "worst p99 ms": float(np.nanmax(window_p99)) * 1000 if not np.isnan(window_p99).all() else None,
+            "completed": int(completed[i:j + 1].sum()),
+            "errors": int(errors[i:j + 1].sum()),
+        })
+        i = j + 1
+    return windows
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Latency-over-time heatmap of a result CSV",
+                                     formatter_class=argparse.RawDescriptionHelpFormatter, epilog=__doc__)
+    parser.add_argument("result_csv", type=str, help="bench_*.result.csv file")
+    parser.add_argument("--bin", type=float, default=1.0,
+                        help=f"Time bin in seconds, widened to keep at most {MAX_TIME_BINS} bins (default: 1)")
+    parser.add_argument("--latency_bins", type=int, default=48, help="Log-spaced latency bins (default: 48)")
+    parser.add_argument("--threshold", type=float, default=5.0,
+                        help="Robust deviations above the median p99 that make a bin anomalous (default: 5)")
+    parser.add_argument("--workers", type=int, default=min(os.cpu_count() or 1, 8),
+                        help="Processes parsing the CSV (default: CPUs, at most 8)")
+    parser.add_argument("-o", "--output", type=str, default=None,
+                        help="HTML report (default: the result file with .heatmap.html)")
+    args = parser.parse_args()
+
+    starts, latencies, ok = load_requests(args.result_csv, args.workers)
+    edges = time_edges(starts, args.bin)
+    nbins = len(edges) - 1
+    bins = np.clip(np.searchsorted(edges, starts, side="right") - 1, 0, nbins - 1)
+
+    good = latencies[ok]
+    low, high = max(float(good.min()), 1e-4) if len(good) else 1e-4, float(good.max()) if len(good) else 1.0
+    latency_edges = np.geomspace(low, max(high, low * 1.01), args.latency_bins + 1)
+    counts, _, _ = np.histogram2d(starts[ok], np.clip(good, low, latency_edges[-1]), bins=[edges, latency_edges])
+    bands, completed = binned_percentiles(bins[ok], good, nbins)
+    errors = np.bincount(bins[~ok], minlength=nbins)
+    anomalies = find_anomalies(edges, bands, completed, errors, args.threshold)
+
+    width = edges[1] - edges[0]
+    print(f"{len(starts)} requests over {edges[-1]:.0f}s in {nbins} bins of {width:.2f}s")
+    if anomalies:
+        print(f"{len(anomalies)} anomalous windows:")
+        for a in anomalies:
+            worst = f", worst p99 {a['worst p99 ms']:.1f}ms" if a["worst p99 ms"] is not None else ""
+            print(f"  {a['start s']:8.1f}s - {a['end s']:8.1f}s  {a['reason']}{worst}, "
+                  f"{a['completed']} ok / {a['errors']} failed")
+    else:
+        print("No anomalous windows")
+
+    mids = (edges[:-1] + edges[1:]) / 2
+    spans = [(a["start s"], a["end s"]) for a in anomalies]
+    band_series = [(name, [(float(x), float(v) * 1000 if not np.isnan(v) else None) for x, v in zip(mids, values)],
+                    False) for name, values in bands.items()]
+    sections = [
+        f'<p class="note">{os.path.basename(args.result_csv)}: {len(starts)} requests, {int((~ok).sum())} failed, '
+        f"{nbins} time bins of {width:.2f}s</p>",
+        heatmap(counts, edges, latency_edges * 1000, "Requests by start time and latency", "seconds since start",
+                "latency ms", spans),
+        line_chart(band_series, f"Latency percentiles per {width:.2f}s", "seconds since start", "ms",
+                   spans=spans, width=900),
+        line_chart([("ok", [(float(x), float(n) / width) for x, n in zip(mids, completed)], False),
+                    ("failed", [(float(x), float(n) / width) for x, n in zip(mids, errors)], False)],
+                   "Requests per second (by start time)", "seconds since start", "requests/s",
+                   spans=spans, width=900),
+        "<h2>Anomalous windows</h2>" + (table(anomalies) if anomalies else '<p class="note">None found</p>'),
+    ]
+    output = args.output or os.path.splitext(args.result_csv)[0].replace(".result", "") + ".heatmap.html"
+    with open(output, "w", encoding="utf8") as f:
+        f.write(page("Latency over time", sections))
+    print(f"Report saved to {output}")
+
+
+if __name__ == "__main__":
+    main()
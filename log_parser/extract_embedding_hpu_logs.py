@@ -1,127 +1,42 @@
 #!/usr/bin/env python3
 """
-Extract information from HPU log files and save to CSV.
+Export HPU embedding stress runs from the results database to CSV.
+
+Runs are the stress_benchmark.py records tagged hardware=hpu (loop_hpu.sh
+sets BENCH_TAGS); hpu_*.log files from before run records are added with
+log_parser/import_logs.py, records from other hosts with results_db.py ingest.
 """
 
+import argparse
 import os
-import re
+import sys
 import csv
-from glob import glob
 
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from results_db import DEFAULT_DB, connect, query_runs
 
-def parse_log_filename(filename):
-    """Parse log filename to extract model, data file, and concurrency."""
-    basename = os.path.basename(filename)
-    if not basename.startswith('hpu_') or not basename.endswith('.log'):
-        return None
-    
-    # Remove prefix and suffix
-    parts = basename[4:-4].split('_')
-    if len(parts) < 5:
-        return None
-    
-    # Format: model_datafile_concurrency_timestamp
-    # Find the parts: model can contain underscores, data file is 21_512, concurrency is number
-    model_parts = []
-    i = 0
-    while i < len(parts) and not (parts[i].isdigit() and i + 1 < len(parts) and parts[i+1].isdigit()):
-        model_parts.append(parts[i])
-        i += 1
-    
-    if i + 2 >= len(parts):
-        return None
-    
-    model = '_'.join(model_parts)
-    data_file = f"{parts[i]}_{parts[i+1]}"
-    concurrency = parts[i+2]
-    
-    return {
-        'model': model,
-        'data_file': data_file,
-        'concurrency': concurrency
-    }
 
+def load_results(db_path=DEFAULT_DB, hardware='hpu'):
+    """One row per stress_benchmark.py run on the given hardware."""
+    conn = connect(db_path)
+    runs = query_runs(conn, 'stress_benchmark', "json_extract(config, '$.tags.hardware') = ?", (hardware,))
+    conn.close()
 
-def extract_log_data(filepath):
-    """Extract metrics from log file content."""
-    data = {
-        'qps': None,
-        'total_time': None,
-        'avg_time': None,
-        'median_time': None,
-        'p90_time': None,
-        'p95_time': None
-    }
-    
-    try:
-        with open(filepath, 'r', encoding='utf-8') as f:
-            content = f.read()
-        
-        # Extract QPS
-        qps_match = re.search(r'QPS:\s*([\d.]+)\s*请求/秒', content)
-        if qps_match:
-            data['qps'] = float(qps_match.group(1))
-        
-        # Extract total time
-        total_time_match = re.search(r'总耗时:\s*([\d.]+)\s*秒', content)
-        if total_time_match:
-            data['total_time'] = float(total_time_match.group(1))
-        
-        # Extract average time
-        avg_match = re.search(r'平均值:\s*([\d.]+)s', content)
-        if avg_match:
-            data['avg_time'] = float(avg_match.group(1))
-        
-        # Extract median time
-        median_match = re.search(r'中位数:\s*([\d.]+)s', content)
-        if median_match:
-            data['median_time'] = float(median_match.group(1))
-        
-        # Extract P90 time
-        p90_match = re.search(r'P90:\s*([\d.]+)s', content)
-        if p90_match:
-            data['p90_time'] = float(p90_match.group(1))
-        
-        # Extract P95 time
-        p95_match = re.search(r'P95:\s*([\d.]+)s', content)
-        if p95_match:
-            data['p95_time'] = float(p95_match.group(1))
-            
-    except Exception as e:
-        print(f"Error processing {filepath}: {e}")
-    
-    return data
-
-
-def process_log_directory(directory='.'):
-    """Process all log files in the directory."""
-    log_files = glob(os.path.join(directory, 'hpu_*.log'))
-    
     results = []
-    
-    for log_file in log_files:
-        filename_data = parse_log_filename(log_file)
-        if not filename_data:
-            continue
-            
-        log_data = extract_log_data(log_file)
-        
-        # Combine filename and log data
-        result = {
-            'filename': os.path.basename(log_file),
-            'model': filename_data['model'],
-            'data_file': filename_data['data_file'],
-            'concurrency': filename_data['concurrency'],
-            'qps': log_data['qps'],
-            'total_time': log_data['total_time'],
-            'avg_time': log_data['avg_time'],
-            'median_time': log_data['median_time'],
-            'p90_time': log_data['p90_time'],
-            'p95_time': log_data['p95_time']
-        }
-        
-        results.append(result)
-    
+    for run in runs:
+        summary = run['summary']
+        results.append({
+            'filename': run['run_id'],
+            'model': run['model'] or '',
+            'data_file': run['dataset'] or '',
+            'concurrency': run['concurrency'],
+            'qps': summary.get('requests_per_sec'),
+            'total_time': summary.get('total_duration'),
+            'avg_time': summary.get('first_chunk_avg'),
+            'median_time': summary.get('first_chunk_median'),
+            'p90_time': summary.get('first_chunk_p90'),
+            'p95_time': summary.get('first_chunk_p95')
+        })
     return results
 
 
@@ -209,13 +124,16 @@ def save_grouped_csv(results, output_file='hpu_results_grouped.csv'):
 
 def main():
     """Main function."""
-    directory = '.'  # Current directory
-    
-    print("Processing HPU log files...")
-    results = process_log_directory(directory)
+    parser = argparse.ArgumentParser(description="Export HPU embedding runs to CSV")
+    parser.add_argument('--db', type=str, default=DEFAULT_DB, help=f"Results database (default: {DEFAULT_DB})")
+    parser.add_argument('--hardware', type=str, default='hpu', help="hardware tag of the runs (default: hpu)")
+    args = parser.parse_args()
+
+    print(f"Querying {args.hardware} runs in {args.db}...")
+    results = load_results(args.db, args.hardware)
     
     if results:
-        print(f"Processed {len(results)} log files")
+        print(f"Found {len(results)} runs")
         
         # Save grouped by model and sorted
         save_to_csv(results)
@@ -224,7 +142,7 @@ def main():
         models = save_grouped_csv(results)
         
     else:
-        print("No valid log files found")
+        print("No matching runs found")
 
 
 if __name__ == '__main__':
@@ -0,0 +1,225 @@
+#!/usr/bin/env python3
+"""
+Import results from before run records into the results database.
+
+Recognized files (directories are searched for *.log and *.result.csv):
+
+  [<trial>_]hpu_<model>_<dataset>_<concurrency>_<date>_<time>.log
+      stress_benchmark.py output tee'd by loop_hpu.sh. Embedding requests
+      finish with their first chunk, so the printed First Chunk statistics
+      are stored as the request latency (overall_*) too. A leading number is
+      the trial of the cell and becomes the tag trial=<n>.
+  [<trial>_]<hardware>_<length>_<model>_<concurrency>_<date>_<time>.log
+      rerank_bench/concurrent_bench.py output tee'd by loop_rerank*.sh. These
+      logs print num_queries as Total Requests while worker i sent
+      max(num_queries - i, 0) requests; the real count is restored, and requests_per_sec
+      is requests / test time (the logged QPS is about 1 / mean latency).
+  bench_<date>_c-<concurrency>.result.csv
+      stress_benchmark.py per-request results, with latency histograms; model
+      and dataset are not in the file, give them with --tag. A CSV with a
+      .run.json next to it is skipped, add that with results_db.py ingest.
+
+Run ids are derived from the file name, so importing the same files again
+skips them. Imported runs carry the tag imported=<file name>.
+
+Example:
+    python log_parser/import_logs.py embed_result/ rerank_bench/ --db bench_results.db
+    python log_parser/import_logs.py old/bench_0620-1030_c-64.result.csv --tag hardware=xeon --tag model=bge-m3
+"""
+
+import argparse
+import hashlib
+import os
+import re
+import sys
+import time
+from glob import glob
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from results_db import DEFAULT_DB, connect, histogram, insert_record, parse_tags
+
+STRESS_PATTERNS = {
+    'total_requests': r'总请求数:\s*(\d+)',
+    'requests_per_sec': r'QPS:\s*([\d.]+)\s*请求/秒',
+    'total_duration': r'总耗时:\s*([\d.]+)\s*秒',
+    'first_chunk_avg': r'平均值:\s*([\d.]+)s',
+    'first_chunk_median': r'中位数:\s*([\d.]+)s',
+    'first_chunk_p90': r'P90:\s*([\d.]+)s',
+    'first_chunk_p95': r'P95:\s*([\d.]+)s',
+    'first_chunk_p99': r'P99:\s*([\d.]+)s',
+}
+
+RERANK_PATTERNS = {
+    'total_concurrency': r'Total Concurrency:\s*(\d+)',
+    'logged_requests': r'Total Requests:\s*(\d+)',
+    'total_test_time': r'Total Test time:\s*([\d.]+)',
+    'avg_total_latency': r'avg total latency is\s*([\d.]+)\s*s',
+    'p50_total_latency': r'P50 total latency is\s*([\d.]+)\s*s',
+    'p90_total_latency': r'P90 total latency is\s*([\d.]+)\s*s',
+    'p99_total_latency': r'P99 total latency is\s*([\d.]+)\s*s',
+    'total_error_requests': r'Total error request is\s*(\d+)',
+    'query_per_s': r'QPS is\s*([\d.]+)',
+}
+
+
+def match_all(patterns, content):
+    """Values of the patterns found in content; counts as int, the rest as float"""
+    values = {}
+    for key, pattern in patterns.items():
+        match = re.search(pattern, content, re.IGNORECASE)
+        if match:
+            number = match.group(1)
+            values[key] = float(number) if '.' in number else int(number)
+    return values
+
+
+def file_time(parts, path):
+    """Unix time of the trailing <date>_<time> of a log name, the file's mtime without one"""
+    try:
+        return time.mktime(time.strptime(f"{parts[-2]}_{parts[-1]}", '%Y%m%d_%H%M%S'))
+    except (IndexError, ValueError):
+        return os.path.getmtime(path)
+
+
+def split_trial(path):
+    """(name parts without a leading trial number, trial tags) of a log file name"""
+    parts = os.path.basename(path)[:-4].split('_')
+    # loop_hpu.sh names repeated runs <trial>_hpu_..., the rest of the name is the cell
+    if len(parts) > 1 and parts[0].isdigit():
+        return parts[1:], {'trial': parts[0]}
+    return parts, {}
+
+
+def make_imported(tool, path, created, config, summary, histograms=None, tags=None):
+    """A run record for an imported file; the run id is a hash of the file name"""
+    name = os.path.basename(path)
+    digest = hashlib.sha1(name.encode('utf8')).hexdigest()[:8]
+    return {
+        'run_id': f"{tool}-{time.strftime('%Y%m%d-%H%M%S', time.localtime(created))}-{digest}",
+        'tool': tool,
+        'created': created,
+        'config': {**config, 'tags': {**(tags or {}), 'imported': name}},
+        'environment': {},
+        'summary': summary,
+        'histograms': histograms or {},
+    }
+
+
+def stress_log_record(path, content, tags):
+    # [<trial>_]hpu_<model>_<a>_<b>_<concurrency>_<date>_<time>.log, model names may contain underscores
+    parts, trial = split_trial(path)
+    if len(parts) < 7 or not parts[-3].isdigit():
+        return None
+    summary = match_all(STRESS_PATTERNS, content)
+    if 'requests_per_sec' not in summary:
+        return None
+    for stat in ['avg', 'median', 'p90', 'p95', 'p99']:
+        if f'first_chunk_{stat}' in summary:
+            summary[f'overall_{stat}'] = summary[f'first_chunk_{stat}']
+    model, dataset = '_'.join(parts[1:-5]), '_'.join(parts[-5:-3])
+    config = {'task': 'embedding', 'model': model, 'dataset': f"{dataset}.json", 'concurrency': int(parts[-3])}
+    return make_imported('stress_benchmark', path, file_time(parts, path), config, summary,
+                         tags={'hardware': parts[0], 'model': model, 'dataset': dataset, **trial, **tags})
+
+
+def rerank_log_record(path, content, tags):
+    # [<trial>_]<hardware>_<length>_<model>_<concurrency>_<date>_<time>.log
+    parts, trial = split_trial(path)
+    if len(parts) < 6 or not parts[-3].isdigit():
+        return None
+    summary = match_all(RERANK_PATTERNS, content)
+    if 'logged_requests' not in summary or 'total_concurrency' not in summary:
+        return None
+    concurrency, queries = summary['total_concurrency'], summary.pop('logged_requests')
+    # worker i sends num_queries - i requests, workers past num_queries send none
+    summary['total_requests'] = sum(max(queries - i, 0) for i in range(concurrency))
+    if summary.get('total_test_time'):
+        summary['requests_per_sec'] = summary['total_requests'] / summary['total_test_time']
+    model, length = '_'.join(parts[2:-3]), parts[1]
+    config = {'task': 'tei_rerank', 'num_queries': queries, 'concurrency': concurrency,
+              'dataset': f"token_len_{length}.json"}
+    return make_imported('concurrent_bench', path, file_time(parts, path), config, summary,
+                         tags={'hardware': parts[0], 'model': model, 'dataset_length': length, **trial, **tags})
+
+
+def csv_record(path, tags):
+    # numpy is only needed for result CSVs
+    import numpy as np
+    from analyze_results import analyze, load_results
+
+    match = re.search(r'_c-(\d+)\.result\.csv$', path)
+    results = load_results(path)
+    report = analyze(results)
+    summary = {
+        'total_requests': report['total_requests'],
+        'success_rate': report['success'] / report['total_requests'],
+        'error_rate': report['failed'] / report['total_requests'],
+        'requests_per_sec': report['tps'],
+        'total_duration': report['duration'],
+    }
+    for name in ['first_chunk', 'overall']:
+        stats = report[name]
+        if stats is None:
+            continue
+        percentiles = {row['percentile']: row['value'] for row in stats['percentiles']}
+        summary.update({f'{name}_min': stats['min'], f'{name}_max': stats['max'], f'{name}_avg': stats['mean'],
+                        f'{name}_median': percentiles[50], f'{name}_p90': percentiles[90],
+                        f'{name}_p95': percentiles[95], f'{name}_p99': percentiles[99]})
+    histograms = {name: histogram(results[name][~np.isnan(results[name])].tolist())
+                  for name in ['first_chunk', 'overall']}
+    config = {'concurrency': int(match.group(1)) if match else None, 'result_csv': path,
+              'model': tags.get('model'), 'dataset': tags.get('dataset')}
+    return make_imported('stress_benchmark', path, report['run_start'], config, summary, histograms, tags)
+
+
+def import_file(path, tags):
+    """Run record of one file, None if it is not a recognized log or result file"""
+    if path.endswith('.result.csv'):
+        if os.path.exists(path.replace('.result.csv', '.run.json')):
+            print(f"Skipping {path}: has a run record, use results_db.py ingest")
+            return None
+        return csv_record(path, tags)
+    with open(path, encoding='utf-8', errors='replace') as f:
+        content = f.read()
+    if 'Total Concurrency:' in content:
+        return rerank_log_record(path, content, tags)
+    return stress_log_record(path, content, tags)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Import old benchmark logs and result CSVs into the results database",
+                                     formatter_class=argparse.RawDescriptionHelpFormatter, epilog=__doc__)
+    parser.add_argument('paths', nargs='+', help="Log files, result CSVs or directories of them")
+    parser.add_argument('--db', type=str, default=DEFAULT_DB, help=f"Results database (default: {DEFAULT_DB})")
+    parser.add_argument('--tag', type=str, action='append', default=[],
+                        help="key=value tag for every imported run, overrides tags from file names")
+    args = parser.parse_args()
+
+    tags = parse_tags(args.tag)
+    files = []
+    for path in args.paths:
+        if os.path.isdir(path):
+            files += sorted(glob(os.path.join(path, '*.log')) + glob(os.path.join(path, '*.result.csv')))
+        else:
+            files.append(path)
+
+    conn = connect(args.db)
+    added = skipped = unrecognized = 0
+    for path in files:
+        try:
+            record = import_file(path, tags)
+        except (OSError, ValueError) as e:
+            print(f"Error processing {path}: {e}")
+            record = None
+        if record is None:
+            unrecognized += 1
+        elif insert_record(conn, record):
+            added += 1
+        else:
+            skipped += 1
+    conn.close()
+    print(f"Added {added} runs, {skipped} already present, {unrecognized} files not imported in {args.db}")
+
+
+if __name__ == '__main__':
+    main()
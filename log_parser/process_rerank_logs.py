@@ -1,7 +1,7 @@
 #!/usr/bin/env python3
 """
-Log file processing script
-Extracts metadata from filenames and statistical information from log content
+Rerank run processing script
+Reads concurrent_bench.py run records from the results database
 Generates CSV output sorted by model, dataset length, and concurrency level
 """
 
@@ -10,74 +10,15 @@ import re
 import csv
 import sys
 from datetime import datetime
-from pathlib import Path
 
-
-def extract_metadata_from_filename(filename):
-    """
-    Extract metadata from filename based on pattern:
-    xeon_1000_bge-reranker-base_1_20250822_015049.log
-    
-    Returns: dict with hardware, dataset_length, model_name, concurrency_level
-    """
-    # Remove .log extension
-    base_name = filename.rsplit('.', 1)[0]
-    
-    # Split by underscore
-    parts = base_name.split('_')
-    
-    if len(parts) >= 5:
-        hardware = parts[0]
-        dataset_length = parts[1]
-        
-        # Find model name (everything between dataset_length and second-to-last part)
-        model_parts = parts[2:-3]
-        model_name = '_'.join(model_parts)
-        
-        concurrency_level = parts[-3]
-        
-        return {
-            'hardware': hardware,
-            'dataset_length': int(dataset_length) if dataset_length.isdigit() else dataset_length,
-            'model_name': model_name,
-            'concurrency_level': int(concurrency_level) if concurrency_level.isdigit() else concurrency_level,
-            'filename': filename
-        }
-    else:
-        return None
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from results_db import DEFAULT_DB, connect, query_runs
 
 
-def extract_statistics_from_content(content):
+def add_derived_metrics(stats):
     """
-    Extract statistical information from log content based on the provided format
+    Add throughput and success/error rates computed from the run summary
     """
-    stats = {}
-    
-    # Define patterns to extract statistics
-    patterns = {
-        'total_concurrency': r'Total Concurrency:\s*(\d+)',
-        'total_requests': r'Total Requests:\s*(\d+)',
-        'total_test_time': r'Total Test time:\s*([\d.]+)',
-        'avg_total_latency': r'avg total latency is\s*([\d.]+)\s*s',
-        'p50_total_latency': r'P50 total latency is\s*([\d.]+)\s*s',
-        'p90_total_latency': r'P90 total latency is\s*([\d.]+)\s*s',
-        'p99_total_latency': r'P99 total latency is\s*([\d.]+)\s*s',
-        'total_error_requests': r'Total error request is\s*(\d+)',
-        'query_per_s': r'QPS is\s*(\d+)',
-    }
-    
-    for key, pattern in patterns.items():
-        match = re.search(pattern, content, re.IGNORECASE)
-        if match:
-            try:
-                stats[key] = float(match.group(1))
-                # Convert integer values to int if they are whole numbers
-                if key in ['total_concurrency', 'total_requests', 'total_error_requests']:
-                    stats[key] = int(stats[key])
-            except ValueError:
-                stats[key] = match.group(1)
-    
-    # Calculate derived metrics
     if 'total_requests' in stats and 'total_test_time' in stats and stats['total_test_time'] > 0:
         stats['throughput_qps'] = stats['total_requests'] / stats['total_test_time']
     
@@ -90,57 +31,56 @@ def extract_statistics_from_content(content):
     return stats
 
 
-def process_log_file(file_path):
+def length_key(length):
     """
-    Process a single log file and extract all relevant information
+    Sort key of a dataset length: an int, or a string when the tag is not numeric
     """
-    filename = os.path.basename(file_path)
-    
-    # Extract metadata from filename
-    metadata = extract_metadata_from_filename(filename)
-    if not metadata:
-        print(f"Skipping file with invalid format: {filename}")
-        return None
-    
-    # Read file content
-    try:
-        with open(file_path, 'r', encoding='utf-8') as f:
-            content = f.read()
-    except Exception as e:
-        print(f"Error reading file {filename}: {e}")
-        return None
-    
-    # Extract statistics
-    stats = extract_statistics_from_content(content)
-    
-    # Add file metadata
-    file_stats = os.stat(file_path)
-    metadata['file_size_bytes'] = file_stats.st_size
-    metadata['last_modified'] = datetime.fromtimestamp(file_stats.st_mtime).isoformat()
-    
-    # Combine metadata and statistics
-    result = {**metadata, **stats}
-    
-    # Add raw content preview for debugging
-    if not stats:
-        result['raw_content'] = content.strip()[:100]
-    
-    return result
+    return (0, length, '') if isinstance(length, int) else (1, 0, str(length))
 
 
-def process_directory(directory_path):
+def sort_key(item):
     """
-    Process all log files in the given directory
+    Typed sort key by model name, dataset length and concurrency (which can be missing)
     """
-    log_files = []
-    
-    # Find all .log files
-    for file_path in Path(directory_path).glob('*.log'):
-        result = process_log_file(str(file_path))
-        if result:
-            log_files.append(result)
+    concurrency = item['concurrency_level']
+    return (item['model_name'], length_key(item['dataset_length']), concurrency if concurrency is not None else -1)
+
+
+def process_run(run):
+    """
+    Turn a concurrent_bench.py run record into a CSV row
+
+    hardware, dataset_length and model_name come from the run tags
+    (--tag hardware=xeon --tag dataset_length=500 --tag model=...), falling
+    back to the dataset file name and the model column
+    """
+    tags = run['tags']
+    dataset_length = tags.get('dataset_length')
+    if dataset_length is None:
+        digits = re.findall(r'\d+', run['dataset'] or '')
+        dataset_length = digits[-1] if digits else ''
+    
+    metadata = {
+        'hardware': tags.get('hardware', ''),
+        'dataset_length': int(dataset_length) if str(dataset_length).isdigit() else dataset_length,
+        'model_name': run['model'] or '',
+        'concurrency_level': run['concurrency'],
+        'filename': run['run_id'],
+        'hostname': run['hostname'],
+        'created': datetime.fromtimestamp(run['created']).isoformat(),
+    }
     
-    return log_files
+    return {**metadata, **add_derived_metrics(dict(run['summary']))}
+
+
+def process_database(db_path):
+    """
+    Process all concurrent_bench.py runs in the given database
+    """
+    conn = connect(db_path)
+    runs = query_runs(conn, 'concurrent_bench')
+    conn.close()
+    return [process_run(run) for run in runs]
 
 
 def save_to_csv(data, output_path):
@@ -152,11 +92,7 @@ def save_to_csv(data, output_path):
         return
     
     # Sort data: by model_name, then dataset_length, then concurrency_level
-    sorted_data = sorted(data, key=lambda x: (
-        x['model_name'],
-        x['dataset_length'],
-        x['concurrency_level']
-    ))
+    sorted_data = sorted(data, key=sort_key)
     
     # Define standard column order
     primary_columns = [
@@ -210,15 +146,15 @@ def print_summary(data):
     print(f"Models found: {len(models)}")
     for model, items in models.items():
         dataset_lengths = set(item['dataset_length'] for item in items)
-        concurrency_levels = set(item['concurrency_level'] for item in items)
-        print(f"  {model}: {len(items)} files, dataset lengths: {sorted(dataset_lengths)}, concurrency: {sorted(concurrency_levels)}")
+        concurrency_levels = set(item['concurrency_level'] for item in items if item['concurrency_level'] is not None)
+        print(f"  {model}: {len(items)} runs, dataset lengths: {sorted(dataset_lengths, key=length_key)}, concurrency: {sorted(concurrency_levels)}")
     
     # Overall stats
     dataset_lengths = set(item['dataset_length'] for item in data)
-    total_files = len(data)
+    total_runs = len(data)
     
-    print(f"\nDataset lengths: {sorted(dataset_lengths)}")
-    print(f"Total log files processed: {total_files}")
+    print(f"\nDataset lengths: {sorted(dataset_lengths, key=length_key)}")
+    print(f"Total runs processed: {total_runs}")
     
     # Show first few records
     if data:
@@ -229,25 +165,25 @@ def print_summary(data):
 
 def main():
     """
-    Main function to handle command line arguments and process logs
+    Main function to handle command line arguments and process runs
     """
-    if len(sys.argv) != 2:
-        print("Usage: python process_logs.py <directory_path>")
+    if len(sys.argv) > 2:
+        print(f"Usage: python process_rerank_logs.py [results_db (default: {DEFAULT_DB})]")
         sys.exit(1)
     
-    directory_path = sys.argv[1]
+    db_path = sys.argv[1] if len(sys.argv) == 2 else DEFAULT_DB
     
-    if not os.path.isdir(directory_path):
-        print(f"Error: {directory_path} is not a valid directory")
+    if not os.path.isfile(db_path):
+        print(f"Error: {db_path} is not a results database")
         sys.exit(1)
     
-    print(f"Processing log files in: {directory_path}")
+    print(f"Processing rerank runs in: {db_path}")
     
-    # Process all log files
-    log_data = process_directory(directory_path)
+    # Process all runs
+    run_data = process_database(db_path)
     
-    if not log_data:
-        print("No log files found or processed successfully")
+    if not run_data:
+        print("No rerank runs found")
         sys.exit(1)
     
     # Generate output filename with timestamp
@@ -255,10 +191,10 @@ def main():
     output_path = f"processed_logs_{timestamp}.csv"
     
     # Save to CSV
-    save_to_csv(log_data, output_path)
+    save_to_csv(run_data, output_path)
     
     # Print summary
-    print_summary(log_data)
+    print_summary(run_data)
 
 
 if __name__ == "__main__":
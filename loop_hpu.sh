@@ -9,6 +9,11 @@ CONTAINER_NAME=tei-embedding-serving
 export DATA_PATH=/mnt/disk1/models
 COMPOSE_FILE=`pwd`/compose.yaml.hpu
 export host_ip=127.0.0.1
+# set PREPARE_DATASETS=1 to split 21st_strip.txt with each model's own tokenizer
+# (cached by corpus/tokenizer/length, so only missing splits are computed)
+PREPARE_DATASETS=${PREPARE_DATASETS:-0}
+TRIALS=${TRIALS:-2}
+MAX_TRIALS=${MAX_TRIALS:-4}
 for model in bge-base-zh-v1.5 bge-large-zh-v1.5 bge-m3 Qwen3-Embedding-0.6B Qwen3-Embedding-4B Qwen3-Embedding-8B gte-modernbert-base;
 #for model in gte-modernbert-base;
 do
@@ -38,6 +43,15 @@ case $model in
 esac
 
 export warmup_length=$length
+if [ "$PREPARE_DATASETS" -eq 1 ]; then
+    for i in "${!files[@]}"; do
+        split_length=$(basename "${files[$i]}" .json | cut -d_ -f2)
+        model_file=datasets/${model}/${files[$i]}
+        python3 data_set_split/tokenize_split.py -i 21st_strip.txt -l $split_length \
+            -m ${DATA_PATH}/${model} -o $model_file --cache || exit 1
+        files[$i]=$model_file
+    done
+fi
 docker-compose -f "$COMPOSE_FILE" up --build -d >/dev/null 2>&1
 echo "Waiting for container to initialize..."
 sleep 20
@@ -64,6 +78,9 @@ while true; do
     sleep 30
 done
 echo "Conduct test now..."
+
+# serving container's cards, for per-card throughput in compare_hardware.py
+devices=$(docker exec "$CONTAINER_NAME" printenv HABANA_VISIBLE_DEVICES)
 mkdir -p embed_result
 for file in "${files[@]}"; do 
 for user in 1 4 8 16 32 64;
@@ -71,8 +88,11 @@ for user in 1 4 8 16 32 64;
 do
     echo "----start test $model $file $user"
     prefix=$(basename "$file" .json)
-    bash stress.sh embedding $user $file json 2>&1 | tee -a embed_result/1_hpu_${model}_${prefix}_${user}_$(date '+%Y%m%d_%H%M%S').log
-    bash stress.sh embedding $user $file json 2>&1 | tee -a embed_result/hpu_${model}_${prefix}_${user}_$(date '+%Y%m%d_%H%M%S').log
+    # run tags stored in the stress_benchmark.py run record (results_db.py)
+    export BENCH_TAGS="hardware=hpu devices=${devices} model=${model} dataset=${prefix}"
+    # TRIALS runs per cell, up to MAX_TRIALS while the confidence intervals are wider than 10% (trials.py)
+    python3 trials.py run --cell ${model}/${prefix}/c${user} -k $TRIALS --max_trials $MAX_TRIALS \
+        -- bash stress.sh embedding $user $file json 2>&1 | tee -a embed_result/hpu_${model}_${prefix}_${user}_$(date '+%Y%m%d_%H%M%S').log
 done
 done
 done
@@ -31,6 +31,11 @@ if [[ $status != "healthy" ]];then
 fi
 echo "Conduct test now..."
 
+# serving container's cpuset, for per-core throughput in compare_hardware.py
+cpuset=$(docker inspect --format '{{.HostConfig.CpusetCpus}}' "$CONTAINER_NAME")
+
+# keep rerank run records in the same results database as the embedding runs
+export EMBED_BENCH_RESULTS_DB=${EMBED_BENCH_RESULTS_DB:-$(pwd)/bench_results.db}
 cd rerank_bench/
 #for user in 1;
 for user in 1 4 8 16 32 48 64;
@@ -38,9 +43,11 @@ do
 
     python concurrent_bench.py --task tei_rerank  --url http://127.0.0.1:12003/rerank --num-chunk 5 \
         --num-queries 1000 --concurrency $user --dataset token_len_500.json \
+        --tag hardware=xeon --tag cpuset=$cpuset --tag model=$model --tag dataset_length=500 \
         2>&1 | tee -a xeon_500_${model}_${user}_$(date '+%Y%m%d_%H%M%S').log
     python concurrent_bench.py --task tei_rerank  --url http://127.0.0.1:12003/rerank --num-chunk 5 \
         --num-queries 1000 --concurrency $user --dataset token_len_1000.json \
+        --tag hardware=xeon --tag cpuset=$cpuset --tag model=$model --tag dataset_length=1000 \
         2>&1 | tee -a xeon_1000_${model}_${user}_$(date '+%Y%m%d_%H%M%S').log
 done
 cd ../.
@@ -57,6 +57,11 @@ done
 
 echo "Conduct test now..."
 
+# serving container's cards, for per-card throughput in compare_hardware.py
+devices=$(docker exec "$CONTAINER_NAME" printenv HABANA_VISIBLE_DEVICES)
+
+# keep rerank run records in the same results database as the embedding runs
+export EMBED_BENCH_RESULTS_DB=${EMBED_BENCH_RESULTS_DB:-$(pwd)/bench_results.db}
 cd rerank_bench/
 #for user in 64;
 for user in 1 4 8 16 32 64;
@@ -64,9 +69,11 @@ do
 
     python3 concurrent_bench.py --task tei_rerank  --url http://127.0.0.1:12007/rerank --num-chunk 5 \
         --num-queries 600 --concurrency $user --dataset token_len_500.json \
+        --tag hardware=hpu --tag devices=$devices --tag model=$model --tag dataset_length=500 \
         2>&1 | tee -a hpu_500_${model}_${user}_$(date '+%Y%m%d_%H%M%S').log
     python3 concurrent_bench.py --task tei_rerank  --url http://127.0.0.1:12007/rerank --num-chunk 5 \
         --num-queries 600 --concurrency $user --dataset token_len_1000.json \
+        --tag hardware=hpu --tag devices=$devices --tag model=$model --tag dataset_length=1000 \
         2>&1 | tee -a hpu_1000_${model}_${user}_$(date '+%Y%m%d_%H%M%S').log
 done
 cd ../.
@@ -0,0 +1,186 @@
+"""
+CPU inference backends for the offline benchmarks.
+
+Every backend is wrapped into a runner that takes a tokenized batch and
+returns the first model output (last_hidden_state for AutoModel, logits for
+sequence classification); PyTorch backends run under torch.inference_mode,
+onnx under ONNX Runtime on a cached export.
+"""
+
+import hashlib
+import json
+import os
+import shutil
+from contextlib import nullcontext
+
+import torch
+
+BACKENDS = ["eager", "bf16", "ipex", "jit", "compile", "int8", "onnx"]
+
+ONNX_OPSET = 17
+# bump when the exported graph changes for the same model, e.g. its dynamic axes
+ONNX_EXPORT_VERSION = 2
+DEFAULT_ONNX_CACHE_DIR = os.environ.get(
+    "EMBED_BENCH_ONNX_DIR",
+    os.path.join(os.path.expanduser("~"), ".cache", "embed_rerank_benchmark", "onnx"))
+ORT_OPT_LEVELS = ["disable", "basic", "extended", "all"]
+
+
+class ModelForward(torch.nn.Module):
+    """Positional (input_ids, attention_mask) signature shared by all backends, traceable by torch.jit."""
+
+    def __init__(self, model):
+        super().__init__()
+        self.model = model
+
+    def forward(self, input_ids, attention_mask):
+        return self.model(input_ids=input_ids, attention_mask=attention_mask, return_dict=False)[0]
+
+
+class BackendRunner:
+    def __init__(self, name, module, autocast=False, device="cpu"):
+        self.name = name
+        self.module = module
+        self.autocast = autocast
+        self.device = device
+
+    def __call__(self, batch_dict):
+        autocast = torch.autocast(self.device, dtype=torch.bfloat16) if self.autocast else nullcontext()
+        with torch.inference_mode(), autocast:
+            return self.module(batch_dict['input_ids'].to(self.device), batch_dict['attention_mask'].to(self.device))
+
+
+class OrtRunner:
+    """Run an ONNX Runtime session on tokenized batches, returning the first output as a torch tensor."""
+
+    def __init__(self, session, path):
+        self.name = "onnx"
+        self.session = session
+        self.path = path
+
+    def __call__(self, batch_dict):
+        feeds = {"input_ids": batch_dict['input_ids'].cpu().numpy(),
+                 "attention_mask": batch_dict['attention_mask'].cpu().numpy()}
+        return torch.from_numpy(self.session.run(None, feeds)[0])
+
+
+def onnx_cache_key(model):
+    """Hash of the model files (name, size, mtime), model class, opset, export version and torch version."""
+    model_path = os.path.abspath(model.name_or_path)
+    files = []
+    if os.path.isdir(model_path):
+        for name in sorted(os.listdir(model_path)):
+            stat = os.stat(os.path.join(model_path, name))
+            files.append([name, stat.st_size, int(stat.st_mtime)])
+    key = {"model": model_path, "files": files, "class": type(model).__name__,
+           "opset": ONNX_OPSET, "export": ONNX_EXPORT_VERSION, "torch": torch.__version__}
+    return hashlib.sha256(json.dumps(key, sort_keys=True).encode("utf8")).hexdigest()[:16]
+
+
+def export_onnx(model, example_batch, quantize=False, cache_dir=DEFAULT_ONNX_CACHE_DIR):
+    """
+    Export model to ONNX with dynamic batch and sequence axes, once per cache key.
+
+    With quantize, the exported graph is also dynamically quantized to int8
+    (MatMul weights). Returns the path of the .onnx file to load.
+    """
+    export_dir = os.path.join(cache_dir, onnx_cache_key(model))
+    path = os.path.join(export_dir, "model.onnx")
+    if not os.path.exists(path):
+        # export into a scratch directory, large models write external weight files next to the graph
+        tmp_dir = f"{export_dir}.tmp{os.getpid()}"
+        os.makedirs(tmp_dir, exist_ok=True)
+        print(f"Exporting {model.name_or_path} to ONNX...")
+        module = ModelForward(model.eval())
+        inputs = (example_batch['input_ids'], example_batch['attention_mask'])
+        dynamic_axes = {name: {0: "batch", 1: "sequence"} for name in ["input_ids", "attention_mask"]}
+        with torch.no_grad():
+            # last_hidden_state is (batch, sequence, hidden), classification logits only (batch, labels)
+            output = module(*inputs)
+            dynamic_axes["output"] = {0: "batch", 1: "sequence"} if output.dim() == 3 else {0: "batch"}
+            torch.onnx.export(module, inputs,
+                              os.path.join(tmp_dir, "model.onnx"), input_names=["input_ids", "attention_mask"],
+                              output_names=["output"], dynamic_axes=dynamic_axes, opset_version=ONNX_OPSET)
+        try:
+            os.rename(tmp_dir, export_dir)
+        except OSError:
+            # another process finished the same export first
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+    print(f"ONNX model: {path}")
+
+    if not quantize:
+        return path
+    quantized = os.path.join(export_dir, "model.int8.onnx")
+    if not os.path.exists(quantized):
+        from onnxruntime.quantization import QuantType, quantize_dynamic
+        tmp_path = f"{quantized}.tmp{os.getpid()}"
+        quantize_dynamic(path, tmp_path, weight_type=QuantType.QInt8, use_external_data_format=True)
+        os.replace(tmp_path, quantized)
+    return quantized
+
+
+def prepare_onnx(model, example_batch, ort_options=None):
+    """
+    ONNX Runtime CPU session for model.
+
+    ort_options: threads / interop_threads (0 lets ORT decide), opt_level (one of
+    ORT_OPT_LEVELS), quantize, cache_dir.
+    """
+    import onnxruntime as ort
+
+    options = ort_options or {}
+    path = export_onnx(model, example_batch, options.get("quantize", False),
+                       options.get("cache_dir") or DEFAULT_ONNX_CACHE_DIR)
+    session_options = ort.SessionOptions()
+    session_options.intra_op_num_threads = options.get("threads") or 0
+    session_options.inter_op_num_threads = options.get("interop_threads") or 0
+    session_options.graph_optimization_level = {
+        "disable": ort.GraphOptimizationLevel.ORT_DISABLE_ALL,
+        "basic": ort.GraphOptimizationLevel.ORT_ENABLE_BASIC,
+        "extended": ort.GraphOptimizationLevel.ORT_ENABLE_EXTENDED,
+        "all": ort.GraphOptimizationLevel.ORT_ENABLE_ALL,
+    }[options.get("opt_level", "all")]
+    session = ort.InferenceSession(path, session_options, providers=["CPUExecutionProvider"])
+    return OrtRunner(session, path)
+
+
+def prepare_backend(name, model, example_batch, ort_options=None):
+    """
+    Optimize model for a CPU backend.
+
+    eager    fp32 PyTorch
+    bf16     fp32 weights, bf16 autocast
+    ipex     ipex.optimize(dtype=bfloat16) with bf16 autocast
+    jit      torch.jit.trace + freeze on example_batch
+    compile  torch.compile
+    int8     dynamic int8 quantization of nn.Linear
+    onnx     ONNX Runtime on a cached ONNX export, configured by ort_options (see prepare_onnx)
+    """
+    model = model.eval().to("cpu")
+    module = ModelForward(model)
+    autocast = False
+
+    if name == "eager":
+        pass
+    elif name == "bf16":
+        autocast = True
+    elif name == "ipex":
+        import intel_extension_for_pytorch as ipex
+        module = ModelForward(ipex.optimize(model, dtype=torch.bfloat16))
+        autocast = True
+    elif name == "jit":
+        # traced outside inference_mode, inference tensors cannot be captured as constants
+        with torch.no_grad():
+            module = torch.jit.trace(module, (example_batch['input_ids'], example_batch['attention_mask']),
+                                     check_trace=False, strict=False)
+            module = torch.jit.freeze(module)
+    elif name == "compile":
+        module = torch.compile(module, dynamic=True)
+    elif name == "int8":
+        module = ModelForward(torch.ao.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8))
+    elif name == "onnx":
+        return prepare_onnx(model, example_batch, ort_options)
+    else:
+        raise ValueError(f"unknown backend {name}, expected one of {BACKENDS}")
+
+    return BackendRunner(name, module, autocast)
@@ -0,0 +1,221 @@
+#!/usr/bin/env python3
+"""
+Dynamic-batching simulator on top of the offline embedding model runner.
+
+Replays an arrival process through a TEI-like batching policy on a virtual
+clock: requests queue up, the server waits up to max_wait for a batch to fill,
+then takes requests in arrival order up to max_batch_requests and a token
+budget (MAX_BATCH_REQUESTS / MAX_BATCH_TOKENS in compose.yaml.hpu). Every
+batch really runs through the model and its measured time advances the
+clock, so per-request latency and throughput reflect this machine's model
+cost without a server.
+
+Arrivals are Poisson at --rate requests/s, or the tm_start timestamps (and
+question_len token lengths) of a stress_benchmark.py bench_*.result.csv.
+
+Example:
+    python batching_simulator.py --model /mnt/disk1/models/bge-base-zh-v1.5 --input ../21_512.json \\
+        --rate 20 --num_requests 500 --max_batch_requests 1 4 8 16 --max_wait_ms 0 5 20
+"""
+
+import argparse
+import bisect
+import csv
+import json
+import os
+import sys
+import time
+from collections import deque
+
+import numpy as np
+from transformers import AutoModel, AutoTokenizer
+
+from backends import BACKENDS, prepare_backend
+from offline_utils import configure_threads, get_chunks, latency_percentiles, print_table, text_lengths
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from dataset_mmap import tokenize_texts
+
+
+def poisson_arrivals(rate, count, seed=0):
+    """Arrival times in seconds of a Poisson process with rate requests/s."""
+    rng = np.random.default_rng(seed)
+    return np.cumsum(rng.exponential(1.0 / rate, count)).tolist()
+
+
+def trace_arrivals(path):
+    """
+    Arrival times (relative to the first request) and token lengths from a
+    stress_benchmark.py result CSV: question_len, answer_len, first_chunk,
+    overall, err, code, tm_start, tm_end, client.
+    """
+    rows = []
+    with open(path, newline="") as f:
+        for row in csv.reader(f):
+            if len(row) >= 7 and row[6]:
+                rows.append((float(row[6]), int(float(row[0]))))
+    if not rows:
+        raise ValueError(f"no requests with tm_start in {path}")
+    rows.sort()
+    first = rows[0][0]
+    return [t - first for t, _ in rows], [n for _, n in rows]
+
+
+def match_texts(texts, lengths, wanted):
+    """For each wanted token length, the dataset text closest to it."""
+    order = sorted(range(len(texts)), key=lambda i: lengths[i])
+    sorted_lengths = [lengths[i] for i in order]
+    matched = []
+    for n in wanted:
+        pos = min(bisect.bisect_left(sorted_lengths, n), len(order) - 1)
+        if pos > 0 and n - sorted_lengths[pos - 1] < sorted_lengths[pos] - n:
+            pos -= 1
+        matched.append(order[pos])
+    return matched
+
+
+def simulate(run_batch, arrivals, lengths, max_batch_requests, max_batch_tokens, max_wait):
+    """
+    Run the batching policy on a virtual clock.
+
+    run_batch(request indices) executes one batch and returns its service time
+    in seconds. Returns (start, finish) times per request and the batch sizes.
+    """
+    pending = deque(sorted(range(len(arrivals)), key=lambda i: arrivals[i]))
+    queue = deque()
+    start = [0.0] * len(arrivals)
+    finish = [0.0] * len(arrivals)
+    batch_sizes = []
+    clock = 0.0
+
+    while pending or queue:
+        if not queue:
+            clock = max(clock, arrivals[pending[0]])
+        while pending and arrivals[pending[0]] <= clock:
+            queue.append(pending.popleft())
+        # wait for the batch to fill, at most max_wait after the oldest queued request arrived
+        deadline = arrivals[queue[0]] + max_wait
+        while len(queue) < max_batch_requests and pending and arrivals[pending[0]] <= deadline:
+            clock = max(clock, arrivals[pending[0]])
+            queue.append(pending.popleft())
+        if len(queue) < max_batch_requests:
+            clock = max(clock, deadline)
+
+        batch = [queue.popleft()]
+        tokens = lengths[batch[0]]
+        while queue and len(batch) < max_batch_requests and tokens + lengths[queue[0]] <= max_batch_tokens:
+            tokens += lengths[queue[0]]
+            batch.append(queue.popleft())
+
+        service = run_batch(batch)
+        for i in batch:
+            start[i] = clock
+            finish[i] = clock + service
+        clock += service
+        batch_sizes.append(len(batch))
+    return start, finish, batch_sizes
+
+
+def summarize(arrivals, lengths, start, finish, batch_sizes):
+    makespan = max(finish) - min(arrivals)
+    latency = latency_percentiles([f - a for a, f in zip(arrivals, finish)])
+    queue_wait = latency_percentiles([s - a for a, s in zip(arrivals, start)])
+    return {
+        "requests": len(arrivals),
+        "batches": len(batch_sizes),
+        "mean_batch": sum(batch_sizes) / len(batch_sizes),
+        "requests_per_sec": len(arrivals) / makespan if makespan > 0 else 0.0,
+        "tokens_per_sec": sum(lengths) / makespan if makespan > 0 else 0.0,
+        "latency": latency,
+        "queue_wait": queue_wait,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline dynamic-batching simulator",
+                                     formatter_class=argparse.RawDescriptionHelpFormatter, epilog=__doc__)
+    parser.add_argument("--input", type=str, required=True, help="Input JSON file or .mmap dataset path")
+    parser.add_argument("--model", type=str, required=True, help="Model path")
+    parser.add_argument("--backend", type=str, default="eager", choices=BACKENDS, help="CPU backend (default: eager)")
+    parser.add_argument("--max_length", type=int, default=512, help="Maximum token length")
+    parser.add_argument("--pad_to_multiple_of", type=int, default=256, help="Batch padding multiple")
+    parser.add_argument("--rate", type=float, default=10.0, help="Poisson arrival rate in requests/s")
+    parser.add_argument("--num_requests", type=int, default=200, help="Number of Poisson arrivals")
+    parser.add_argument("--seed", type=int, default=0, help="Random seed for Poisson arrivals")
+    parser.add_argument("--trace", type=str, default=None,
+                        help="Replay arrivals from a bench_*.result.csv instead of Poisson")
+    parser.add_argument("--max_batch_requests", type=int, nargs="+", default=[16],
+                        help="Max requests per batch, like TEI MAX_BATCH_REQUESTS")
+    parser.add_argument("--max_batch_tokens", type=int, nargs="+", default=[16384],
+                        help="Token budget per batch, like TEI MAX_BATCH_TOKENS")
+    parser.add_argument("--max_wait_ms", type=float, nargs="+", default=[0.0],
+                        help="How long a batch may wait to fill after its oldest request arrived")
+    parser.add_argument("--threads", type=int, default=None, help="torch intra-op threads (default: torch default)")
+    parser.add_argument("--result_json", type=str, default=None, help="Write the simulation summaries to this JSON file")
+    args = parser.parse_args()
+
+    configure_threads(args.threads)
+    tokenizer = AutoTokenizer.from_pretrained(args.model, padding_side='left')
+    model = AutoModel.from_pretrained(args.model)
+    texts = get_chunks(args.input)
+    text_lens = text_lengths(tokenizer, texts, args.max_length)
+
+    if args.trace:
+        arrivals, wanted = trace_arrivals(args.trace)
+        picked = match_texts(texts, text_lens, wanted)
+        print(f"Replaying {len(arrivals)} requests over {arrivals[-1]:.1f}s from {args.trace}")
+    else:
+        arrivals = poisson_arrivals(args.rate, args.num_requests, args.seed)
+        picked = [i % len(texts) for i in range(args.num_requests)]
+        print(f"Simulating {args.num_requests} Poisson arrivals at {args.rate} requests/s")
+    request_texts = [texts[i] for i in picked]
+    lengths = [text_lens[i] for i in picked]
+
+    def tokenize(batch_texts):
+        return tokenize_texts(tokenizer, batch_texts, padding="longest", pad_to_multiple_of=args.pad_to_multiple_of,
+                              truncation=True, max_length=args.max_length, return_tensors="pt")
+
+    run_model = prepare_backend(args.backend, model, tokenize(request_texts[:1]))
+    warmed = set()
+
+    def run_batch(batch):
+        # service time is tokenization plus the model, as on the server
+        start = time.time()
+        batch_dict = tokenize([request_texts[i] for i in batch])
+        tokenize_time = time.time() - start
+        shape = tuple(batch_dict['input_ids'].shape)
+        if shape not in warmed:
+            # keep one-off compilation out of the simulated service time
+            run_model(batch_dict)
+            warmed.add(shape)
+        start = time.time()
+        run_model(batch_dict)
+        return tokenize_time + time.time() - start
+
+    results = []
+    for max_batch_requests in args.max_batch_requests:
+        for max_batch_tokens in args.max_batch_tokens:
+            for max_wait_ms in args.max_wait_ms:
+                start, finish, batch_sizes = simulate(run_batch, arrivals, lengths, max_batch_requests,
+                                                      max_batch_tokens, max_wait_ms / 1000)
+                summary = summarize(arrivals, lengths, start, finish, batch_sizes)
+                summary.update({"max_batch_requests": max_batch_requests, "max_batch_tokens": max_batch_tokens,
+                                "max_wait_ms": max_wait_ms})
+                results.append(summary)
+                print(f"max_batch_requests={max_batch_requests} max_batch_tokens={max_batch_tokens} "
+                      f"max_wait_ms={max_wait_ms}: {summary['requests_per_sec']:.2f} requests/sec, "
+                      f"p99 {summary['latency']['p99'] * 1000:.2f}ms")
+
+    print("\nBatching policy comparison:")
+    print_table([{"max_batch": r["max_batch_requests"], "max_tokens": r["max_batch_tokens"],
+                  "max_wait_ms": r["max_wait_ms"], "mean_batch": r["mean_batch"],
+                  "requests/s": r["requests_per_sec"], "tokens/s": r["tokens_per_sec"],
+                  **{f"{k} ms": v * 1000 for k, v in r["latency"].items()},
+                  "wait p99 ms": r["queue_wait"]["p99"] * 1000} for r in results])
+    if args.result_json:
+        with open(args.result_json, "w", encoding="utf8") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -4,77 +4,44 @@ import time
 import argparse
 import torch.nn.functional as F
 from torch import Tensor
+from torch.profiler import record_function
 from transformers import AutoTokenizer, AutoModel
-import intel_extension_for_pytorch as ipex
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from dataset_mmap import tokenize_texts
+from offline_utils import (SCHEDULES, BatchLog, BatchProfiler, PaddingStats, SteadyState, TokenizePipeline,
+                           configure_threads, data_iterator, get_chunks, last_token_pool, latency_percentiles,
+                           plan_shapes, print_profile, print_table, serial_batches, shard_items, text_lengths,
+                           thread_environment, tokenize_overlap, warmup_shapes)
+from backends import BACKENDS, ORT_OPT_LEVELS, prepare_backend
+from memory_profile import MemoryTracker
 import torch
 import numpy as np
 import os
 
 os.environ["KMP_DUPLICATE_LIB_OK"] = "TRUE"
 
-def get_chunks(input_file):
-    with open(input_file, "r", encoding='utf8') as f:
-        chunks = json.load(f)
-    return chunks
-
-def last_token_pool(last_hidden_states: Tensor,
-                 attention_mask: Tensor) -> Tensor:
-    left_padding = (attention_mask[:, -1].sum() == attention_mask.shape[0])
-    if left_padding:
-        return last_hidden_states[:, -1]
-    else:
-        sequence_lengths = attention_mask.sum(dim=1) - 1
-        batch_size = last_hidden_states.shape[0]
-        return last_hidden_states[torch.arange(batch_size, device=last_hidden_states.device), sequence_lengths]
-
-def data_iterator(sample_texts, batch_size=4):
-    count = 0
-    batch = []
-    max_samples = len(sample_texts)
-    while count < max_samples:
-        for text in sample_texts:
-            batch.append(text)
-            if len(batch) == batch_size:
-                yield batch
-                batch = []
-                count += batch_size
-        if batch:
-            yield batch
-            count += len(batch)
-            batch = []
-
-def benchmark(input_file, model_path, device, batch_size):
+def benchmark(input_file, model_path, device, batch_size, schedule="file", backend="ipex",
+              pipeline=False, prefetch=2, pin_memory=False, shard=None, warmup="shapes", ort_options=None,
+              memory=False, profile=None, batch_log=None):
     if device == "hpu":
         import habana_frameworks.torch as ht
         import habana_frameworks.torch.core as htcore
 
-    elif device == "cpu":
-        import intel_extension_for_pytorch as ipex
-
-    if device == "hpu":
-
-        tokenizer = AutoTokenizer.from_pretrained(model_path, padding_side='left')
-        model = AutoModel.from_pretrained(model_path)
-    else:
-
-        tokenizer = AutoTokenizer.from_pretrained(model_path, padding_side='left')
-        model = AutoModel.from_pretrained(model_path)
-
-    if device == "hpu":
-        model = model.to("hpu")
-        model = ht.hpu.wrap_in_hpu_graph(model)
-        print("Using HPU device")
-    else:
-        model.eval()
-        model = model.to("cpu")
-        model = ipex.optimize(model, dtype=torch.bfloat16)
-        print("Using CPU device")
+    tokenizer = AutoTokenizer.from_pretrained(model_path, padding_side='left')
+    model = AutoModel.from_pretrained(model_path)
 
     chunks = get_chunks(input_file)
+    if shard is not None:
+        chunks = shard_items(chunks, *shard)
 
     total_texts = 0
-    total_tokens = 0
+    padding = PaddingStats()
     total_time = 0.0
+    total_tokenize_time = 0.0
+    total_wait_time = 0.0
     batch_count = 0
 
     warmup_text = ["warmup text"] * 3
@@ -86,105 +53,275 @@ def benchmark(input_file, model_path, device, batch_size):
         max_length=max_length,
         return_tensors="pt",
     )
-    batch_dict.to(model.device)
-    outputs = model(**batch_dict)
-    embeddings = last_token_pool(outputs.last_hidden_state, batch_dict['attention_mask'])
 
     if device == "hpu":
-        htcore.mark_step()
-        htcore.hpu.synchronize()
-
-    batch_dict.to(model.device)
-    # warmup for git
-    for i in range(0,3):
-        warmup_data = chunks[i:i+batch_size]
-        padding_data  = tokenizer(
-            warmup_data,
-            padding="longest",
-            pad_to_multiple_of=256,
-            truncation=True,
-            max_length=max_length,
-            return_tensors="pt",
-        )
-        outputs = model(**padding_data)
-
-    #with torch.no_grad():
-    #    model = torch.jit.trace(model, (padding_data,), check_trace=False, strict=False)
-    #    model = torch.jit.freeze(model)
+        model = model.to("hpu")
+        model = ht.hpu.wrap_in_hpu_graph(model)
+
+        def run_model(batch):
+            batch.to("hpu")
+            with torch.inference_mode():
+                outputs = model(**batch)
+            htcore.mark_step()
+            htcore.hpu.synchronize()
+            return outputs.last_hidden_state
+
+        print("Using HPU device")
+    else:
+        run_model = prepare_backend(backend, model, batch_dict, ort_options)
+        print(f"Using CPU device, {backend} backend")
+
+    hidden_states = run_model(batch_dict)
+    embeddings = last_token_pool(hidden_states, batch_dict['attention_mask'].to(hidden_states.device))
+
+    lengths = text_lengths(tokenizer, chunks, max_length) if schedule != "file" or warmup == "shapes" else None
+    shape_timings = []
+    if warmup == "shapes":
+        # every (batch, padded length) the run produces, so no timed batch pays graph compilation
+        shapes = plan_shapes(lengths, batch_size, schedule)
+        print(f"Warming up {len(shapes)} input shapes...")
+        token_id = tokenizer("warmup", add_special_tokens=False)["input_ids"][0]
+        shape_timings = warmup_shapes(run_model, shapes, token_id)
+        for timing in shape_timings:
+            timing["batches"] = shapes[(timing["batch"], timing["length"])]
+        print_table(shape_timings, ["batch", "length", "batches", "first ms", "steady ms", "compile ms"])
+        print(f"Total compile time: {sum(t['compile ms'] for t in shape_timings) / 1000:.2f}s")
+    else:
+        # warmup for jit
+        for i in range(0,3):
+            warmup_data = chunks[i:i+batch_size]
+            padding_data  = tokenize_texts(
+                tokenizer,
+                warmup_data,
+                padding="longest",
+                pad_to_multiple_of=256,
+                truncation=True,
+                max_length=max_length,
+                return_tensors="pt",
+            )
+            run_model(padding_data)
+
+    def tokenize_batch(batch_texts):
+        # labelled for the profiler, tokenization is not a torch op
+        with record_function("tokenize"):
+            return tokenize_texts(
+                tokenizer,
+                batch_texts,
+                padding="longest",
+                pad_to_multiple_of=256,
+                truncation=True,
+                max_length=max_length,
+                return_tensors="pt",
+            )
+
+    # batches at a shape not warmed up above are compile spikes, kept out of steady state
+    steady = SteadyState((t["batch"], t["length"]) for t in shape_timings)
+    tracker = MemoryTracker(device) if memory else None
+    profiler = None
+    if profile:
+        tag = f"{os.path.basename(model_path.rstrip('/'))}_{backend if device == 'cpu' else device}_b{batch_size}"
+        profiler = BatchProfiler(profile["output_dir"], tag, profile["skip"], profile["batches"], profile["top"])
+
+    log = None
+    if batch_log:
+        log = BatchLog(batch_log, model=os.path.basename(model_path.rstrip('/')),
+                       backend=backend if device == "cpu" else device, batch_size=batch_size, max_length=max_length, schedule=schedule, pipeline=pipeline)
 
     print(f"Starting benchmark with {len(chunks)} texts...")
     start_time = time.time()
 
-    for batch_texts in data_iterator(chunks, batch_size):
+    batches = data_iterator(chunks, batch_size, schedule, lengths)
+    if pipeline:
+        # tokenization runs ahead on a background thread
+        batch_stream = TokenizePipeline(batches, tokenize_batch, prefetch, pin_memory)
+    else:
+        batch_stream = serial_batches(batches, tokenize_batch)
+
+    if tracker:
+        # peaks are reset outside the timed batch window, malloc_trim/clear_refs are not free
+        tracker.start()
+    for batch_texts, batch_dict, tokenize_time, wait_time in batch_stream:
         batch_count += 1
         print(f"\nProcessing batch #{batch_count} of size {len(batch_texts)}")
         total_texts += len(batch_texts)
 
-        batch_start_time = time.time()
-
-        # Tokenization
-        tokenize_start = time.time()
-        batch_dict = tokenizer(
-            batch_texts,
-            padding="longest",
-            pad_to_multiple_of=256,
-            truncation=True,
-            max_length=max_length,
-            return_tensors="pt",
-        )
-        tokenize_time = time.time() - tokenize_start
-
-        batch_token_count = batch_dict['input_ids'].numel()
-        total_tokens += batch_token_count
-        model_start = time.time()
-        with torch.no_grad():
-            outputs = model(**batch_dict)
+        # the batch started when the loop began waiting for its tokens
+        batch_start_time = time.time() - wait_time
+        total_tokenize_time += tokenize_time
+        total_wait_time += wait_time
 
-    #    embeddings = last_token_pool(outputs.last_hidden_state, batch_dict['attention_mask'])
+        # real tokens exclude padding, padded tokens are what the model computes on
+        batch_token_count, batch_padded_count = padding.update(batch_dict)
+        model_start = time.time()
+        hidden_states = run_model(batch_dict)
 
-        if device == "hpu":
-            htcore.mark_step()
-            htcore.hpu.synchronize()
+    #    embeddings = last_token_pool(hidden_states, batch_dict['attention_mask'])
 
         model_time = time.time() - model_start
-
         batch_time = time.time() - batch_start_time
+        if tracker:
+            tracker.stop(batch_dict)
+            tracker.start()
         total_time += batch_time
+        is_steady = steady.update(batch_dict, len(batch_texts), batch_token_count, batch_time)
+        if not is_steady:
+            print("  First batch at this shape, excluded from steady state")
 
         texts_per_sec = len(batch_texts) / batch_time
         tokens_per_sec = batch_token_count / batch_time
 
-        print(f"  Token count: {batch_token_count} tokens")
-        print(f"  Batch time: {batch_time:.4f}s (tokenize: {tokenize_time:.4f}s, model: {model_time:.4f}s)")
+        print(f"  Token count: {batch_token_count} tokens (padded: {batch_padded_count}, "
+              f"efficiency: {batch_token_count / batch_padded_count:.2%})")
+        print(f"  Batch time: {batch_time:.4f}s (tokenize: {tokenize_time:.4f}s, wait: {wait_time:.4f}s, "
+              f"model: {model_time:.4f}s)")
         print(f"  Throughput: {texts_per_sec:.2f} texts/sec | {tokens_per_sec:.2f} tokens/sec")
+        if log:
+            log.write(batch=batch_count, size=len(batch_texts), tokens=batch_token_count,
+                      padded_tokens=batch_padded_count, batch_time=batch_time, tokenize_time=tokenize_time,
+                      wait_time=wait_time, model_time=model_time, compile=not is_steady)
+        if profiler:
+            profiler.step()
 
     end_time = time.time()
+    if log:
+        log.close()
+    profile_summary = profiler.stop() if profiler else None
     total_duration = end_time - start_time
     avg_texts_per_sec = total_texts / total_duration
-    avg_tokens_per_sec = total_tokens / total_duration
+    avg_tokens_per_sec = padding.real_tokens / total_duration
+    avg_padded_tokens_per_sec = padding.padded_tokens / total_duration
+    latency = latency_percentiles(steady.batch_times)
 
     print("\n" + "="*50)
     print("Benchmark Summary:")
     print(f"  Device: {device.upper()}")
+    if device == "cpu":
+        print(f"  Backend: {backend}")
+        if backend == "onnx":
+            print(f"  ONNX Runtime: {run_model.path}, " + ", ".join(f"{k}={v}" for k, v in ort_options.items()))
+        print(f"  Threads: {torch.get_num_threads()} intra-op, {torch.get_num_interop_threads()} inter-op"
+              + "".join(f", {k}={v}" for k, v in thread_environment().items()))
     print(f"  Total texts processed: {total_texts}")
-    print(f"  Total tokens processed: {total_tokens}")
+    print(f"  Batch size: {batch_size} ({schedule} schedule)")
+    print(f"  Total tokens processed: {padding.real_tokens}")
+    print(f"  Total padded tokens: {padding.padded_tokens}")
+    print(f"  Padding efficiency: {padding.efficiency:.2%}")
     print(f"  Total batches: {batch_count}")
     print(f"  Total time: {total_duration:.2f} seconds")
+    overlap = tokenize_overlap(total_tokenize_time, total_wait_time)
+    print(f"  Tokenize time: {total_tokenize_time:.2f}s, model waited {total_wait_time:.2f}s "
+          f"({'pipelined' if pipeline else 'serial'}, overlap: {overlap:.2%})")
     print(f"  Average throughput: {avg_texts_per_sec:.2f} texts/sec")
     print(f"  Average throughput: {avg_tokens_per_sec:.2f} tokens/sec")
+    print(f"  Average padded throughput: {avg_padded_tokens_per_sec:.2f} tokens/sec")
+    print(f"  Compile batches excluded: {steady.compile_batches} ({steady.compile_time:.2f}s)")
+    print(f"  Steady-state throughput: {steady.texts_per_sec:.2f} texts/sec | {steady.tokens_per_sec:.2f} tokens/sec")
+    print("  Steady-state batch latency: " + ", ".join(f"{k}={v * 1000:.2f}ms" for k, v in latency.items()))
+    if profiler:
+        print_profile(profile_summary)
+    memory_rows = tracker.rows() if tracker else None
+    if memory_rows:
+        print("  Peak memory by (batch, padded length):")
+        print_table(memory_rows)
     print("="*50)
 
+    return {
+        "model": model_path,
+        "device": device,
+        "backend": backend if device == "cpu" else device,
+        "batch_size": batch_size,
+        "max_length": max_length,
+        "schedule": schedule,
+        "threads": torch.get_num_threads(),
+        "interop_threads": torch.get_num_interop_threads(),
+        "thread_env": thread_environment(),
+        "shard": list(shard) if shard is not None else None,
+        "total_texts": total_texts,
+        "real_tokens": padding.real_tokens,
+        "padded_tokens": padding.padded_tokens,
+        "total_batches": batch_count,
+        "start_time": start_time,
+        "end_time": end_time,
+        "duration": total_duration,
+        "texts_per_sec": avg_texts_per_sec,
+        "tokens_per_sec": avg_tokens_per_sec,
+        "ort": ort_options if backend == "onnx" else None,
+        "overlap": overlap,
+        "steady_texts_per_sec": steady.texts_per_sec,
+        "steady_tokens_per_sec": steady.tokens_per_sec,
+        "compile_batches": steady.compile_batches,
+        "compile_time": steady.compile_time,
+        "warmup_shapes": shape_timings,
+        "memory": memory_rows,
+        "profile": profile_summary,
+        "batch_latency": latency,
+    }
+
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(description="Embedding Model Benchmark")
-    parser.add_argument("--input", type=str, default="/home/liuzhuan/rag/benchmark_gaudi/rerank_bench/token_len_1000.json", help="Input JSON file path")
+    parser.add_argument("--input", type=str, default="/home/liuzhuan/rag/benchmark_gaudi/rerank_bench/token_len_1000.json", help="Input JSON file or .mmap dataset path")
     parser.add_argument("--model", type=str, default="/home/liuzhuan/rag/benchmark/embedding/bge-base-zh-v1.5", help="Model path")
     parser.add_argument("--device", type=str, default="cpu", choices=["cpu", "hpu"], help="Device to use: cpu or hpu")
     parser.add_argument("--max_length", type=int, default=1024, help="Maximum token length")
     parser.add_argument("--batch", type=int, default=1, help="Maximum token length")
+    parser.add_argument("--schedule", type=str, default="file", choices=SCHEDULES,
+                        help="Batch order: file order, sorted by length, or bucketed by padded length")
+    parser.add_argument("--backend", type=str, nargs="+", default=["ipex"], choices=BACKENDS,
+                        help="CPU backend(s) to run over the same dataset, e.g. --backend eager bf16 ipex jit")
+    parser.add_argument("--pipeline", action="store_true",
+                        help="Tokenize upcoming batches on a background thread while the model runs")
+    parser.add_argument("--prefetch", type=int, default=2, help="Tokenized batches queued ahead with --pipeline")
+    parser.add_argument("--pin_memory", action="store_true",
+                        help="Copy pipelined batches into reused pinned buffers (device transfers, ignored without CUDA/HPU)")
+    parser.add_argument("--shard", type=str, default=None,
+                        help="Process only shard INDEX/COUNT of the dataset, e.g. 0/4 (multi-instance runs)")
+    parser.add_argument("--result_json", type=str, default=None, help="Write the benchmark summaries to this JSON file")
+    parser.add_argument("--warmup", type=str, default="shapes", choices=["shapes", "basic"],
+                        help="Warm up every input shape of the run (default), or only three batches")
+    parser.add_argument("--ort_threads", type=int, default=0,
+                        help="onnx backend: ONNX Runtime intra-op threads (default: 0, ORT decides)")
+    parser.add_argument("--ort_interop_threads", type=int, default=0,
+                        help="onnx backend: ONNX Runtime inter-op threads (default: 0, ORT decides)")
+    parser.add_argument("--ort_opt_level", type=str, default="all", choices=ORT_OPT_LEVELS,
+                        help="onnx backend: graph optimization level (default: all)")
+    parser.add_argument("--ort_quantize", action="store_true", help="onnx backend: dynamic int8 quantization")
+    parser.add_argument("--onnx_cache_dir", type=str, default=None,
+                        help="onnx backend: directory for cached ONNX exports")
+    parser.add_argument("--memory", action="store_true",
+                        help="Record peak RSS and allocator stats per (batch, padded length), see memory_profile.py")
+    parser.add_argument("--profile", action="store_true",
+                        help="Profile a window of batches after warm-up with torch.profiler")
+    parser.add_argument("--profile_skip", type=int, default=2, help="Batches to skip before the profiling window")
+    parser.add_argument("--profile_batches", type=int, default=5, help="Batches in the profiling window")
+    parser.add_argument("--profile_top", type=int, default=20, help="Operators in the profile table")
+    parser.add_argument("--profile_dir", type=str, default="profile", help="Directory for traces and operator tables")
+    parser.add_argument("--batch_log", type=str, default=None,
+                        help="Append per-batch records to this JSON lines file, see parse_offline_logs.py")
+    parser.add_argument("--threads", type=int, default=None, help="torch intra-op threads (default: torch default)")
+    parser.add_argument("--interop_threads", type=int, default=None,
+                        help="torch inter-op threads (default: torch default)")
 
     args = parser.parse_args()
 
     global max_length
     max_length = args.max_length
-
-    benchmark(args.input, args.model, args.device, args.batch)
+    configure_threads(args.threads, args.interop_threads)
+    profile = {"output_dir": args.profile_dir, "skip": args.profile_skip, "batches": args.profile_batches,
+               "top": args.profile_top} if args.profile else None
+
+    backends = args.backend if args.device == "cpu" else [args.device]
+    shard = tuple(int(v) for v in args.shard.split("/")) if args.shard else None
+    ort_options = {"threads": args.ort_threads, "interop_threads": args.ort_interop_threads,
+                   "opt_level": args.ort_opt_level, "quantize": args.ort_quantize, "cache_dir": args.onnx_cache_dir}
+    results = [benchmark(args.input, args.model, args.device, args.batch, args.schedule, backend,
+                         args.pipeline, args.prefetch, args.pin_memory, shard, args.warmup, ort_options,
+                         args.memory, profile, args.batch_log)
+               for backend in backends]
+    if args.result_json:
+        with open(args.result_json, "w", encoding="utf8") as f:
+            json.dump(results, f, indent=2)
+    if len(results) > 1:
+        print("\nBackend comparison:")
+        print_table([{"backend": r["backend"], "texts/s": r["texts_per_sec"], "tokens/s": r["tokens_per_sec"],
+                      "overlap": r["overlap"], **{f"{k} ms": v * 1000 for k, v in r["batch_latency"].items()}}
+                     for r in results])
@@ -0,0 +1,240 @@
+#!/usr/bin/env python3
+"""
+Offline cross-encoder reranker benchmark.
+
+Builds rerank requests the way rerank_bench/concurrent_bench.py sends them to
+TEI (one query and num_chunk consecutive passages from the dataset), runs the
+(query, passage) pairs through AutoModelForSequenceClassification and reports
+pairs/s, real tokens/s and request latency for every num_chunk, so model cost
+can be compared against the served numbers.
+
+Example:
+    python benchmark_rerank_offline.py --model /mnt/disk1/models/bge-reranker-v2-m3 \\
+        --input ../rerank_bench/token_len_500.json --num_chunk 1 2 4 8 16 --backend eager ipex
+"""
+
+import argparse
+import json
+import time
+
+import torch
+from transformers import AutoModelForSequenceClassification, AutoTokenizer
+
+from backends import BACKENDS, ORT_OPT_LEVELS, prepare_backend
+from offline_utils import (PaddingStats, TokenizePipeline, configure_threads, get_chunks, latency_percentiles,
+                           print_table, serial_batches, thread_environment)
+
+DEFAULT_QUERY = "1"
+
+
+def load_queries(path):
+    """Questions from a qa_pairs.json style file, or the fixed query concurrent_bench.py falls back to."""
+    if not path:
+        return [DEFAULT_QUERY]
+    with open(path, "r", encoding="utf8") as f:
+        return [item["question"] for item in json.load(f)]
+
+
+def build_requests(queries, passages, num_chunk, num_requests):
+    """Request idx pairs query idx with num_chunk consecutive passages, wrapping around the dataset."""
+    requests = []
+    for idx in range(num_requests):
+        start = idx % len(passages)
+        texts = [passages[(start + i) % len(passages)] for i in range(num_chunk)]
+        requests.append((queries[idx % len(queries)], texts))
+    return requests
+
+
+def request_batches(requests, batch_size):
+    """Split each request's pairs into model batches; yields (request index, [queries], [passages])."""
+    for idx, (query, texts) in enumerate(requests):
+        step = batch_size or len(texts)
+        for start in range(0, len(texts), step):
+            part = texts[start:start + step]
+            yield idx, [query] * len(part), part
+
+
+def load_runner(model_path, device, backend, example, ort_options=None):
+    """Load the cross-encoder and return a function from a tokenized batch to its logits."""
+    model = AutoModelForSequenceClassification.from_pretrained(model_path).eval()
+    if device != "hpu":
+        print(f"Using CPU device, {backend} backend")
+        return prepare_backend(backend, model, example, ort_options)
+
+    import habana_frameworks.torch as ht
+    import habana_frameworks.torch.core as htcore
+    model = ht.hpu.wrap_in_hpu_graph(model.to("hpu"))
+
+    def run_model(batch_dict):
+        batch_dict = batch_dict.to("hpu")
+        with torch.inference_mode():
+            logits = model(**batch_dict).logits
+        htcore.mark_step()
+        htcore.hpu.synchronize()
+        return logits
+
+    print("Using HPU device")
+    return run_model
+
+
+def run_requests(run_model, tokenize_batch, requests, batch_size, pipeline=False, prefetch=2, pin_memory=False):
+    """Score all requests; returns their latencies plus token and timing totals."""
+    stats = {"padding": PaddingStats(), "latencies": [0.0] * len(requests), "pairs": 0, "batches": 0,
+             "tokenize_time": 0.0, "wait_time": 0.0}
+    stats["start_time"] = time.time()
+    batches = request_batches(requests, batch_size)
+    if pipeline:
+        batch_stream = TokenizePipeline(batches, tokenize_batch, prefetch, pin_memory)
+    else:
+        batch_stream = serial_batches(batches, tokenize_batch)
+
+    for (idx, _, passages), batch_dict, tokenize_time, wait_time in batch_stream:
+        batch_start_time = time.time() - wait_time
+        stats["padding"].update(batch_dict)
+        run_model(batch_dict).float().cpu()
+        # a request is done when its last batch is
+        stats["latencies"][idx] += time.time() - batch_start_time
+        stats["pairs"] += len(passages)
+        stats["batches"] += 1
+        stats["tokenize_time"] += tokenize_time
+        stats["wait_time"] += wait_time
+    stats["end_time"] = time.time()
+    return stats
+
+
+def benchmark(input_file, model_path, device, num_chunks, num_requests, batch_size=0, backend="eager",
+              queries=None, max_length=512, pipeline=False, prefetch=2, pin_memory=False, ort_options=None):
+    tokenizer = AutoTokenizer.from_pretrained(model_path)
+    passages = get_chunks(input_file)
+    queries = queries or [DEFAULT_QUERY]
+
+    def tokenize_batch(batch):
+        _, batch_queries, batch_passages = batch
+        return tokenizer(batch_queries, batch_passages, padding="longest", pad_to_multiple_of=256,
+                         truncation="only_second", max_length=max_length, return_tensors="pt")
+
+    warmup = build_requests(queries, passages, max(num_chunks), 3)
+    run_model = load_runner(model_path, device, backend, tokenize_batch(next(request_batches(warmup, batch_size))),
+                            ort_options)
+    for batch in request_batches(warmup, batch_size):
+        run_model(tokenize_batch(batch))
+
+    results = []
+    for num_chunk in num_chunks:
+        requests = build_requests(queries, passages, num_chunk, num_requests)
+        print(f"\nStarting rerank benchmark: {num_requests} requests x {num_chunk} chunks...")
+        stats = run_requests(run_model, tokenize_batch, requests, batch_size, pipeline, prefetch, pin_memory)
+        padding = stats["padding"]
+        duration = stats["end_time"] - stats["start_time"]
+        latency = latency_percentiles(stats["latencies"])
+        result = {
+            "model": model_path,
+            "device": device,
+            "backend": backend if device == "cpu" else device,
+            "num_chunk": num_chunk,
+            "num_requests": num_requests,
+            "batch_size": batch_size or num_chunk,
+            "max_length": max_length,
+            "threads": torch.get_num_threads(),
+            "total_pairs": stats["pairs"],
+            "total_batches": stats["batches"],
+            "real_tokens": padding.real_tokens,
+            "padded_tokens": padding.padded_tokens,
+            "start_time": stats["start_time"],
+            "end_time": stats["end_time"],
+            "duration": duration,
+            "requests_per_sec": num_requests / duration,
+            "pairs_per_sec": stats["pairs"] / duration,
+            "tokens_per_sec": padding.real_tokens / duration,
+            "tokenize_time": stats["tokenize_time"],
+            "wait_time": stats["wait_time"],
+            "request_latency": latency,
+            "ort": ort_options if backend == "onnx" else None,
+        }
+        results.append(result)
+
+        print("=" * 50)
+        print("Rerank Benchmark Summary:")
+        print(f"  Device: {device.upper()}")
+        if device == "cpu":
+            print(f"  Backend: {backend}")
+            if backend == "onnx":
+                print(f"  ONNX Runtime: {run_model.path}, " + ", ".join(f"{k}={v}" for k, v in ort_options.items()))
+            print(f"  Threads: {torch.get_num_threads()} intra-op, {torch.get_num_interop_threads()} inter-op"
+                  + "".join(f", {k}={v}" for k, v in thread_environment().items()))
+        print(f"  Requests: {num_requests} x {num_chunk} chunks, batch size {result['batch_size']}")
+        print(f"  Total pairs processed: {stats['pairs']}")
+        print(f"  Total tokens processed: {padding.real_tokens} (padded: {padding.padded_tokens}, "
+              f"efficiency: {padding.efficiency:.2%})")
+        print(f"  Total time: {duration:.2f} seconds (tokenize: {stats['tokenize_time']:.2f}s, "
+              f"model waited {stats['wait_time']:.2f}s)")
+        print(f"  Average throughput: {result['requests_per_sec']:.2f} requests/sec")
+        print(f"  Average throughput: {result['pairs_per_sec']:.2f} pairs/sec")
+        print(f"  Average throughput: {result['tokens_per_sec']:.2f} tokens/sec")
+        print("  Request latency: " + ", ".join(f"{k}={v * 1000:.2f}ms" for k, v in latency.items()))
+        print("=" * 50)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline Reranker Benchmark",
+                                     formatter_class=argparse.RawDescriptionHelpFormatter, epilog=__doc__)
+    parser.add_argument("--input", type=str, default="../rerank_bench/token_len_500.json",
+                        help="Input JSON file or .mmap dataset path")
+    parser.add_argument("--model", type=str, default="/mnt/disk1/models/bge-reranker-base", help="Model path")
+    parser.add_argument("--queries", type=str, default=None,
+                        help=f"qa_pairs.json style file with questions (default: the query '{DEFAULT_QUERY}')")
+    parser.add_argument("--device", type=str, default="cpu", choices=["cpu", "hpu"], help="Device to use: cpu or hpu")
+    parser.add_argument("--max_length", type=int, default=512, help="Maximum pair token length")
+    parser.add_argument("--num_chunk", type=int, nargs="+", default=[1, 2, 4, 8, 16],
+                        help="Passages per request, like concurrent_bench.py --num-chunk")
+    parser.add_argument("--num_requests", type=int, default=100, help="Requests per num_chunk")
+    parser.add_argument("--batch", type=int, default=0,
+                        help="Pairs per model batch (default: 0, the whole request as TEI batches it)")
+    parser.add_argument("--backend", type=str, nargs="+", default=["eager"], choices=BACKENDS,
+                        help="CPU backend(s) to run, e.g. --backend eager bf16 ipex jit")
+    parser.add_argument("--pipeline", action="store_true",
+                        help="Tokenize upcoming batches on a background thread while the model runs")
+    parser.add_argument("--prefetch", type=int, default=2, help="Tokenized batches queued ahead with --pipeline")
+    parser.add_argument("--pin_memory", action="store_true",
+                        help="Copy pipelined batches into reused pinned buffers (device transfers, ignored without CUDA/HPU)")
+    parser.add_argument("--threads", type=int, default=None, help="torch intra-op threads (default: torch default)")
+    parser.add_argument("--interop_threads", type=int, default=None,
+                        help="torch inter-op threads (default: torch default)")
+    parser.add_argument("--ort_threads", type=int, default=0,
+                        help="onnx backend: ONNX Runtime intra-op threads (default: 0, ORT decides)")
+    parser.add_argument("--ort_interop_threads", type=int, default=0,
+                        help="onnx backend: ONNX Runtime inter-op threads (default: 0, ORT decides)")
+    parser.add_argument("--ort_opt_level", type=str, default="all", choices=ORT_OPT_LEVELS,
+                        help="onnx backend: graph optimization level (default: all)")
+    parser.add_argument("--ort_quantize", action="store_true", help="onnx backend: dynamic int8 quantization")
+    parser.add_argument("--onnx_cache_dir", type=str, default=None,
+                        help="onnx backend: directory for cached ONNX exports")
+    parser.add_argument("--result_json", type=str, default=None, help="Write the benchmark summaries to this JSON file")
+    args = parser.parse_args()
+
+    if min(args.num_chunk) < 1:
+        parser.error("--num_chunk must be at least 1")
+    configure_threads(args.threads, args.interop_threads)
+    queries = load_queries(args.queries)
+    backends = args.backend if args.device == "cpu" else [args.device]
+    ort_options = {"threads": args.ort_threads, "interop_threads": args.ort_interop_threads,
+                   "opt_level": args.ort_opt_level, "quantize": args.ort_quantize, "cache_dir": args.onnx_cache_dir}
+
+    results = []
+    for backend in backends:
+        results += benchmark(args.input, args.model, args.device, args.num_chunk, args.num_requests, args.batch,
+                             backend, queries, args.max_length, args.pipeline, args.prefetch, args.pin_memory,
+                             ort_options)
+
+    if args.result_json:
+        with open(args.result_json, "w", encoding="utf8") as f:
+            json.dump(results, f, indent=2)
+    print("\nRerank results by num-chunk:")
+    print_table([{"backend": r["backend"], "num_chunk": r["num_chunk"], "pairs/s": r["pairs_per_sec"],
+                  "tokens/s": r["tokens_per_sec"], **{f"{k} ms": v * 1000 for k, v in r["request_latency"].items()}}
+                 for r in results])
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,112 @@
+"""
+CPU/NUMA topology from /sys and core-group planning for pinned benchmark runs.
+"""
+
+import glob
+import os
+import re
+import shutil
+
+SYS_NODE_PATH = "/sys/devices/system/node"
+SYS_CPU_PATH = "/sys/devices/system/cpu"
+
+
+def parse_cpulist(text):
+    """'0-3,8,10-11' -> [0, 1, 2, 3, 8, 10, 11]"""
+    cpus = []
+    for part in text.strip().split(","):
+        if not part:
+            continue
+        start, _, end = part.partition("-")
+        cpus.extend(range(int(start), int(end or start) + 1))
+    return cpus
+
+
+def format_cpulist(cpus):
+    """[0, 1, 2, 3, 8] -> '0-3,8'"""
+    ranges = []
+    for cpu in sorted(cpus):
+        if ranges and cpu == ranges[-1][1] + 1:
+            ranges[-1][1] = cpu
+        else:
+            ranges.append([cpu, cpu])
+    return ",".join(f"{a}-{b}" if a != b else str(a) for a, b in ranges)
+
+
+def _read(path):
+    with open(path) as f:
+        return f.read()
+
+
+def numa_nodes(allowed=None, physical_only=True):
+    """
+    Map NUMA node id -> sorted CPUs, restricted to allowed CPUs and this process's affinity.
+
+    With physical_only, only the first hardware thread of each core is kept.
+    Falls back to a single node 0 when /sys has no node information.
+    """
+    allowed = set(allowed) if allowed is not None else set(os.sched_getaffinity(0))
+    allowed &= set(os.sched_getaffinity(0))
+    nodes = {}
+    for path in glob.glob(os.path.join(SYS_NODE_PATH, "node[0-9]*")):
+        node = int(re.search(r"node(\d+)$", path).group(1))
+        cpus = [c for c in parse_cpulist(_read(os.path.join(path, "cpulist"))) if c in allowed]
+        if cpus:
+            nodes[node] = cpus
+    if not nodes:
+        nodes = {0: sorted(allowed)}
+    if physical_only:
+        nodes = {node: [c for c in cpus if _is_first_sibling(c)] for node, cpus in nodes.items()}
+    return dict(sorted(nodes.items()))
+
+
+def _is_first_sibling(cpu):
+    path = os.path.join(SYS_CPU_PATH, f"cpu{cpu}", "topology", "thread_siblings_list")
+    try:
+        return min(parse_cpulist(_read(path))) == cpu
+    except (OSError, ValueError):
+        return True
+
+
+def plan_core_groups(nodes, instances, threads):
+    """
+    Split the CPUs into instances disjoint groups of threads cores.
+
+    Each group goes to the node with the most free cores, and never spans
+    NUMA nodes when it fits in one. Returns [(node, [cpus])] with node None for groups spanning
+    nodes, or None if there are not enough cores.
+    """
+    free = {node: list(cpus) for node, cpus in nodes.items()}
+    groups = []
+    for _ in range(instances):
+        # spread instances over nodes to balance memory bandwidth
+        node = max((n for n, cpus in free.items() if len(cpus) >= threads), key=lambda n: len(free[n]), default=None)
+        if node is not None:
+            groups.append((node, free[node][:threads]))
+            free[node] = free[node][threads:]
+            continue
+        # larger than any single node: take cores from the nodes with the most left
+        cpus = []
+        for n in sorted(free, key=lambda n: -len(free[n])):
+            take = free[n][:threads - len(cpus)]
+            cpus += take
+            free[n] = free[n][len(take):]
+            if len(cpus) == threads:
+                break
+        if len(cpus) < threads:
+            return None
+        groups.append((None, cpus))
+    return groups
+
+
+def pinned_command(cmd, cpus, node=None):
+    """Prefix cmd with numactl (CPU and memory binding) or taskset if numactl is missing."""
+    cpulist = format_cpulist(cpus)
+    if shutil.which("numactl"):
+        prefix = ["numactl", "-C", cpulist]
+        if node is not None:
+            prefix += ["-m", str(node)]
+        return prefix + list(cmd)
+    if shutil.which("taskset"):
+        return ["taskset", "-c", cpulist] + list(cmd)
+    return list(cmd)
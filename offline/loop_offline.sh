@@ -1,11 +1,16 @@
 #!/bin/bash
+# batch order: file, sorted or bucketed (see offline_utils.data_iterator)
+SCHEDULE=${SCHEDULE:-file}
+# one or more of: eager bf16 ipex jit compile int8
+BACKENDS=${BACKENDS:-ipex}
+# per-batch records go to offline_batches_1000.jsonl, summarize with parse_offline_logs.py
 
 for model in bge-base-zh-v1.5 bge-large-zh-v1.5 bge-m3;
 do
     for batch in 1 4 8 16 32 64;
     do
         echo "test model ${model}, batch $batch" | tee -a offline_result_1000.log
-        numactl -C 56-87 python benchmark_embedding_bge_offline.py --batch $batch  --model /home/liuzhuan/rag/benchmark/embedding/${model} 2>&1 | tee -a offline_result_1000.log
+        numactl -C 56-87 python benchmark_embedding_bge_offline.py --batch $batch --schedule $SCHEDULE --backend $BACKENDS --model /home/liuzhuan/rag/benchmark/embedding/${model} --batch_log offline_batches_1000.jsonl 2>&1 | tee -a offline_result_1000.log
 
         echo "complete test model ${model}, batch $batch" | tee -a offline_result_1000.log
 done
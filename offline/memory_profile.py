@@ -0,0 +1,284 @@
+#!/usr/bin/env python3
+"""
+Peak-memory profiling and max-batch search for offline runs.
+
+Peak RSS comes from VmHWM in /proc/self/status, reset between measurements
+through /proc/self/clear_refs; glibc malloc and HPU allocator statistics are
+recorded next to it. Search mode finds, for every sequence length, the largest
+batch whose peak RSS (or HPU peak memory) stays under a budget, and suggests
+the matching server limits. A probe that runs out of device or host memory
+counts as over budget and the search goes on.
+
+Shapes are measured in increasing size and freed heap memory is trimmed
+between them, so the absolute peak of each probe is not hidden by the
+allocator caching memory from an earlier, larger one.
+
+Example:
+    python memory_profile.py --model /mnt/disk1/models/Qwen3-Embedding-4B --lengths 512 2048 8192 \\
+        --budget_gb 64 --max_batch 256
+"""
+
+import argparse
+import ctypes
+import ctypes.util
+import gc
+import json
+import time
+
+import torch
+from transformers import AutoModel, BatchEncoding
+
+from backends import BACKENDS, prepare_backend
+from offline_utils import configure_threads, print_table
+
+GB = 1024 ** 3
+
+_libc = None
+
+
+def _load_libc():
+    global _libc
+    if _libc is None:
+        _libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6")
+    return _libc
+
+
+class _MallInfo2(ctypes.Structure):
+    _fields_ = [(name, ctypes.c_size_t) for name in
+                ["arena", "ordblks", "smblks", "hblks", "hblkhd", "usmblks", "fsmblks", "uordblks", "fordblks",
+                 "keepcost"]]
+
+
+def _proc_status(field):
+    """A kB field of /proc/self/status in bytes, None if unavailable."""
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith(field + ":"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    return None
+
+
+def current_rss():
+    return _proc_status("VmRSS")
+
+
+def peak_rss():
+    return _proc_status("VmHWM")
+
+
+def reset_peak(device="cpu"):
+    """Give freed heap back to the OS and restart peak RSS (and HPU peak memory) from now."""
+    try:
+        _load_libc().malloc_trim(0)
+    except (OSError, AttributeError):
+        pass
+    try:
+        # "5" resets the peak resident set size, Linux 4.0+
+        with open("/proc/self/clear_refs", "w") as f:
+            f.write("5")
+    except OSError:
+        pass
+    if device == "hpu":
+        import habana_frameworks.torch.hpu as hthpu
+        hthpu.reset_peak_memory_stats()
+
+
+def allocator_stats(device="cpu"):
+    """glibc heap statistics for CPU, allocator statistics for HPU, in bytes."""
+    if device == "hpu":
+        import habana_frameworks.torch.hpu as hthpu
+        stats = hthpu.memory_stats()
+        return {"hpu_in_use": stats.get("InUse"), "hpu_peak": stats.get("MaxInUse"), "hpu_limit": stats.get("Limit")}
+    try:
+        mallinfo2 = _load_libc().mallinfo2
+    except (OSError, AttributeError):
+        # glibc < 2.33
+        return {}
+    mallinfo2.restype = _MallInfo2
+    info = mallinfo2()
+    return {"heap_in_use": info.uordblks, "heap_free": info.fordblks, "heap_mmap": info.hblkhd}
+
+
+class MemoryTracker:
+    """Peak RSS and allocator statistics per input shape, over a benchmark loop."""
+
+    def __init__(self, device="cpu"):
+        self.device = device
+        self.baseline = current_rss()
+        self.shapes = {}
+
+    def start(self):
+        """Restart the peaks; call outside timed regions, trimming the heap takes a while."""
+        reset_peak(self.device)
+
+    def stop(self, batch_dict):
+        shape = tuple(batch_dict['input_ids'].shape)
+        record = {"peak_rss": peak_rss(), **allocator_stats(self.device)}
+        previous = self.shapes.get(shape)
+        if previous is None or (record["peak_rss"] or 0) > (previous["peak_rss"] or 0):
+            self.shapes[shape] = record
+
+    def rows(self):
+        return [{"batch": batch, "length": length, **memory_row(record, self.baseline)}
+                for (batch, length), record in sorted(self.shapes.items())]
+
+
+def memory_row(record, baseline=None):
+    """Human readable (GB) view of a measurement."""
+    row = {"peak RSS GB": record["peak_rss"] / GB if record.get("peak_rss") else 0.0}
+    if baseline and record.get("peak_rss"):
+        row["above model GB"] = (record["peak_rss"] - baseline) / GB
+    for key in ["heap_in_use", "hpu_peak"]:
+        if record.get(key) is not None:
+            row[key.replace("_", " ") + " GB"] = record[key] / GB
+    return row
+
+
+def is_out_of_memory(error):
+    """Whether an exception is an allocator failure (torch OOM, HPU device memory allocation, host MemoryError)."""
+    if isinstance(error, MemoryError):
+        return True
+    message = str(error).lower()
+    return any(text in message for text in ["out of memory", "allocation failed", "failed to allocate"])
+
+
+def measure_shape(run_model, batch, length, device="cpu", token_id=100, runs=2):
+    """
+    Peak memory of running a (batch, length) batch runs times; the first run includes compilation.
+
+    A run that exhausts device or host memory gives {"oom": True}, with the
+    failed batch's memory freed so the next probe starts clean.
+    """
+    reset_peak(device)
+    oom = False
+    try:
+        for _ in range(runs):
+            batch_dict = BatchEncoding({"input_ids": torch.full((batch, length), token_id, dtype=torch.long),
+                                        "attention_mask": torch.ones((batch, length), dtype=torch.long)})
+            run_model(batch_dict)
+    except (RuntimeError, MemoryError) as e:
+        if not is_out_of_memory(e):
+            raise
+        print(f"  length {length}, batch {batch}: {type(e).__name__}: {(str(e).splitlines() or [''])[0]}")
+        oom = True
+    if oom:
+        # outside the except block the traceback no longer holds the failed batch's tensors
+        batch_dict = None
+        gc.collect()
+        reset_peak(device)
+        return {"oom": True}
+    return {"peak_rss": peak_rss(), **allocator_stats(device)}
+
+
+def find_max_batch(run_model, length, budget, device="cpu", max_batch=1024, token_id=100):
+    """
+    Largest batch at length whose peak memory stays under budget bytes.
+
+    Doubles the batch until the budget is exceeded, then bisects. Returns
+    (max batch or 0, {batch: measurement}).
+    """
+    measured = {}
+
+    def fits(batch):
+        record = measure_shape(run_model, batch, length, device, token_id)
+        measured[batch] = record
+        if record.get("oom"):
+            print(f"  length {length}, batch {batch}: out of memory, treated as over budget")
+            return False
+        peak = record.get("hpu_peak") if device == "hpu" else record["peak_rss"]
+        if peak is None:
+            # no peak reported (allocator stats or /proc unavailable), count the probe as failed
+            print(f"  length {length}, batch {batch}: no peak memory reported, treated as over budget")
+            return False
+        print(f"  length {length}, batch {batch}: peak {peak / GB:.2f} GB")
+        return peak <= budget
+
+    low, high = 0, None
+    batch = 1
+    while batch <= max_batch:
+        if not fits(batch):
+            high = batch
+            break
+        low = batch
+        batch *= 2
+    if high is None:
+        high = max_batch + 1
+        if low < max_batch:
+            if fits(max_batch):
+                low = max_batch
+            else:
+                high = max_batch
+    while high - low > 1:
+        mid = (low + high) // 2
+        if fits(mid):
+            low = mid
+        else:
+            high = mid
+    return low, measured
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Peak memory profiling and max-batch search",
+                                     formatter_class=argparse.RawDescriptionHelpFormatter, epilog=__doc__)
+    parser.add_argument("--model", type=str, required=True, help="Model path")
+    parser.add_argument("--device", type=str, default="cpu", choices=["cpu", "hpu"], help="Device to use: cpu or hpu")
+    parser.add_argument("--backend", type=str, default="eager", choices=BACKENDS, help="CPU backend (default: eager)")
+    parser.add_argument("--lengths", type=int, nargs="+", default=[512, 1024, 2048, 4096, 8192],
+                        help="Sequence lengths to search")
+    parser.add_argument("--budget_gb", type=float, required=True,
+                        help="Memory budget in GB (peak RSS on CPU, peak device memory on HPU)")
+    parser.add_argument("--max_batch", type=int, default=1024, help="Largest batch to try")
+    parser.add_argument("--threads", type=int, default=None, help="torch intra-op threads (default: torch default)")
+    parser.add_argument("--result_json", type=str, default=None, help="Write the search results to this JSON file")
+    args = parser.parse_args()
+
+    configure_threads(args.threads)
+    model = AutoModel.from_pretrained(args.model)
+    example = BatchEncoding({"input_ids": torch.full((1, 16), 100, dtype=torch.long),
+                             "attention_mask": torch.ones((1, 16), dtype=torch.long)})
+    if args.device == "hpu":
+        import habana_frameworks.torch as ht
+        import habana_frameworks.torch.core as htcore
+        model = ht.hpu.wrap_in_hpu_graph(model.eval().to("hpu"))
+
+        def run_model(batch_dict):
+            batch_dict = batch_dict.to("hpu")
+            with torch.inference_mode():
+                outputs = model(**batch_dict)
+            htcore.mark_step()
+            htcore.hpu.synchronize()
+            return outputs.last_hidden_state
+    else:
+        run_model = prepare_backend(args.backend, model, example)
+    run_model(example)
+    baseline = current_rss()
+    print(f"Model loaded, RSS {baseline / GB:.2f} GB, budget {args.budget_gb:.2f} GB")
+
+    rows = []
+    start = time.time()
+    for length in sorted(args.lengths):
+        batch, measured = find_max_batch(run_model, length, args.budget_gb * GB, args.device, args.max_batch)
+        record = measured.get(batch, {})
+        rows.append({"length": length, "max batch": batch, "max batch tokens": batch * length,
+                     **(memory_row(record, baseline) if record else {})})
+    print(f"\nSearch took {time.time() - start:.1f}s")
+
+    print(f"\nLargest batch under {args.budget_gb:.2f} GB ({args.model}, {args.backend if args.device == 'cpu' else 'hpu'}):")
+    print_table(rows)
+    fitting = [r for r in rows if r["max batch"] > 0]
+    if fitting:
+        # one token budget has to be safe at every length
+        print(f"\nSuggested MAX_BATCH_TOKENS: {min(r['max batch tokens'] for r in fitting)}")
+        print("Suggested MAX_BATCH_REQUESTS per MAX_WARMUP_SEQUENCE_LENGTH: "
+              + ", ".join(f"{r['length']}={r['max batch']}" for r in fitting))
+    if args.result_json:
+        with open(args.result_json, "w", encoding="utf8") as f:
+            json.dump({"model": args.model, "device": args.device, "backend": args.backend,
+                       "budget_gb": args.budget_gb, "baseline_rss": baseline, "results": rows}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
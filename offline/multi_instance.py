@@ -0,0 +1,156 @@
+#!/usr/bin/env python3
+"""
+Run several pinned instances of the offline embedding benchmark side by side.
+
+Each instance gets a disjoint core group (NUMA-local when it fits, memory bound
+with numactl) and a strided shard of the dataset. The sweep covers every
+instance count x threads-per-instance combination that fits on the allowed
+cores and reports aggregate steady-state texts/s and tokens/s per backend.
+
+Example, 1x32 vs 2x16 vs 4x8 on cores 56-87:
+    python multi_instance.py --cores 56-87 --instances 1 2 4 --threads 8 16 32 -- \\
+        --model /home/liuzhuan/rag/benchmark/embedding/bge-base-zh-v1.5 --batch 8 --backend ipex
+"""
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+
+from cpu_topology import numa_nodes, parse_cpulist, plan_core_groups, pinned_command, format_cpulist
+from report_utils import print_table
+
+BENCHMARK_SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "benchmark_embedding_bge_offline.py")
+
+
+def run_instances(groups, threads, bench_args, output_dir, script=BENCHMARK_SCRIPT, env=None, name=None):
+    """
+    Start one benchmark per core group on its shard, wait for all, return their result dicts.
+
+    env adds to the inherited environment (None unsets a variable), name prefixes the per-instance
+    log and result files.
+    """
+    n = len(groups)
+    name = name or f"{n}x{threads}"
+    procs = []
+    for i, (node, cpus) in enumerate(groups):
+        tag = f"{name}_{i}"
+        result_json = os.path.join(output_dir, f"instance_{tag}.json")
+        log_file = open(os.path.join(output_dir, f"instance_{tag}.log"), "w")
+        shard = ["--shard", f"{i}/{n}"] if n > 1 else []
+        cmd = pinned_command([sys.executable, script, *bench_args, *shard,
+                              "--result_json", result_json], cpus, node)
+        proc_env = dict(os.environ, OMP_NUM_THREADS=str(threads), MKL_NUM_THREADS=str(threads), **(env or {}))
+        proc_env = {key: value for key, value in proc_env.items() if value is not None}
+        print(f"  instance {i}: node {node if node is not None else '-'}, cpus {format_cpulist(cpus)}")
+        procs.append((subprocess.Popen(cmd, stdout=log_file, stderr=subprocess.STDOUT, env=proc_env),
+                      log_file, result_json))
+
+    try:
+        running = list(procs)
+        while running:
+            for item in list(running):
+                proc, log_file, _ = item
+                code = proc.poll()
+                if code is None:
+                    continue
+                if code != 0:
+                    raise RuntimeError(f"instance failed with exit code {code}, see {log_file.name}")
+                running.remove(item)
+            time.sleep(0.5)
+    finally:
+        # a failed instance (or Ctrl-C) stops the others, they would skew the next combination
+        for proc, log_file, _ in procs:
+            if proc.poll() is None:
+                proc.terminate()
+                try:
+                    proc.wait(timeout=10)
+                except subprocess.TimeoutExpired:
+                    proc.kill()
+                    proc.wait()
+            log_file.close()
+
+    results = []
+    for _, _, result_json in procs:
+        with open(result_json, encoding="utf8") as f:
+            results.extend(json.load(f))
+    return results
+
+
+def aggregate(instances, threads, results):
+    """
+    Combine per-instance summaries, one row per backend.
+
+    texts/s and tokens/s add up the instances' steady-state rates (compile
+    batches excluded); the wall rate divides all work by the span from first
+    start to last end, which also charges for instances finishing at
+    different times.
+    """
+    backends = {}
+    for r in results:
+        backends.setdefault(r["backend"], []).append(r)
+    rows = []
+    for backend, runs in backends.items():
+        wall = max(r["end_time"] for r in runs) - min(r["start_time"] for r in runs)
+        total_texts = sum(r["total_texts"] for r in runs)
+        total_tokens = sum(r["real_tokens"] for r in runs)
+        rows.append({
+            "instances": instances,
+            "threads": threads,
+            "cores": instances * threads,
+            "backend": backend,
+            "texts/s": sum(r["steady_texts_per_sec"] for r in runs),
+            "tokens/s": sum(r["steady_tokens_per_sec"] for r in runs),
+            "wall texts/s": total_texts / wall if wall > 0 else 0.0,
+            "wall tokens/s": total_tokens / wall if wall > 0 else 0.0,
+            "worst p99 ms": max(r["batch_latency"]["p99"] for r in runs) * 1000,
+        })
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description="NUMA-aware multi-instance offline throughput runner",
+                                     formatter_class=argparse.RawDescriptionHelpFormatter, epilog=__doc__)
+    parser.add_argument("--instances", type=int, nargs="+", default=[1, 2, 4], help="Instance counts to sweep")
+    parser.add_argument("--threads", type=int, nargs="+", default=[8, 16, 32], help="Threads (cores) per instance")
+    parser.add_argument("--cores", type=str, default=None, help="Restrict to these CPUs, e.g. 56-87 (default: all)")
+    parser.add_argument("--logical", action="store_true", help="Use SMT siblings as separate cores")
+    parser.add_argument("--output_dir", type=str, default=f"multi_instance_{time.strftime('%Y%m%d_%H%M%S')}",
+                        help="Directory for per-instance logs and results")
+    parser.add_argument("bench_args", nargs=argparse.REMAINDER,
+                        help="Arguments after -- are passed to benchmark_embedding_bge_offline.py")
+    args = parser.parse_args()
+
+    bench_args = args.bench_args[1:] if args.bench_args[:1] == ["--"] else args.bench_args
+    nodes = numa_nodes(parse_cpulist(args.cores) if args.cores else None, physical_only=not args.logical)
+    total_cores = sum(len(cpus) for cpus in nodes.values())
+    print("NUMA nodes: " + ", ".join(f"node{n}: {format_cpulist(c)}" for n, c in nodes.items()))
+    os.makedirs(args.output_dir, exist_ok=True)
+
+    rows = []
+    for instances in args.instances:
+        for threads in args.threads:
+            groups = plan_core_groups(nodes, instances, threads)
+            if groups is None:
+                print(f"\nSkipping {instances} x {threads}: needs {instances * threads} of {total_cores} cores")
+                continue
+            print(f"\nRunning {instances} instance(s) x {threads} thread(s)")
+            results = run_instances(groups, threads, bench_args, args.output_dir)
+            for row in aggregate(instances, threads, results):
+                rows.append(row)
+                print(f"  {row['backend']}: {row['texts/s']:.2f} texts/sec | {row['tokens/s']:.2f} tokens/sec")
+
+    if rows:
+        print("\nMulti-instance summary:")
+        print_table(rows)
+        best = max(rows, key=lambda r: r["tokens/s"])
+        print(f"\nBest: {best['instances']} x {best['threads']} threads ({best['backend']}), "
+              f"{best['tokens/s']:.2f} tokens/sec")
+        with open(os.path.join(args.output_dir, "summary.json"), "w", encoding="utf8") as f:
+            json.dump(rows, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
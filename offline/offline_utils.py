@@ -0,0 +1,402 @@
+"""
+Helpers shared by the offline embedding benchmarks.
+"""
+
+import json
+import os
+import sys
+import threading
+import time
+from collections import OrderedDict
+from queue import Queue
+
+import torch
+from torch import Tensor
+from transformers import BatchEncoding
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from dataset_mmap import PretokenizedText, load_texts
+# torch-free report helpers, imported by the benchmarks from here too
+from report_utils import latency_percentiles, print_table
+
+SCHEDULES = ["file", "sorted", "bucketed"]
+
+
+def configure_threads(threads=None, interop_threads=None):
+    """
+    Set the torch intra-op and inter-op thread pools, None keeps the default.
+
+    Must run before the first parallel op, torch refuses to resize the
+    inter-op pool afterwards. Returns the (intra, inter) sizes in effect.
+    """
+    if interop_threads:
+        torch.set_num_interop_threads(interop_threads)
+    if threads:
+        torch.set_num_threads(threads)
+    return torch.get_num_threads(), torch.get_num_interop_threads()
+
+
+def thread_environment():
+    """OpenMP/affinity variables that change CPU results, as set in this process."""
+    names = ["OMP_NUM_THREADS", "OMP_PROC_BIND", "OMP_PLACES", "KMP_AFFINITY", "KMP_BLOCKTIME"]
+    return {name: os.environ[name] for name in names if name in os.environ}
+
+
+def get_chunks(input_file):
+    # json list/split file, or a .mmap dataset whose texts carry their token ids
+    return load_texts(input_file)
+
+
+def last_token_pool(last_hidden_states: Tensor,
+                 attention_mask: Tensor) -> Tensor:
+    left_padding = (attention_mask[:, -1].sum() == attention_mask.shape[0])
+    if left_padding:
+        return last_hidden_states[:, -1]
+    else:
+        sequence_lengths = attention_mask.sum(dim=1) - 1
+        batch_size = last_hidden_states.shape[0]
+        return last_hidden_states[torch.arange(batch_size, device=last_hidden_states.device), sequence_lengths]
+
+
+def text_lengths(tokenizer, texts, max_length):
+    """Token length of each text as the model sees it (special tokens included, truncated)."""
+    if all(isinstance(t, PretokenizedText) for t in texts):
+        lengths = [t.token_count for t in texts]
+    else:
+        lengths = [len(ids) for ids in tokenizer(list(texts), truncation=True, max_length=max_length)["input_ids"]]
+    return [min(n, max_length) for n in lengths]
+
+
+def padded_length(length, pad_to_multiple_of):
+    return -(-length // pad_to_multiple_of) * pad_to_multiple_of
+
+
+def shard_items(items, index, count):
+    """Strided shard index of count, so every shard sees a similar length mix."""
+    if not 0 <= index < count:
+        raise ValueError(f"invalid shard {index}/{count}")
+    return items[index::count]
+
+
+def data_iterator(sample_texts, batch_size=4, schedule="file", lengths=None, pad_to_multiple_of=256):
+    """
+    Yield batches of texts.
+
+    schedule:
+        file      - file order, as the texts appear in the dataset
+        sorted    - ascending token length, so neighbours pad to similar lengths
+        bucketed  - group texts by padded length (multiple of pad_to_multiple_of),
+                    so no batch pads beyond its bucket
+    lengths is required for sorted and bucketed, see text_lengths().
+    """
+    if schedule == "file":
+        order = [list(range(len(sample_texts)))]
+    elif schedule == "sorted":
+        order = [sorted(range(len(sample_texts)), key=lambda i: lengths[i])]
+    elif schedule == "bucketed":
+        buckets = OrderedDict()
+        for i in sorted(range(len(sample_texts)), key=lambda i: lengths[i]):
+            buckets.setdefault(padded_length(lengths[i], pad_to_multiple_of), []).append(i)
+        order = list(buckets.values())
+    else:
+        raise ValueError(f"unknown schedule {schedule}, expected one of {SCHEDULES}")
+
+    for indices in order:
+        for start in range(0, len(indices), batch_size):
+            yield [sample_texts[i] for i in indices[start:start + batch_size]]
+
+
+def plan_shapes(lengths, batch_size, schedule="file", pad_to_multiple_of=256):
+    """
+    (batch, padded length) input shapes the benchmark loop will produce, with
+    their batch counts, in the order they first appear.
+
+    Uses the same batching as data_iterator, so every shape a graph-compiled
+    backend (HPU graphs, IPEX/jit, torch.compile) specializes on is known upfront.
+    """
+    shapes = OrderedDict()
+    for indices in data_iterator(list(range(len(lengths))), batch_size, schedule, lengths, pad_to_multiple_of):
+        shape = (len(indices), padded_length(max(lengths[i] for i in indices), pad_to_multiple_of))
+        shapes[shape] = shapes.get(shape, 0) + 1
+    return shapes
+
+
+def warmup_shapes(run_model, shapes, token_id, runs=2):
+    """
+    Run every (batch, length) shape on a synthetic full-attention batch.
+
+    The first run pays tracing/graph compilation, later runs are steady state;
+    their difference is reported as the shape's compile time. Returns one
+    timing dict per shape.
+    """
+    timings = []
+    for batch, length in shapes:
+        times = []
+        for _ in range(max(runs, 2)):
+            batch_dict = BatchEncoding({"input_ids": torch.full((batch, length), token_id, dtype=torch.long),
+                                        "attention_mask": torch.ones((batch, length), dtype=torch.long)})
+            start = time.time()
+            run_model(batch_dict)
+            times.append(time.time() - start)
+        steady = min(times[1:])
+        timings.append({"batch": batch, "length": length, "first ms": times[0] * 1000,
+                        "steady ms": steady * 1000, "compile ms": max(times[0] - steady, 0.0) * 1000})
+    return timings
+
+
+class SteadyState:
+    """
+    Separate batches that hit a shape for the first time (compile spikes) from
+    steady-state batches, whose times give the steady-state throughput.
+    """
+
+    def __init__(self, warmed_shapes=()):
+        self.seen = set(warmed_shapes)
+        self.texts = 0
+        self.tokens = 0
+        self.time = 0.0
+        self.batch_times = []
+        self.compile_batches = 0
+        self.compile_time = 0.0
+
+    def update(self, batch_dict, texts, tokens, batch_time):
+        """Record a batch; returns False if it was excluded as a compile batch."""
+        shape = tuple(batch_dict['input_ids'].shape)
+        if shape not in self.seen:
+            self.seen.add(shape)
+            self.compile_batches += 1
+            self.compile_time += batch_time
+            return False
+        self.texts += texts
+        self.tokens += tokens
+        self.time += batch_time
+        self.batch_times.append(batch_time)
+        return True
+
+    @property
+    def texts_per_sec(self):
+        return self.texts / self.time if self.time else 0.0
+
+    @property
+    def tokens_per_sec(self):
+        return self.tokens / self.time if self.time else 0.0
+
+
+class BatchLog:
+    """
+    Per-batch records appended to a JSON lines file, one object per batch
+    carrying the run fields (model, backend, batch size...) so that runs
+    appended to the same file can be told apart; see parse_offline_logs.py.
+    """
+
+    def __init__(self, path, **run):
+        self.file = open(path, "a", encoding="utf8")
+        self.run = {"run": f"{time.strftime('%Y%m%d-%H%M%S')}-{os.getpid()}", **run}
+
+    def write(self, **batch):
+        self.file.write(json.dumps({**self.run, **batch}) + "\n")
+
+    def close(self):
+        self.file.close()
+
+
+class PaddingStats:
+    """Accumulate real (attention mask) vs padded (tensor) token counts."""
+
+    def __init__(self):
+        self.real_tokens = 0
+        self.padded_tokens = 0
+
+    def update(self, batch_dict):
+        real = int(batch_dict['attention_mask'].sum())
+        padded = batch_dict['input_ids'].numel()
+        self.real_tokens += real
+        self.padded_tokens += padded
+        return real, padded
+
+    @property
+    def efficiency(self):
+        return self.real_tokens / self.padded_tokens if self.padded_tokens else 0.0
+
+
+# first match wins, so attention's batched matmuls are not counted as GEMM
+OP_CATEGORIES = [
+    ("tokenizer", ("tokenize",)),
+    ("attention", ("attention", "softmax", "baddbmm", "bmm")),
+    ("gemm", ("addmm", "mm", "matmul", "linear", "gemm")),
+    ("norm", ("norm",)),
+    ("activation", ("gelu", "silu", "relu", "tanh")),
+]
+
+
+def op_category(name):
+    lowered = name.lower()
+    for category, patterns in OP_CATEGORIES:
+        if any(p in lowered for p in patterns):
+            return category
+    return "other"
+
+
+class BatchProfiler:
+    """
+    torch.profiler over a window of benchmark batches.
+
+    Skips the first skip batches, then records batches batches after one
+    profiler warm-up step. Writes <tag>.trace.json (chrome://tracing or
+    Perfetto) and <tag>.ops.txt (operators by self CPU time, grouped by input
+    shape) to output_dir; call step() after every batch and stop() at the end,
+    which returns the summary or None if the run was shorter than the window.
+    """
+
+    def __init__(self, output_dir, tag, skip=2, batches=5, top=20):
+        from torch.profiler import ProfilerActivity, profile, schedule
+
+        os.makedirs(output_dir, exist_ok=True)
+        self.output_dir = output_dir
+        self.tag = tag
+        self.top = top
+        self.summary = None
+        self.profiler = profile(activities=[ProfilerActivity.CPU], record_shapes=True,
+                                schedule=schedule(wait=skip, warmup=1, active=batches, repeat=1),
+                                on_trace_ready=self._export)
+        self.profiler.start()
+
+    def step(self):
+        self.profiler.step()
+
+    def stop(self):
+        self.profiler.stop()
+        return self.summary
+
+    def _export(self, prof):
+        trace = os.path.join(self.output_dir, f"{self.tag}.trace.json")
+        prof.export_chrome_trace(trace)
+        averages = prof.key_averages(group_by_input_shape=True)
+        table = os.path.join(self.output_dir, f"{self.tag}.ops.txt")
+        with open(table, "w") as f:
+            f.write(averages.table(sort_by="self_cpu_time_total", row_limit=self.top))
+
+        total = sum(e.self_cpu_time_total for e in averages)
+        categories = {}
+        for e in averages:
+            category = op_category(e.key)
+            categories[category] = categories.get(category, 0.0) + e.self_cpu_time_total
+        top_ops = sorted(averages, key=lambda e: e.self_cpu_time_total, reverse=True)[:self.top]
+        self.summary = {
+            "trace": trace,
+            "table": table,
+            "self_cpu_ms": total / 1000,
+            "categories": {k: {"self cpu ms": v / 1000, "share": v / total if total else 0.0}
+                           for k, v in sorted(categories.items(), key=lambda kv: -kv[1])},
+            "top_ops": [{"op": e.key, "self cpu ms": e.self_cpu_time_total / 1000, "calls": e.count,
+                         "input shapes": str(e.input_shapes)} for e in top_ops],
+        }
+
+
+def print_profile(summary):
+    """Print a BatchProfiler summary."""
+    if summary is None:
+        print("  Profile: run ended before the profiling window, no trace written")
+        return
+    print(f"  Profile: {summary['self_cpu_ms']:.2f}ms self CPU, trace {summary['trace']}, ops {summary['table']}")
+    print("  " + ", ".join(f"{k} {v['share']:.1%}" for k, v in summary["categories"].items()))
+    print_table(summary["top_ops"])
+
+
+def serial_batches(batches, tokenize_fn):
+    """Tokenize each batch just before it is used; yields (texts, batch_dict, tokenize_time, wait_time)."""
+    for batch in batches:
+        start = time.time()
+        batch_dict = tokenize_fn(batch)
+        tokenize_time = time.time() - start
+        # the model waits for the whole tokenization
+        yield batch, batch_dict, tokenize_time, tokenize_time
+
+
+def pin_memory_available():
+    """Whether host memory can be pinned, which needs a CUDA or HPU runtime; CPU-only torch builds raise."""
+    if torch.cuda.is_available():
+        return True
+    hpu = getattr(torch, "hpu", None)
+    return bool(hpu is not None and hpu.is_available())
+
+
+def tokenize_overlap(tokenize_time, wait_time):
+    """Fraction of tokenization time hidden behind the model, 0 for serial tokenization."""
+    if not tokenize_time:
+        return 0.0
+    return min(max(1.0 - wait_time / tokenize_time, 0.0), 1.0)
+
+
+class PinnedBuffers:
+    """Ring of reused pinned host tensors per (key, shape, dtype), for faster host-to-device copies."""
+
+    def __init__(self, slots):
+        self.slots = slots
+        self.rings = {}
+
+    def copy_in(self, batch_dict):
+        data = {}
+        for key, tensor in batch_dict.items():
+            ring_key = (key, tuple(tensor.shape), tensor.dtype)
+            ring, index = self.rings.get(ring_key, ([], 0))
+            if len(ring) < self.slots:
+                ring.append(torch.empty_like(tensor).pin_memory())
+            buffer = ring[index % len(ring)]
+            buffer.copy_(tensor)
+            self.rings[ring_key] = (ring, index + 1)
+            data[key] = buffer
+        return BatchEncoding(data)
+
+
+class TokenizePipeline:
+    """
+    Tokenize upcoming batches on a background thread into a bounded queue.
+
+    Iterating yields (texts, batch_dict, tokenize_time, wait_time) like
+    serial_batches, where wait_time is how long the model loop was blocked on
+    the queue. HF fast tokenizers release the GIL, so tokenization overlaps the
+    model forward pass.
+    """
+
+    _DONE = object()
+
+    def __init__(self, batches, tokenize_fn, depth=2, pin_memory=False):
+        self.queue = Queue(maxsize=depth)
+        if pin_memory and not pin_memory_available():
+            print("No accelerator available, --pin_memory ignored")
+            pin_memory = False
+        # a buffer may be in the queue, being filled, or used by the consumer
+        self.pinned = PinnedBuffers(depth + 3) if pin_memory else None
+        self.tokenize_time = 0.0
+        self.wait_time = 0.0
+        self.thread = threading.Thread(target=self._produce, args=(batches, tokenize_fn), daemon=True)
+        self.thread.start()
+
+    def _produce(self, batches, tokenize_fn):
+        try:
+            for batch in batches:
+                start = time.time()
+                batch_dict = tokenize_fn(batch)
+                if self.pinned is not None:
+                    batch_dict = self.pinned.copy_in(batch_dict)
+                tokenize_time = time.time() - start
+                self.tokenize_time += tokenize_time
+                self.queue.put((batch, batch_dict, tokenize_time))
+        except BaseException as e:
+            self.queue.put(e)
+        finally:
+            self.queue.put(self._DONE)
+
+    def __iter__(self):
+        while True:
+            start = time.time()
+            item = self.queue.get()
+            if item is self._DONE:
+                return
+            if isinstance(item, BaseException):
+                raise item
+            wait_time = time.time() - start
+            self.wait_time += wait_time
+            batch, batch_dict, tokenize_time = item
+            yield batch, batch_dict, tokenize_time, wait_time
@@ -0,0 +1,170 @@
+#!/usr/bin/env python3
+"""
+Per-batch statistics from offline embedding benchmark output.
+
+Reads the --batch_log JSON lines files of benchmark_embedding_bge_offline.py /
+benchmark_embedding_offline.py, or the console logs loop_offline.sh collects
+(offline_result_*.log: "test model <model>, batch <n>" followed by the
+"Processing batch" blocks). For every model x backend x batch size it reports
+the steady-state batch latency distribution, the share of tokenization vs
+model time and the steady-state throughput.
+
+Compile outliers are excluded: batches the benchmark marked as first at their
+shape, or, in logs that predate that marker, the first batch of every
+(batch size, token count) seen in the run.
+
+Logs that predate the "(padded: N)" field counted padded tokens as "Token
+count"; their rows say "padded" in the counts column and their tokens/s is
+padded throughput, not comparable with the real-token rows.
+
+Example:
+    python parse_offline_logs.py offline_result_500.log offline_result_1000.log --csv offline_batches.csv
+"""
+
+import argparse
+import csv
+import json
+import os
+import re
+
+from report_utils import latency_percentiles, print_table
+
+RUN_HEADER = re.compile(r"^test model (\S+), batch (\d+)")
+BACKEND = re.compile(r"^\s+Backend: (\S+)")
+BATCH = re.compile(r"^Processing batch #(\d+) of size (\d+)")
+TOKENS = re.compile(r"^\s+Token count: (\d+) tokens(?: \(padded: (\d+))?")
+TIMES = re.compile(r"^\s+Batch time: ([\d.]+)s \(tokenize: ([\d.]+)s(?:, wait: ([\d.]+)s)?, model: ([\d.]+)s\)")
+COMPILE = "First batch at this shape"
+
+
+def parse_console_log(path):
+    """Runs in a loop_offline.sh log, each {model, backend, batch_size, source, counts, batches}."""
+    runs = []
+    run = batch = None
+    with open(path, encoding="utf8", errors="replace") as f:
+        for line in f:
+            match = RUN_HEADER.match(line)
+            if match:
+                run = {"model": match.group(1), "backend": "", "batch_size": int(match.group(2)),
+                       "source": path, "counts": "real", "batches": []}
+                runs.append(run)
+                batch = None
+                continue
+            if run is None:
+                continue
+            match = BATCH.match(line)
+            if match:
+                batch = {"batch": int(match.group(1)), "size": int(match.group(2)), "compile": None}
+                run["batches"].append(batch)
+                continue
+            match = BACKEND.match(line)
+            if match:
+                run["backend"] = match.group(1)
+            if batch is None:
+                continue
+            if COMPILE in line:
+                batch["compile"] = True
+            match = TOKENS.match(line)
+            if match:
+                batch["tokens"] = int(match.group(1))
+                batch["padded_tokens"] = int(match.group(2)) if match.group(2) else None
+            match = TIMES.match(line)
+            if match:
+                batch["batch_time"] = float(match.group(1))
+                batch["tokenize_time"] = float(match.group(2))
+                batch["wait_time"] = float(match.group(3)) if match.group(3) else None
+                batch["model_time"] = float(match.group(4))
+    for run in runs:
+        run["batches"] = [b for b in run["batches"] if "batch_time" in b]
+        if any(b.get("padded_tokens") is None for b in run["batches"]):
+            # old format: "Token count" is the padded count, there are no real token counts
+            run["counts"] = "padded"
+        if any(b["compile"] or b["wait_time"] is not None for b in run["batches"]):
+            # this benchmark version marks its compile batches, everything else is steady
+            for b in run["batches"]:
+                b["compile"] = bool(b["compile"])
+    return [run for run in runs if run["batches"]]
+
+
+def parse_batch_log(path):
+    """Runs in a --batch_log JSON lines file, grouped by their run id."""
+    runs = {}
+    with open(path, encoding="utf8") as f:
+        for line in f:
+            if not line.strip():
+                continue
+            record = json.loads(line)
+            run = runs.setdefault(record["run"], {"model": record["model"], "backend": record["backend"],
+                                                  "batch_size": record["batch_size"], "source": path,
+                                                  "counts": "real", "batches": []})
+            run["batches"].append(record)
+    return list(runs.values())
+
+
+def mark_compile_batches(batches):
+    """Older logs: the first batch of each (size, tokens) shape is the compile outlier."""
+    seen = set()
+    for b in batches:
+        if b["compile"] is None:
+            shape = (b["size"], b.get("padded_tokens") or b["tokens"])
+            b["compile"] = shape not in seen
+            seen.add(shape)
+
+
+def summarize(run):
+    batches = run["batches"]
+    mark_compile_batches(batches)
+    steady = [b for b in batches if not b["compile"]]
+    compiled = [b for b in batches if b["compile"]]
+    steady_time = sum(b["batch_time"] for b in steady)
+    tokenize_time = sum(b["tokenize_time"] for b in steady)
+    model_time = sum(b["model_time"] for b in steady)
+    work_time = tokenize_time + model_time
+    latency = latency_percentiles([b["batch_time"] for b in steady], (50, 90, 99))
+    return {
+        "model": run["model"],
+        "backend": run["backend"],
+        "batch": run["batch_size"],
+        "log": os.path.basename(run["source"]),
+        "batches": len(batches),
+        "compile": len(compiled),
+        "compile s": sum(b["batch_time"] for b in compiled),
+        **{f"{k} ms": v * 1000 for k, v in latency.items()},
+        "max ms": max((b["batch_time"] for b in steady), default=0.0) * 1000,
+        "tokenize %": 100 * tokenize_time / work_time if work_time else 0.0,
+        "model %": 100 * model_time / work_time if work_time else 0.0,
+        "texts/s": sum(b["size"] for b in steady) / steady_time if steady_time else 0.0,
+        "tokens/s": sum(b["tokens"] for b in steady) / steady_time if steady_time else 0.0,
+        "counts": run["counts"],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Per-batch statistics from offline benchmark logs",
+                                     formatter_class=argparse.RawDescriptionHelpFormatter, epilog=__doc__)
+    parser.add_argument("logs", nargs="+", help="loop_offline.sh console logs or --batch_log .jsonl files")
+    parser.add_argument("--csv", type=str, default=None, help="Also write the table to this CSV file")
+    args = parser.parse_args()
+
+    runs = []
+    for path in args.logs:
+        runs += parse_batch_log(path) if path.endswith(".jsonl") else parse_console_log(path)
+    if not runs:
+        print("No benchmark runs found")
+        return
+
+    rows = sorted((summarize(run) for run in runs), key=lambda r: (r["model"], r["backend"], r["batch"], r["log"]))
+    print(f"Steady-state batch statistics ({len(runs)} runs, compile batches excluded):")
+    print_table(rows)
+    if any(r["counts"] == "padded" for r in rows):
+        print('Rows with counts "padded" come from old logs whose token counts include padding')
+    if args.csv:
+        with open(args.csv, "w", newline="", encoding="utf8") as f:
+            writer = csv.DictWriter(f, fieldnames=list(rows[0].keys()))
+            writer.writeheader()
+            writer.writerows(rows)
+        print(f"Saved to {args.csv}")
+
+
+if __name__ == "__main__":
+    main()
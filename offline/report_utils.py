@@ -0,0 +1,31 @@
+"""
+Report helpers for the offline benchmarks that need no third-party packages,
+so log parsers and runners can use them without importing torch.
+"""
+
+
+def latency_percentiles(times, percentiles=(50, 90, 99)):
+    """Percentiles of per-batch latencies in seconds, keyed p50/p90/..., linearly interpolated like numpy."""
+    if not times:
+        return {f"p{p}": 0.0 for p in percentiles}
+    ordered = sorted(times)
+    result = {}
+    for p in percentiles:
+        rank = (len(ordered) - 1) * p / 100
+        low = int(rank)
+        high = min(low + 1, len(ordered) - 1)
+        result[f"p{p}"] = float(ordered[low] + (ordered[high] - ordered[low]) * (rank - low))
+    return result
+
+
+def print_table(rows, columns=None):
+    """Print a list of dicts as an aligned text table."""
+    if not rows:
+        return
+    columns = columns or list(rows[0].keys())
+    cells = [[f"{row.get(c):.2f}" if isinstance(row.get(c), float) else str(row.get(c, "")) for c in columns]
+             for row in rows]
+    widths = [max(len(c), *(len(r[i]) for r in cells)) for i, c in enumerate(columns)]
+    print("  ".join(c.rjust(w) for c, w in zip(columns, widths)))
+    for r in cells:
+        print("  ".join(v.rjust(w) for v, w in zip(r, widths)))
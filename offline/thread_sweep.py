@@ -0,0 +1,126 @@
+#!/usr/bin/env python3
+"""
+Sweep torch thread counts and OpenMP affinity for the offline embedding benchmark.
+
+Every model x batch size x max length x threads x inter-op threads x affinity
+combination runs as a fresh process pinned to its own set of physical cores,
+since torch cannot resize its thread pools once they are used. For each model,
+batch size and max length the throughput-optimal (steady-state tokens/s, compile
+batches excluded) and latency-optimal (p50 batch latency) settings are reported.
+
+Example:
+    python thread_sweep.py --cores 56-87 --models /mnt/disk1/models/bge-m3 --batches 1 8 32 \\
+        --max_lengths 512 1024 --threads 4 8 16 32 --affinity none close spread -- --backend ipex
+"""
+
+import argparse
+import json
+import os
+import time
+
+from cpu_topology import format_cpulist, numa_nodes, parse_cpulist, plan_core_groups
+from multi_instance import run_instances
+from report_utils import print_table
+
+# OpenMP thread placement inside the pinned core set; GNU OpenMP reads OMP_*, Intel OpenMP (IPEX) KMP_*
+AFFINITY_VARIABLES = ["OMP_PROC_BIND", "OMP_PLACES", "GOMP_CPU_AFFINITY", "KMP_AFFINITY", "KMP_BLOCKTIME"]
+AFFINITY = {
+    # None unsets a variable, so the baseline does not inherit a binding from the calling shell
+    "none": {name: None for name in AFFINITY_VARIABLES},
+    "close": {"OMP_PROC_BIND": "close", "OMP_PLACES": "cores",
+              "KMP_AFFINITY": "granularity=fine,compact,1,0", "KMP_BLOCKTIME": "1"},
+    "spread": {"OMP_PROC_BIND": "spread", "OMP_PLACES": "cores",
+               "KMP_AFFINITY": "granularity=fine,scatter", "KMP_BLOCKTIME": "1"},
+}
+
+
+def best_settings(rows):
+    """Throughput- and latency-optimal row per (model, backend, batch, max_length)."""
+    groups = {}
+    for row in rows:
+        groups.setdefault((row["model"], row["backend"], row["batch"], row["max_length"]), []).append(row)
+    best = []
+    for (model, backend, batch, max_length), group in groups.items():
+        fastest = max(group, key=lambda r: r["tokens/s"])
+        quickest = min(group, key=lambda r: r["p50 ms"])
+        best.append({
+            "model": model,
+            "backend": backend,
+            "batch": batch,
+            "max_length": max_length,
+            "best tokens/s": fastest["tokens/s"],
+            "throughput setting": f"{fastest['threads']}t/{fastest['interop']}i/{fastest['affinity']}",
+            "best p50 ms": quickest["p50 ms"],
+            "latency setting": f"{quickest['threads']}t/{quickest['interop']}i/{quickest['affinity']}",
+        })
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Thread count and affinity sweep for offline runs",
+                                     formatter_class=argparse.RawDescriptionHelpFormatter, epilog=__doc__)
+    parser.add_argument("--models", type=str, nargs="+", required=True, help="Model paths")
+    parser.add_argument("--batches", type=int, nargs="+", default=[1, 8, 32], help="Batch sizes")
+    parser.add_argument("--max_lengths", type=int, nargs="+", default=[512], help="Maximum token lengths")
+    parser.add_argument("--threads", type=int, nargs="+", default=[4, 8, 16, 32], help="Intra-op thread counts")
+    parser.add_argument("--interop_threads", type=int, nargs="+", default=[1],
+                        help="Inter-op thread counts (default: 1)")
+    parser.add_argument("--affinity", type=str, nargs="+", default=["none", "close", "spread"],
+                        choices=list(AFFINITY), help="OpenMP affinity settings")
+    parser.add_argument("--cores", type=str, default=None, help="Restrict to these CPUs, e.g. 56-87 (default: all)")
+    parser.add_argument("--output_dir", type=str, default=f"thread_sweep_{time.strftime('%Y%m%d_%H%M%S')}",
+                        help="Directory for per-run logs and results")
+    parser.add_argument("bench_args", nargs=argparse.REMAINDER,
+                        help="Arguments after -- are passed to benchmark_embedding_bge_offline.py")
+    args = parser.parse_args()
+
+    bench_args = args.bench_args[1:] if args.bench_args[:1] == ["--"] else args.bench_args
+    nodes = numa_nodes(parse_cpulist(args.cores) if args.cores else None)
+    os.makedirs(args.output_dir, exist_ok=True)
+
+    rows = []
+    for model in args.models:
+        for batch in args.batches:
+            for max_length in args.max_lengths:
+                for threads in args.threads:
+                    groups = plan_core_groups(nodes, 1, threads)
+                    if groups is None:
+                        print(f"Skipping {threads} threads: not enough physical cores")
+                        continue
+                    for interop in args.interop_threads:
+                        for affinity in args.affinity:
+                            name = (f"{os.path.basename(model.rstrip('/'))}_b{batch}_l{max_length}"
+                                    f"_t{threads}_i{interop}_{affinity}")
+                            print(f"\nRunning {name} on cpus {format_cpulist(groups[0][1])}")
+                            run_args = [*bench_args, "--model", model, "--batch", str(batch),
+                                        "--max_length", str(max_length), "--threads", str(threads),
+                                        "--interop_threads", str(interop)]
+                            for r in run_instances(groups, threads, run_args, args.output_dir,
+                                                   env=AFFINITY[affinity], name=name):
+                                rows.append({
+                                    "model": os.path.basename(model.rstrip("/")),
+                                    "backend": r["backend"],
+                                    "batch": batch,
+                                    "max_length": max_length,
+                                    "threads": threads,
+                                    "interop": interop,
+                                    "affinity": affinity,
+                                    # first-at-shape compile batches would favour settings that hit fewer shapes
+                                    "texts/s": r["steady_texts_per_sec"],
+                                    "tokens/s": r["steady_tokens_per_sec"],
+                                    **{f"{k} ms": v * 1000 for k, v in r["batch_latency"].items()},
+                                })
+                            print(f"  {rows[-1]['tokens/s']:.2f} tokens/sec | p50 {rows[-1]['p50 ms']:.2f}ms")
+
+    if rows:
+        print("\nThread sweep results:")
+        print_table(rows)
+        best = best_settings(rows)
+        print("\nOptimal settings (threads t / inter-op i / affinity):")
+        print_table(best)
+        with open(os.path.join(args.output_dir, "summary.json"), "w", encoding="utf8") as f:
+            json.dump({"runs": rows, "best": best}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
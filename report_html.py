@@ -0,0 +1,182 @@
+"""
+Self-contained HTML reports with inline SVG charts, no JavaScript or external assets.
+
+Used by the analysis commands (scaling_report.py, latency_heatmap.py ...) to write a single file
+that opens in any browser.
+"""
+
+import html
+import math
+
+COLORS = ["#1f77b4", "#ff7f0e", "#2ca02c", "#d62728", "#9467bd", "#8c564b", "#e377c2", "#7f7f7f"]
+
+STYLE = """
+body { font-family: sans-serif; margin: 24px; color: #222; }
+h1 { font-size: 22px; } h2 { font-size: 18px; margin-top: 32px; border-bottom: 1px solid #ccc; }
+table { border-collapse: collapse; font-size: 13px; margin: 8px 0 16px; }
+th, td { border: 1px solid #ddd; padding: 3px 8px; text-align: right; }
+th { background: #f3f3f3; } td:first-child, th:first-child { text-align: left; }
+tr.flag td { background: #fde2e1; }
+.note { color: #555; font-size: 13px; }
+svg { margin: 4px 16px 4px 0; }
+svg text { font-family: sans-serif; }
+"""
+
+
+def _fmt(value):
+    if isinstance(value, float):
+        if math.isnan(value):
+            return "-"
+        return f"{value:.3g}" if abs(value) < 1 else f"{value:,.2f}"
+    return "-" if value is None else str(value)
+
+
+def nice_ticks(low, high, count=5):
+    """Round tick values covering [low, high]."""
+    if high <= low:
+        high = low + 1
+    step = 10 ** math.floor(math.log10((high - low) / count))
+    for factor in (1, 2, 5, 10):
+        if (high - low) / (step * factor) <= count:
+            step *= factor
+            break
+    start = math.floor(low / step) * step
+    return [start + i * step for i in range(int(math.ceil((high - start) / step)) + 1)]
+
+
+def line_chart(series, title, x_label, y_label, log_x=False, markers=(), spans=(), width=560, height=320):
+    """
+    SVG line chart.
+
+    series is a list of (name, [(x, y), ...], dashed); markers a list of
+    (x, label) drawn as vertical lines, spans a list of (x0, x1) ranges
+    shaded in red. With log_x the x axis is log2 and ticks are the x values
+    present (concurrency levels).
+    """
+    left, right, top, bottom = 64, 16, 28, 44
+    points = [(x, y) for _, values, _ in series for x, y in values if y is not None]
+    if not points:
+        return ""
+    xs = sorted({x for x, _ in points})
+    fx = (lambda v: math.log2(v)) if log_x else (lambda v: v)
+    x_low, x_high = fx(xs[0]), fx(xs[-1])
+    if x_high == x_low:
+        x_high = x_low + 1
+    y_ticks = nice_ticks(0.0, max(y for _, y in points) * 1.05 or 1.0)
+    y_high = y_ticks[-1]
+
+    def px(x):
+        return left + (fx(x) - x_low) / (x_high - x_low) * (width - left - right)
+
+    def py(y):
+        return height - bottom - y / y_high * (height - top - bottom)
+
+    out = [f'<svg xmlns="http://www.w3.org/2000/svg" width="{width}" height="{height}" font-size="11">',
+           f'<text x="{width / 2}" y="16" text-anchor="middle" font-size="13">{html.escape(title)}</text>']
+    for tick in y_ticks:
+        out.append(f'<line x1="{left}" x2="{width - right}" y1="{py(tick):.1f}" y2="{py(tick):.1f}" stroke="#eee"/>')
+        out.append(f'<text x="{left - 4}" y="{py(tick) + 4:.1f}" text-anchor="end">{_fmt(float(tick))}</text>')
+    x_ticks = xs if log_x else nice_ticks(xs[0], xs[-1])
+    for tick in x_ticks:
+        if xs[0] <= tick <= xs[-1]:
+            out.append(f'<text x="{px(tick):.1f}" y="{height - bottom + 16}" text-anchor="middle">'
+                       f'{_fmt(tick)}</text>')
+    out.append(f'<line x1="{left}" x2="{width - right}" y1="{height - bottom}" y2="{height - bottom}" stroke="#888"/>')
+    out.append(f'<line x1="{left}" x2="{left}" y1="{top}" y2="{height - bottom}" stroke="#888"/>')
+    out.append(f'<text x="{(left + width - right) / 2}" y="{height - 8}" text-anchor="middle">'
+               f'{html.escape(x_label)}</text>')
+    out.append(f'<text x="14" y="{(top + height - bottom) / 2}" text-anchor="middle" '
+               f'transform="rotate(-90 14 {(top + height - bottom) / 2})">{html.escape(y_label)}</text>')
+    for x0, x1 in spans:
+        out.append(f'<rect x="{px(x0):.1f}" y="{top}" width="{max(px(x1) - px(x0), 1):.1f}" '
+                   f'height="{height - top - bottom}" fill="#d62728" fill-opacity="0.15"/>')
+    for x, label in markers:
+        out.append(f'<line x1="{px(x):.1f}" x2="{px(x):.1f}" y1="{top}" y2="{height - bottom}" '
+                   f'stroke="#d62728" stroke-dasharray="4 3"/>')
+        out.append(f'<text x="{px(x) + 4:.1f}" y="{top + 10}" fill="#d62728">{html.escape(label)}</text>')
+    for i, (name, values, dashed) in enumerate(series):
+        color = COLORS[i % len(COLORS)]
+        values = [(x, y) for x, y in values if y is not None]
+        path = " ".join(f"{px(x):.1f},{py(y):.1f}" for x, y in values)
+        dash = ' stroke-dasharray="5 4"' if dashed else ""
+        out.append(f'<polyline points="{path}" fill="none" stroke="{color}" stroke-width="2"{dash}/>')
+        for x, y in values:
+            out.append(f'<circle cx="{px(x):.1f}" cy="{py(y):.1f}" r="3" fill="{color}">'
+                       f'<title>{html.escape(name)}: {_fmt(x)}, {_fmt(y)}</title></circle>')
+        out.append(f'<text x="{width - right - 4}" y="{top + 14 * (i + 1)}" text-anchor="end" fill="{color}">'
+                   f'{html.escape(name)}</text>')
+    out.append("</svg>")
+    return "\n".join(out)
+
+
+def _heat_color(level):
+    """White to dark blue for level in [0, 1]."""
+    low, high = (247, 251, 255), (8, 48, 107)
+    return "#" + "".join(f"{round(a + (b - a) * level):02x}" for a, b in zip(low, high))
+
+
+def heatmap(counts, x_edges, y_edges, title, x_label, y_label, spans=(), width=900, height=320):
+    """
+    SVG 2-D histogram, counts[i][j] for x bin i and y bin j.
+
+    Colour is log-scaled count, empty cells are left blank. Bins are drawn
+    at equal size, so log-spaced y_edges give a log y axis. spans are
+    (x0, x1) ranges outlined in red.
+    """
+    left, right, top, bottom = 64, 16, 28, 44
+    nx, ny = len(x_edges) - 1, len(y_edges) - 1
+    cell_w, cell_h = (width - left - right) / nx, (height - top - bottom) / ny
+    peak = max((max(column) for column in counts), default=0)
+    if not peak:
+        return ""
+    scale = math.log1p(peak)
+
+    def px(x):
+        return left + (x - x_edges[0]) / (x_edges[-1] - x_edges[0]) * (width - left - right)
+
+    out = [f'<svg xmlns="http://www.w3.org/2000/svg" width="{width}" height="{height}" font-size="11">',
+           f'<text x="{width / 2}" y="16" text-anchor="middle" font-size="13">{html.escape(title)}</text>']
+    for i, column in enumerate(counts):
+        for j, count in enumerate(column):
+            if count:
+                out.append(f'<rect x="{left + i * cell_w:.1f}" y="{height - bottom - (j + 1) * cell_h:.1f}" '
+                           f'width="{cell_w + 0.3:.1f}" height="{cell_h + 0.3:.1f}" '
+                           f'fill="{_heat_color(0.15 + 0.85 * math.log1p(count) / scale)}">'
+                           f'<title>{_fmt(x_edges[i])}, {_fmt(y_edges[j])}-{_fmt(y_edges[j + 1])}: '
+                           f'{int(count)}</title></rect>')
+    for k in range(7):
+        j = round(k * ny / 6)
+        y = height - bottom - j * cell_h
+        out.append(f'<text x="{left - 4}" y="{y + 4:.1f}" text-anchor="end">{_fmt(float(y_edges[j]))}</text>')
+        i = round(k * nx / 6)
+        out.append(f'<text x="{left + i * cell_w:.1f}" y="{height - bottom + 16}" text-anchor="middle">'
+                   f'{_fmt(float(x_edges[i]))}</text>')
+    for x0, x1 in spans:
+        out.append(f'<rect x="{px(x0):.1f}" y="{top}" width="{max(px(x1) - px(x0), 1):.1f}" '
+                   f'height="{height - top - bottom}" fill="none" stroke="#d62728" stroke-width="1.5"/>')
+    out.append(f'<text x="{(left + width - right) / 2}" y="{height - 8}" text-anchor="middle">'
+               f'{html.escape(x_label)}</text>')
+    out.append(f'<text x="14" y="{(top + height - bottom) / 2}" text-anchor="middle" '
+               f'transform="rotate(-90 14 {(top + height - bottom) / 2})">{html.escape(y_label)}</text>')
+    out.append("</svg>")
+    return "\n".join(out)
+
+
+def table(rows, columns=None, flag_key="flag"):
+    """HTML table of a list of dicts; rows with a truthy flag_key value are highlighted."""
+    if not rows:
+        return ""
+    columns = columns or list(rows[0].keys())
+    out = ["<table><tr>" + "".join(f"<th>{html.escape(str(c))}</th>" for c in columns) + "</tr>"]
+    for row in rows:
+        css = ' class="flag"' if row.get(flag_key) else ""
+        out.append(f"<tr{css}>" + "".join(f"<td>{html.escape(_fmt(row.get(c)))}</td>" for c in columns) + "</tr>")
+    out.append("</table>")
+    return "\n".join(out)
+
+
+def page(title, sections):
+    """A complete HTML document; sections are HTML fragments."""
+    return (f'<!DOCTYPE html>\n<html><head><meta charset="utf-8"><title>{html.escape(title)}</title>'
+            f"<style>{STYLE}</style></head><body>\n<h1>{html.escape(title)}</h1>\n"
+            + "\n".join(sections) + "\n</body></html>\n")
@@ -7,8 +7,13 @@ import time
 import requests
 import numpy
 import os
+import sys
 os.environ.pop("http_proxy", None)
 
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from dataset_mmap import load_texts
+from results_db import DEFAULT_DB, histogram, make_record, parse_tags, save_run
+
 
 with open("qa_pairs.json","r", encoding='utf8') as f:
     raw_dataset = json.load(f)
@@ -114,7 +119,8 @@ def send_concurrency_requests_zh(task, request_url, num_queries, num_chunk, conc
 
     print("=======================")
     print(f"Total Concurrency: {concurrency}")
-    print(f"Total Requests: {len(stock_queries)}")
+    # 第 i 个 worker 发送 num_queries - i 个请求, 按实际响应数统计
+    print(f"Total Requests: {len(responses)}")
     print(f"Total Test time: {test_end_time - test_start_time}")
 
     response_times = [r["total_time"] for r in responses]
@@ -146,8 +152,24 @@ def send_concurrency_requests_zh(task, request_url, num_queries, num_chunk, conc
     req_num = len(response_times) - err_total
     qps = req_num/req_total
     print("QPS is ", qps)
-
-    return avg_total, p50_total, p90_total, p99_total
+    # 吞吐量: 完成的请求数 / 墙钟时间 (上面的 QPS 约等于 1/平均延迟)
+    throughput = len(responses) / (test_end_time - test_start_time)
+    print("Throughput is ", throughput, "req/s")
+
+    summary = {
+        "total_concurrency": concurrency,
+        "total_requests": len(responses),
+        "total_test_time": test_end_time - test_start_time,
+        "avg_total_latency": float(avg_total),
+        "p50_total_latency": float(p50_total),
+        "p90_total_latency": float(p90_total),
+        "p99_total_latency": float(p99_total),
+        "total_error_requests": int(err_total),
+        "query_per_s": float(qps),
+        "requests_per_sec": float(throughput),
+    }
+    latencies = [r["total_time"] for r in responses if r["status"] == 0]
+    return summary, latencies
 
 def parse_args():
     """解析命令行参数"""
@@ -196,17 +218,35 @@ def parse_args():
     config.add_argument(
         "--concurrency",
         type=int,
-        default=1,
+        nargs="+",
+        default=[1],
         choices=[1, 2, 4, 8, 16, 32, 64],
-        help="并发连接数\n"
+        help="并发连接数，可指定多个并依次运行\n"
+             "示例: --concurrency 1 4 16"
     )
     config.add_argument(
         "--dataset",
         type=str,
         default="token_len_500.json",
-        help="data set file\n"
+        help="data set file (json or .mmap dataset directory)\n"
     )
 
+    # 结果记录
+    record = parser.add_argument_group('结果记录')
+    record.add_argument(
+        "--tag",
+        type=str,
+        action="append",
+        default=[],
+        help="运行标签 key=value，写入运行记录\n"
+             "示例: --tag hardware=xeon --tag model=bge-reranker-base (也可用环境变量 BENCH_TAGS)"
+    )
+    record.add_argument(
+        "--results-db",
+        type=str,
+        default=DEFAULT_DB,
+        help="SQLite 结果数据库，留空则只写 .run.json\n"
+    )
 
     args = parser.parse_args()
 
@@ -222,8 +262,14 @@ def parse_args():
 # python concurrent_bench.py --task tei_rerank --url http://192.168.123.103:18080/rerank --num-queries 1
 if __name__ == "__main__":
     args = parse_args()
-    with open(args.dataset,"r", encoding='utf8') as f:
-        rerank_chunks = json.load(f)
+    rerank_chunks = load_texts(args.dataset)
 
+    # 数据集只加载一次，各并发级别依次运行
+    for concurrency in args.concurrency:
+        summary, latencies = send_concurrency_requests_zh(args.task, args.url, args.num_queries, args.num_chunk,
+                                                          concurrency, rerank_chunks)
 
-    send_concurrency_requests_zh(args.task, args.url, args.num_queries, args.num_chunk, args.concurrency, rerank_chunks)
+        config = {"task": args.task, "url": args.url, "num_queries": args.num_queries, "num_chunk": args.num_chunk,
+                  "concurrency": concurrency, "dataset": args.dataset}
+        run = make_record("concurrent_bench", config, summary, {"total": histogram(latencies)}, parse_tags(args.tag))
+        save_run(run, args.results_db, f"concurrent_{time.strftime('%m%d-%H%M%S')}_c-{concurrency}.run.json")
@@ -1,8 +1,13 @@
 import argparse
 import json
+import os
+import sys
 from transformers import AutoTokenizer
 from typing import List
 
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'data_set_split'))
+from tokenize_split import split_text_into_verified_chunks
+
 def split_text_into_chunks(text: str, chunk_size: int, tokenizer) -> List[str]:
     """使用LLM tokenizer将文本按token数分块"""
     tokens = tokenizer.tokenize(text)
@@ -24,6 +29,10 @@ def main():
     parser.add_argument('-o', '--output', type=str, default='output.json', help='输出JSON文件路径')
     parser.add_argument('-m', '--model', type=str, default='bert-base-chinese',
                        help='HuggingFace模型名称(默认: bert-base-chinese)')
+    parser.add_argument('--verify', action='store_true',
+                       help='校验每个块重新编码后的token数等于-n（用tokenizer.decode还原文本，不删除空格）')
+    parser.add_argument('--tolerance', type=int, default=0, help='--verify 模式允许的token数不足量')
+    parser.add_argument('--max_adjust', type=int, default=8, help='--verify 模式每个块边界的最多调整次数')
 
     args = parser.parse_args()
 
@@ -46,7 +55,16 @@ def main():
         return
 
     # 分块处理
-    chunks = split_text_into_chunks(text, args.num_tokens, tokenizer)
+    if args.verify:
+        verified = split_text_into_verified_chunks(text, tokenizer, args.num_tokens, args.tolerance,
+                                                   args.max_adjust)
+        # 保留每个块校验后的token数和服务端token数（含特殊token），concurrent_bench.py 读取其中的 text
+        chunks = [{key: chunk[key] for key in ('text', 'tokens', 'server_tokens', 'verified')}
+                  for chunk in verified]
+        off_target = sum(1 for chunk in verified if not chunk['verified'])
+        print(f"校验后超出容差的块: {off_target}")
+    else:
+        chunks = split_text_into_chunks(text, args.num_tokens, tokenizer)
 
     # 保存为JSON
     try:
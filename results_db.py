@@ -0,0 +1,259 @@
+#!/usr/bin/env python3
+"""
+Machine-readable run records and a local SQLite results database.
+
+The load generators (stress_benchmark.py, rerank_bench/concurrent_bench.py)
+describe every run as a record:
+
+    {"run_id": ..., "tool": ..., "created": <unix time>,
+     "config": {...command line, "tags": {...}},
+     "environment": {"hostname": ..., ...},
+     "summary": {...metrics, full precision},
+     "histograms": {"<metric>": {"le": [upper bounds], "counts": [per bucket, last one is overflow]}}}
+
+The record is written next to the run's output as <name>.run.json and inserted
+into the results database. Records from other machines are added later with
+
+    python results_db.py ingest run_dir/*.run.json --db bench_results.db
+
+which skips run ids that are already stored, so ingestion is incremental.
+Tags (hardware=hpu model=bge-m3 ...) come from --tag options or the BENCH_TAGS
+environment variable and identify runs in queries.
+"""
+
+import argparse
+import bisect
+import glob
+import json
+import logging
+import os
+import platform
+import socket
+import sqlite3
+import time
+import uuid
+
+DEFAULT_DB = os.environ.get("EMBED_BENCH_RESULTS_DB", "bench_results.db")
+
+# latency bucket upper bounds in seconds, 1ms to ~131s at 4 buckets per doubling
+LATENCY_BUCKETS = [round(0.001 * 2 ** (i / 4), 6) for i in range(69)]
+
+# environment variables that change results, recorded with every run
+ENV_PREFIXES = ("MAX_", "OMP_", "KMP_", "HABANA_", "PT_HPU", "TEI_")
+ENV_NAMES = ("DATA_PATH", "EMBEDDING_MODEL_ID", "RERANK_MODEL_ID", "H_model", "warmup_length", "BENCH_TAGS")
+
+# summary keys behind the tool independent metrics of run_metrics, latencies in seconds; qps is completed
+# requests per wall-clock second (concurrent_bench's query_per_s is successful requests / summed latency)
+METRIC_KEYS = {
+    "stress_benchmark": {"qps": "requests_per_sec", "mean": "overall_avg", "p50": "overall_median",
+                         "p90": "overall_p90", "p95": "overall_p95", "p99": "overall_p99"},
+    "concurrent_bench": {"qps": "requests_per_sec", "mean": "avg_total_latency", "p50": "p50_total_latency",
+                         "p90": "p90_total_latency", "p99": "p99_total_latency"},
+}
+METRICS = ["qps", "mean", "p50", "p90", "p95", "p99"]
+# histogram of each tool's per-request latency
+LATENCY_HISTOGRAM = {"stress_benchmark": "overall", "concurrent_bench": "total"}
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    run_id TEXT PRIMARY KEY,
+    tool TEXT NOT NULL,
+    created REAL NOT NULL,
+    hostname TEXT,
+    model TEXT,
+    dataset TEXT,
+    concurrency INTEGER,
+    config TEXT,
+    environment TEXT,
+    summary TEXT
+);
+CREATE INDEX IF NOT EXISTS runs_lookup ON runs (tool, model, dataset, concurrency);
+CREATE TABLE IF NOT EXISTS histograms (
+    run_id TEXT NOT NULL REFERENCES runs (run_id),
+    metric TEXT NOT NULL,
+    le REAL NOT NULL,
+    count INTEGER NOT NULL,
+    PRIMARY KEY (run_id, metric, le)
+);
+"""
+
+
+def histogram(values, buckets=LATENCY_BUCKETS):
+    """Count values per bucket; counts has one more entry than buckets, for values above the last bound."""
+    counts = [0] * (len(buckets) + 1)
+    for v in values:
+        if v is not None:
+            counts[bisect.bisect_left(buckets, v)] += 1
+    return {"le": list(buckets), "counts": counts}
+
+
+def parse_tags(items=None):
+    """Merge BENCH_TAGS ("k=v k=v") with --tag k=v items, the command line wins."""
+    tags = {}
+    for item in os.environ.get("BENCH_TAGS", "").split() + list(items or []):
+        key, sep, value = item.partition("=")
+        if not sep:
+            raise ValueError(f"tag '{item}' is not key=value")
+        tags[key.strip()] = value.strip()
+    return tags
+
+
+def environment_info():
+    env = {k: v for k, v in os.environ.items() if k.startswith(ENV_PREFIXES) or k in ENV_NAMES}
+    return {
+        "hostname": socket.gethostname(),
+        "platform": platform.platform(),
+        "python": platform.python_version(),
+        "cpu_count": os.cpu_count(),
+        "env": env,
+    }
+
+
+def make_record(tool, config, summary, histograms=None, tags=None):
+    created = time.time()
+    return {
+        "run_id": f"{tool}-{time.strftime('%Y%m%d-%H%M%S', time.localtime(created))}-{uuid.uuid4().hex[:8]}",
+        "tool": tool,
+        "created": created,
+        "config": {**config, "tags": tags or {}},
+        "environment": environment_info(),
+        "summary": summary,
+        "histograms": histograms or {},
+    }
+
+
+def connect(db_path=DEFAULT_DB):
+    conn = sqlite3.connect(db_path)
+    conn.row_factory = sqlite3.Row
+    conn.executescript(SCHEMA)
+    return conn
+
+
+def _dataset_name(path):
+    return os.path.splitext(os.path.basename(path.rstrip("/")))[0] if path else None
+
+
+def insert_record(conn, record):
+    """Store a record; returns False if its run id is already in the database."""
+    config = record.get("config", {})
+    tags = config.get("tags", {})
+    model = tags.get("model") or config.get("model")
+    with conn:
+        cursor = conn.execute(
+            "INSERT OR IGNORE INTO runs VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            (record["run_id"], record["tool"], record["created"], record.get("environment", {}).get("hostname"),
+             os.path.basename(model.rstrip("/")) if model else None,
+             tags.get("dataset") or _dataset_name(config.get("dataset")),
+             config.get("concurrency"), json.dumps(config, ensure_ascii=False),
+             json.dumps(record.get("environment", {}), ensure_ascii=False),
+             json.dumps(record.get("summary", {}), ensure_ascii=False)))
+        if cursor.rowcount == 0:
+            return False
+        for metric, hist in record.get("histograms", {}).items():
+            bounds = list(hist["le"]) + [float("inf")]
+            conn.executemany("INSERT INTO histograms VALUES (?, ?, ?, ?)",
+                             [(record["run_id"], metric, le, count)
+                              for le, count in zip(bounds, hist["counts"]) if count])
+    return True
+
+
+def save_run(record, db_path=DEFAULT_DB, json_path=None):
+    """Write the record to json_path and the database; a database error is logged, not raised."""
+    if json_path:
+        with open(json_path, "w", encoding="utf8") as f:
+            json.dump(record, f, ensure_ascii=False, indent=2)
+    if db_path:
+        try:
+            conn = connect(db_path)
+            insert_record(conn, record)
+            conn.close()
+        except sqlite3.Error as e:
+            logging.error(f"Failed to store run {record['run_id']} in {db_path}: {e}")
+            return
+    print(f"Run record {record['run_id']} saved" + (f" to {db_path}" if db_path else "")
+          + (f" and {json_path}" if json_path else ""))
+
+
+def ingest(conn, paths):
+    """Insert run record files (or directories of *.run.json); returns (added, skipped)."""
+    added = skipped = 0
+    for path in paths:
+        files = sorted(glob.glob(os.path.join(path, "*.run.json"))) if os.path.isdir(path) else [path]
+        for file in files:
+            with open(file, encoding="utf8") as f:
+                if insert_record(conn, json.load(f)):
+                    added += 1
+                else:
+                    skipped += 1
+    return added, skipped
+
+
+def query_runs(conn, tool=None, where="", params=()):
+    """
+    Runs as dicts with config, environment and summary decoded, oldest first.
+
+    where is an extra SQL condition, e.g. "json_extract(config, '$.tags.hardware') = ?".
+    """
+    sql = "SELECT * FROM runs WHERE 1=1"
+    if tool:
+        sql += " AND tool = ?"
+        params = (tool,) + tuple(params)
+    if where:
+        sql += f" AND ({where})"
+    runs = []
+    for row in conn.execute(sql + " ORDER BY created", params):
+        run = dict(row)
+        for key in ["config", "environment", "summary"]:
+            run[key] = json.loads(run[key]) if run[key] else {}
+        run["tags"] = run["config"].get("tags", {})
+        runs.append(run)
+    return runs
+
+
+def run_metrics(run):
+    """Requests/s and latency percentiles of a run under METRICS names, None where the tool has no such value."""
+    keys = METRIC_KEYS.get(run["tool"], {})
+    return {name: run["summary"].get(keys[name]) if name in keys else None for name in METRICS}
+
+
+def run_histogram(conn, run_id, metric):
+    """[(upper bound, count)] of a stored histogram."""
+    return [(row["le"], row["count"]) for row in conn.execute(
+        "SELECT le, count FROM histograms WHERE run_id = ? AND metric = ? ORDER BY le", (run_id, metric))]
+
+
+def histogram_counts(conn, run_id, metric, buckets=LATENCY_BUCKETS):
+    """Counts of a stored histogram for every bucket of buckets plus overflow, None if there is none."""
+    stored = run_histogram(conn, run_id, metric)
+    if not stored:
+        return None
+    counts = [0] * (len(buckets) + 1)
+    for le, count in stored:
+        counts[bisect.bisect_left(buckets, le)] += count
+    return counts
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark results database")
+    parser.add_argument("--db", type=str, default=DEFAULT_DB, help=f"SQLite database (default: {DEFAULT_DB})")
+    sub = parser.add_subparsers(dest="command", required=True)
+    ingest_parser = sub.add_parser("ingest", help="Add *.run.json records not yet in the database")
+    ingest_parser.add_argument("paths", nargs="+", help="Run record files or directories")
+    list_parser = sub.add_parser("list", help="List stored runs")
+    list_parser.add_argument("--tool", type=str, default=None, help="Only runs of this tool")
+    args = parser.parse_args()
+
+    conn = connect(args.db)
+    if args.command == "ingest":
+        added, skipped = ingest(conn, args.paths)
+        print(f"Added {added} runs, {skipped} already present in {args.db}")
+    elif args.command == "list":
+        for run in query_runs(conn, args.tool):
+            created = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(run["created"]))
+            tags = " ".join(f"{k}={v}" for k, v in run["tags"].items())
+            print(f"{run['run_id']}  {created}  {run['model']}  {run['dataset']}  c={run['concurrency']}  {tags}")
+    conn.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,178 @@
+#!/usr/bin/env python3
+"""
+Throughput scaling and saturation report from the results database.
+
+For every tool x hardware x model x dataset, runs are ordered by concurrency
+(trials at the same concurrency are averaged) and the report gives:
+
+  efficiency       QPS gain over the lowest concurrency divided by the
+                   concurrency gain, 1.0 is linear scaling
+  step efficiency  the same between neighbouring concurrency levels
+  knee             the last concurrency before step efficiency drops below
+                   --knee_threshold, adding users beyond it mostly adds queueing
+  inflation        mean latency relative to the lowest concurrency
+  Little's law     requests in flight L = QPS x mean latency should equal the
+                   concurrency for a closed-loop load generator; L/c below
+                   --little_tolerance means the clients spent time outside
+                   requests (client-side bottleneck), above its inverse
+                   means the latency and QPS figures disagree
+
+The HTML report is a single file with inline SVG charts.
+
+Example:
+    python scaling_report.py --db bench_results.db --hardware hpu -o scaling_report.html
+"""
+
+import argparse
+import os
+
+from report_html import line_chart, page, table
+from results_db import DEFAULT_DB, METRICS, connect, query_runs, run_metrics
+
+
+def group_runs(runs):
+    """{(tool, hardware, model, dataset): {concurrency: [metrics of each trial]}}"""
+    groups = {}
+    for run in runs:
+        if run["concurrency"] is None:
+            continue
+        key = (run["tool"], run["tags"].get("hardware", ""), run["model"] or "", run["dataset"] or "")
+        groups.setdefault(key, {}).setdefault(run["concurrency"], []).append(run_metrics(run))
+    return groups
+
+
+def mean_metrics(trials):
+    values = {}
+    for name in METRICS:
+        present = [t[name] for t in trials if t[name] is not None]
+        values[name] = sum(present) / len(present) if present else None
+    return values
+
+
+def scaling_rows(levels, little_tolerance=0.8):
+    """Scaling table rows from {concurrency: [trial metrics]}, lowest concurrency first."""
+    rows = []
+    base = previous = None
+    for concurrency in sorted(levels):
+        m = mean_metrics(levels[concurrency])
+        if not m["qps"]:
+            continue
+        row = {"concurrency": concurrency, "trials": len(levels[concurrency]), "qps": m["qps"],
+               "efficiency": None, "step efficiency": None, "mean ms": None, "p90 ms": None, "tail ms": None,
+               "inflation": None, "L": None, "L/c": None, "flag": ""}
+        if base is None:
+            base = row
+            row["efficiency"] = 1.0
+        else:
+            row["efficiency"] = (row["qps"] / base["qps"]) / (concurrency / base["concurrency"])
+            row["step efficiency"] = ((row["qps"] / previous["qps"] - 1)
+                                      / (concurrency / previous["concurrency"] - 1))
+        tail = m["p99"] if m["p99"] is not None else m["p95"]
+        for key, value in [("mean ms", m["mean"]), ("p90 ms", m["p90"]), ("tail ms", tail)]:
+            row[key] = value * 1000 if value is not None else None
+        if m["mean"]:
+            row["_mean"] = m["mean"]
+            if base.get("_mean"):
+                row["inflation"] = m["mean"] / base["_mean"]
+            row["L"] = m["qps"] * m["mean"]
+            row["L/c"] = row["L"] / concurrency
+            if row["L/c"] < little_tolerance:
+                row["flag"] = "client-bound"
+            elif row["L/c"] > 1 / little_tolerance:
+                row["flag"] = "inconsistent"
+        rows.append(row)
+        previous = row
+    return rows
+
+
+def find_knee(rows, threshold=0.25):
+    """Concurrency after which step efficiency first falls below threshold, None if it never does."""
+    for previous, row in zip(rows, rows[1:]):
+        if row["step efficiency"] is not None and row["step efficiency"] < threshold:
+            return previous["concurrency"]
+    return None
+
+
+def group_section(key, rows, knee, tail_name):
+    tool, hardware, model, dataset = key
+    title = f"{model} / {dataset}" + (f" on {hardware}" if hardware else "") + f" ({tool})"
+    base = rows[0]
+    ideal = [(r["concurrency"], base["qps"] * r["concurrency"] / base["concurrency"]) for r in rows]
+    markers = [(knee, f"knee c={knee}")] if knee else []
+    qps_chart = line_chart([("measured QPS", [(r["concurrency"], r["qps"]) for r in rows], False),
+                            ("linear scaling", ideal, True)],
+                           "Throughput", "concurrency", "requests/s", log_x=True, markers=markers)
+    latency_chart = line_chart([("mean", [(r["concurrency"], r["mean ms"]) for r in rows], False),
+                                ("p90", [(r["concurrency"], r["p90 ms"]) for r in rows], False),
+                                (tail_name, [(r["concurrency"], r["tail ms"]) for r in rows], False)],
+                               "Latency", "concurrency", "ms", log_x=True, markers=markers)
+    flagged = [r for r in rows if r["flag"]]
+    notes = [f"Knee: concurrency {knee}" if knee else "No knee: throughput still scales at the highest concurrency"]
+    if flagged:
+        notes.append("Little's law check failed at concurrency "
+                     + ", ".join(f"{r['concurrency']} ({r['flag']}, L/c={r['L/c']:.2f})" for r in flagged))
+    shown = [{(f"{tail_name} ms" if k == "tail ms" else k): v for k, v in r.items() if not k.startswith("_")}
+             for r in rows]
+    return (f"<h2>{title}</h2>\n<p class=\"note\">" + "<br>".join(notes) + "</p>\n"
+            + qps_chart + latency_chart + table(shown))
+
+
+def print_group(key, rows, knee):
+    tool, hardware, model, dataset = key
+    print(f"\n=== {model} / {dataset} {hardware} ({tool}) ===")
+    print(f"{'users':>6} {'trials':>6} {'QPS':>10} {'eff':>6} {'step':>6} {'mean ms':>9} {'infl':>6} {'L/c':>6}")
+    for r in rows:
+        fields = [f"{r['concurrency']:>6}", f"{r['trials']:>6}", f"{r['qps']:>10.2f}"]
+        for name, width, spec in [("efficiency", 6, ".2f"), ("step efficiency", 6, ".2f"), ("mean ms", 9, ".2f"),
+                                  ("inflation", 6, ".2f"), ("L/c", 6, ".2f")]:
+            fields.append(f"{r[name]:>{width}{spec}}" if r[name] is not None else "-".rjust(width))
+        print(" ".join(fields) + (f"  {r['flag']}" if r["flag"] else ""))
+    print(f"Knee: {knee if knee else 'not reached'}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Throughput scaling and knee report",
+                                     formatter_class=argparse.RawDescriptionHelpFormatter, epilog=__doc__)
+    parser.add_argument("--db", type=str, default=DEFAULT_DB, help=f"Results database (default: {DEFAULT_DB})")
+    parser.add_argument("--tool", type=str, default=None, choices=["stress_benchmark", "concurrent_bench"],
+                        help="Only runs of this load generator")
+    parser.add_argument("--hardware", type=str, default=None, help="Only runs with this hardware tag")
+    parser.add_argument("--model", type=str, default=None, help="Only runs of this model")
+    parser.add_argument("--knee_threshold", type=float, default=0.25,
+                        help="Step efficiency below which throughput counts as saturated (default: 0.25)")
+    parser.add_argument("--little_tolerance", type=float, default=0.8,
+                        help="Flag levels whose L/c is below this or above its inverse (default: 0.8)")
+    parser.add_argument("-o", "--output", type=str, default="scaling_report.html", help="HTML report file")
+    args = parser.parse_args()
+
+    conditions, params = [], []
+    if args.hardware:
+        conditions.append("json_extract(config, '$.tags.hardware') = ?")
+        params.append(args.hardware)
+    if args.model:
+        conditions.append("model = ?")
+        params.append(args.model)
+    conn = connect(args.db)
+    runs = query_runs(conn, args.tool, " AND ".join(conditions), params)
+    conn.close()
+
+    sections = []
+    for key, levels in sorted(group_runs(runs).items()):
+        rows = scaling_rows(levels, args.little_tolerance)
+        if len(rows) < 2:
+            continue
+        knee = find_knee(rows, args.knee_threshold)
+        print_group(key, rows, knee)
+        sections.append(group_section(key, rows, knee, "p99" if key[0] == "concurrent_bench" else "p95"))
+    if not sections:
+        print("No model/dataset with runs at two or more concurrency levels")
+        return
+    with open(args.output, "w", encoding="utf8") as f:
+        f.write(page("Scaling report", [f'<p class="note">{len(runs)} runs from {os.path.abspath(args.db)}, '
+                                        f"knee threshold {args.knee_threshold}, Little's law tolerance "
+                                        f"{args.little_tolerance}</p>"] + sections))
+    print(f"\nReport saved to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,217 @@
+#!/usr/bin/env python3
+"""
+Stand-in embedding/rerank server and load generator for testing sweep.py without a model.
+
+  serve     answers like TEI: GET /health, POST /embed and /rerank, with a
+            start-up delay (503 until it passes), lognormal latency and an
+            optional error rate
+  load      minimal load generator: workers send /embed or /rerank requests
+            for -d seconds per concurrency level and write stress_benchmark
+            style run records (requests_per_sec, overall_* latencies, an
+            "overall" histogram) to the results database, so trials.py and
+            sweep.py aggregate them like real runs
+  selftest  starts a server on a free port and runs sweep.py with
+            sweeps/standin.json against it (readiness polling, every cell,
+            state file) in a temporary directory; exits 1 if a cell is not done
+
+Example:
+    python standin_server.py serve --port 18080 --startup 5 &
+    python sweep.py sweeps/standin.json
+    python standin_server.py selftest
+"""
+
+import argparse
+import json
+import logging
+import os
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import requests
+
+from results_db import DEFAULT_DB, histogram, make_record, parse_tags, save_run
+
+PROBE_BODIES = {
+    "embed": ("/embed", {"inputs": "What is the total revenue of Nike in 2023?"}),
+    "rerank": ("/rerank", {"query": "What is the total revenue of Nike in 2023?",
+                           "texts": ["Nike revenue was $51.2 billion.", "Adidas is based in Germany."]}),
+}
+
+
+def make_handler(startup, latency, sigma, error_rate, dim):
+    started = time.time()
+
+    class Handler(BaseHTTPRequestHandler):
+        def log_message(self, *args):
+            pass
+
+        def _send(self, code, body):
+            data = json.dumps(body).encode("utf8")
+            self.send_response(code)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def do_GET(self):
+            if self.path != "/health":
+                return self._send(404, {"error": "not found"})
+            ready = time.time() - started >= startup
+            self._send(200 if ready else 503, {} if ready else {"error": "loading"})
+
+        def do_POST(self):
+            body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+            if time.time() - started < startup:
+                return self._send(503, {"error": "loading"})
+            if self.path not in ("/embed", "/rerank"):
+                return self._send(404, {"error": "not found"})
+            time.sleep(random.lognormvariate(0, sigma) * latency)
+            if random.random() < error_rate:
+                return self._send(500, {"error": "stand-in failure"})
+            if self.path == "/embed":
+                inputs = body.get("inputs", "")
+                count = len(inputs) if isinstance(inputs, list) else 1
+                return self._send(200, [[0.0] * dim for _ in range(count)])
+            self._send(200, [{"index": i, "score": 1.0 / (i + 1)} for i in range(len(body.get("texts", [])))])
+
+    return Handler
+
+
+def start_server(port, startup=0.0, latency=0.01, sigma=0.3, error_rate=0.0, dim=8):
+    """A stand-in server serving on a background thread; call shutdown() to stop it."""
+    server = ThreadingHTTPServer(("127.0.0.1", port), make_handler(startup, latency, sigma, error_rate, dim))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def run_level(server, probe, concurrency, duration):
+    """(latencies of successful requests, requests sent, seconds) of one level."""
+    path, body = PROBE_BODIES[probe]
+    latencies, counts = [], [0] * concurrency
+    lock = threading.Lock()
+    stop = time.time() + duration
+
+    def worker(wid):
+        session = requests.Session()
+        while time.time() < stop:
+            start = time.time()
+            try:
+                ok = session.post(f"http://{server}{path}", json=body, timeout=10).status_code == 200
+            except requests.RequestException:
+                ok = False
+            counts[wid] += 1
+            if ok:
+                with lock:
+                    latencies.append(time.time() - start)
+
+    start = time.time()
+    threads = [threading.Thread(target=worker, args=(i,)) for i in range(concurrency)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return latencies, sum(counts), time.time() - start
+
+
+def load(args):
+    for concurrency in args.c:
+        latencies, total, elapsed = run_level(args.s, args.probe, concurrency, args.d)
+        ordered = sorted(latencies)
+        n = len(ordered)
+        summary = {
+            "total_requests": total,
+            "success_rate": n / total if total else 0,
+            "error_rate": (total - n) / total if total else 0,
+            "requests_per_sec": total / elapsed if elapsed > 0 else 0,
+            "total_duration": elapsed,
+        }
+        if n:
+            summary.update({"overall_avg": sum(ordered) / n, "overall_median": ordered[n // 2],
+                            "overall_p90": ordered[int(0.90 * n)], "overall_p95": ordered[int(0.95 * n)],
+                            "overall_p99": ordered[int(0.99 * n)]})
+        print(f"c={concurrency}: {total} requests, {summary['requests_per_sec']:.1f} req/s, {total - n} errors")
+        # same record layout as stress_benchmark.py, so trials.py/sweep.py read it unchanged
+        config = {"task": f"standin_{args.probe}", "server": args.s, "dataset": args.dataset,
+                  "concurrency": concurrency, "duration": args.d}
+        record = make_record("stress_benchmark", config, summary, {"overall": histogram(latencies)},
+                             parse_tags(args.tag))
+        save_run(record, args.results_db)
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def selftest(args):
+    root = os.path.dirname(os.path.abspath(__file__))
+    with open(os.path.join(root, "sweeps", "standin.json"), encoding="utf8") as f:
+        config = json.load(f)
+    port = free_port()
+    server = start_server(port, startup=args.startup)
+    config["server"] = f"127.0.0.1:{port}"
+    config["load_generator"] = [sys.executable if arg == "python3" else arg for arg in config["load_generator"]]
+    config["workdir"] = root
+    with tempfile.TemporaryDirectory() as tmp:
+        config_path = os.path.join(tmp, "standin.json")
+        state_path = os.path.join(tmp, "standin.state.json")
+        with open(config_path, "w", encoding="utf8") as f:
+            json.dump(config, f)
+        code = subprocess.run([sys.executable, os.path.join(root, "sweep.py"), config_path,
+                               "--db", os.path.join(tmp, "results.db"), "--state", state_path]).returncode
+        with open(state_path, encoding="utf8") as f:
+            cells = json.load(f)["cells"]
+    server.shutdown()
+    bad = {name: cell["status"] for name, cell in cells.items() if cell["status"] not in ("done", "noisy")}
+    if code or bad or not cells:
+        print(f"Self-test failed: sweep exit status {code}, cells {bad or 'none'}")
+        sys.exit(1)
+    print(f"Self-test passed: {len(cells)} cells")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Stand-in TEI server and load generator for sweep.py tests",
+                                     formatter_class=argparse.RawDescriptionHelpFormatter, epilog=__doc__)
+    sub = parser.add_subparsers(dest="command", required=True)
+    serve_parser = sub.add_parser("serve", help="Run the stand-in server")
+    serve_parser.add_argument("--port", type=int, default=18080, help="Port on 127.0.0.1 (default: 18080)")
+    serve_parser.add_argument("--startup", type=float, default=5.0, help="Seconds of 503 before ready (default: 5)")
+    serve_parser.add_argument("--latency_ms", type=float, default=10.0, help="Median latency (default: 10ms)")
+    serve_parser.add_argument("--sigma", type=float, default=0.3, help="Lognormal latency spread (default: 0.3)")
+    serve_parser.add_argument("--error_rate", type=float, default=0.0, help="Fraction of requests answered 500")
+    load_parser = sub.add_parser("load", help="Run load levels against a server and save run records")
+    load_parser.add_argument("-s", type=str, default="127.0.0.1:18080", help="Server host:port")
+    load_parser.add_argument("-c", type=int, nargs="+", default=[1], help="Concurrency levels, run in order")
+    load_parser.add_argument("-d", type=float, default=5.0, help="Seconds per level (default: 5)")
+    load_parser.add_argument("--probe", type=str, default="embed", choices=sorted(PROBE_BODIES))
+    load_parser.add_argument("--dataset", type=str, default="standin.json", help="Dataset name for the record")
+    load_parser.add_argument("--tag", type=str, action="append", default=[], help="Run tag key=value")
+    load_parser.add_argument("--results_db", type=str, default=DEFAULT_DB, help="Results database")
+    test_parser = sub.add_parser("selftest", help="Run sweeps/standin.json against a stand-in server")
+    test_parser.add_argument("--startup", type=float, default=2.0, help="Server start-up delay (default: 2)")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+    if args.command == "serve":
+        server = start_server(args.port, args.startup, args.latency_ms / 1000, args.sigma, args.error_rate)
+        print(f"Stand-in server on 127.0.0.1:{args.port}, ready in {args.startup:.1f}s")
+        try:
+            while True:
+                time.sleep(3600)
+        except KeyboardInterrupt:
+            server.shutdown()
+    elif args.command == "load":
+        load(args)
+    else:
+        selftest(args)
+
+
+if __name__ == "__main__":
+    main()
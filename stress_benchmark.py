@@ -16,6 +16,9 @@ from queue import Empty, Queue
 import requests
 from transformers import AutoTokenizer
 
+from dataset_mmap import MmapDataset, PretokenizedTokenizer
+from results_db import DEFAULT_DB, histogram, make_record, parse_tags, save_run
+
 
 class QueryPool:
     def __init__(self, file_path=None, file_format="json"):
@@ -32,7 +35,11 @@ class QueryPool:
         
         # Extract text from all chunks
             self.questions = [chunk['text'] for chunk in data.get('chunks', []) if 'text' in chunk]
-        
+
+        elif file_path and file_format == "mmap":
+            # items are PretokenizedText, see PretokenizedTokenizer in main()
+            self.questions = MmapDataset(file_path)
+
         else:
             self.questions = ["What is the total revenue of Nike in 2023?"]
 
@@ -60,13 +67,18 @@ def parse_args():
     parser = argparse.ArgumentParser(description="Load testing tool.")
     parser.add_argument("-f", type=str, help="Question File Location")
     parser.add_argument("-s", type=str, default="localhost:8080", help="Server Address format, -s host:port")
-    parser.add_argument("-c", type=int, default=1, help="Concurrency Number -c 10")
+    parser.add_argument("-c", type=int, nargs="+", default=[1],
+                        help="Concurrency Number -c 10, several levels (-c 1 4 16) run one after another")
     parser.add_argument("-d", type=str, default="5m", help="Execute Duration, when to stop the test, -d 20m")
     parser.add_argument("-u", type=str, default="1s", help="Worker startup delay time, -u 1s")
     parser.add_argument("-t", type=str, default="chatqna", help="Task Type, chatqna/openai/embedding/reranking")
     parser.add_argument("-m", type=str, default="Intel/neural-chat-7b-v3-3", help="Model")
     parser.add_argument("-z", type=int, default=1024, help="LLM max tokens")
-    parser.add_argument("-j", type=str, default="json", help="input Question format: json or text")
+    parser.add_argument("-j", type=str, default="json", help="input Question format: json, text or mmap")
+    parser.add_argument("--tag", type=str, action="append", default=[],
+                        help="Run tag key=value stored in the run record, e.g. --tag hardware=hpu (also BENCH_TAGS)")
+    parser.add_argument("--results_db", type=str, default=DEFAULT_DB,
+                        help="SQLite results database for the run record, empty to skip")
     return parser.parse_args()
 
 
@@ -75,7 +87,7 @@ def duration_to_seconds(duration_str):
     return int(duration_str[:-1]) * units[duration_str[-1]]
 
 
-def collect_results(stop_event, result_queue, output_file):
+def collect_results(stop_event, result_queue, output_file, summary=None):
     metrics = {
         'first_chunks': [],       # 存储所有 first_chunk 值
         'question_lens': [],      # 存储所有 question_len 值
@@ -125,6 +137,7 @@ def collect_results(stop_event, result_queue, output_file):
             f"{name}_avg": sum(sorted_data) / n,
             f"{name}_p90": sorted_data[int(0.90 * n)] if n > 0 else None,
             f"{name}_p95": sorted_data[int(0.95 * n)] if n > 0 else None,
+            f"{name}_p99": sorted_data[int(0.99 * n)] if n > 0 else None,
             f"{name}_median": sorted_data[n // 2] if n > 0 else None
         }
 
@@ -163,13 +176,22 @@ def collect_results(stop_event, result_queue, output_file):
     print(f"平均值: {final_stats['first_chunk_avg']:.4f}s")
     print(f"中位数: {final_stats['first_chunk_median']:.4f}s")
     print(f"P90: {final_stats['first_chunk_p90']:.4f}s")
-    print(f"P95: {final_stats['first_chunk_p95']:.4f}s\n")
+    print(f"P95: {final_stats['first_chunk_p95']:.4f}s")
+    print(f"P99: {final_stats['first_chunk_p99']:.4f}s\n")
 
     print("===== Question Length 统计 =====")
     print(f"最小值: {final_stats['question_len_min']}")
     print(f"最大值: {final_stats['question_len_max']}")
     print(f"平均值: {final_stats['question_len_avg']:.2f}\n")
 
+    # 运行记录：完整精度的统计结果和延迟直方图
+    if summary is not None:
+        summary["stats"] = final_stats
+        summary["histograms"] = {
+            "first_chunk": histogram(metrics['first_chunks']),
+            "overall": histogram(metrics['overalls']),
+        }
+
     # 可选：返回统计结果供其他模块使用
     return final_stats
 
@@ -1243,24 +1265,17 @@ TASK_EXECUTORS = {
 }
 
 
-def main():
-    args = parse_args()
-
-    tokenizer = AutoTokenizer.from_pretrained(args.m)
-
-    logging.basicConfig(stream=sys.stderr, level=logging.INFO)
+def run_level(args, num_workers, pool, tokenizer, interrupted):
+    """Run one concurrency level for the configured duration and save its run record."""
     stop_event = threading.Event()
-    signal.signal(signal.SIGINT, lambda s, f: stop_event.set())
-
-    pool = QueryPool(args.f, args.j)
-    num_workers = args.c
     duration = duration_to_seconds(args.d)
     delay_unit = duration_to_seconds(args.u)
     output_file = f"./bench_{time.strftime('%m%d-%H%M')}_c-{num_workers}.result.csv"
     result_queue = Queue()
+    summary = {}
 
     with ThreadPoolExecutor(max_workers=num_workers) as executor:
-        collector_thread = threading.Thread(target=collect_results, args=(stop_event, result_queue, output_file))
+        collector_thread = threading.Thread(target=collect_results, args=(stop_event, result_queue, output_file, summary))
         collector_thread.start()
 
         start_time = time.time()
@@ -1273,7 +1288,7 @@ def main():
                 )
             )
 
-        while time.time() - start_time < duration and not stop_event.is_set():
+        while time.time() - start_time < duration and not interrupted.is_set():
             time.sleep(1)
 
         stop_event.set()
@@ -1282,6 +1297,39 @@ def main():
 
         collector_thread.join()
 
+    config = {"task": args.t, "server": args.s, "model": args.m, "dataset": args.f, "format": args.j,
+              "concurrency": num_workers, "duration": args.d, "startup_delay": args.u, "max_tokens": args.z,
+              "result_csv": output_file}
+    if interrupted.is_set():
+        # stopped by SIGINT before the configured duration, kept out of trials and sweeps
+        config["interrupted"] = True
+    record = make_record("stress_benchmark", config, summary.get("stats", {}), summary.get("histograms"),
+                         parse_tags(args.tag))
+    save_run(record, args.results_db, output_file.replace(".result.csv", ".run.json"))
+
+
+def main():
+    args = parse_args()
+
+    tokenizer = AutoTokenizer.from_pretrained(args.m)
+    if args.j == "mmap":
+        # question lengths come from the stored token ids instead of re-tokenizing
+        tokenizer = PretokenizedTokenizer(tokenizer)
+
+    logging.basicConfig(stream=sys.stderr, level=logging.INFO)
+    interrupted = threading.Event()
+    signal.signal(signal.SIGINT, lambda s, f: interrupted.set())
+
+    # the tokenizer and the dataset are loaded once for all levels
+    pool = QueryPool(args.f, args.j)
+    for num_workers in args.c:
+        if interrupted.is_set():
+            break
+        run_level(args, num_workers, pool, tokenizer, interrupted)
+    if interrupted.is_set():
+        logging.error("Interrupted, the last level ran short of its duration")
+        sys.exit(130)
+
 
 if __name__ == "__main__":
     main()
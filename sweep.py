@@ -0,0 +1,422 @@
+#!/usr/bin/env python3
+"""
+Benchmark sweep over a model x dataset x concurrency matrix declared in a JSON file.
+
+Replaces the start/sleep/grep-Ready/stress.sh loops of loop_hpu.sh and
+loop_rerank_hpu.sh. For every model the serving container is recreated with
+docker compose, then /health and a one-text embed or rerank request are
+polled with sub-second backoff, and the load generator starts as soon as
+both answer. Every dataset runs all concurrency levels in one load generator
+process (stress_benchmark.py -c 1 4 ..., concurrent_bench.py --concurrency
+1 4 ...), once per trial; cells whose confidence interval is still wider
+than max_width get more trials (trials.py).
+
+Progress is kept in a state file (<name>.state.json, --state): status,
+trials, statistics and measuring time of every cell, saved after each step.
+Running the same command again after a crash or Ctrl-C resumes at the first
+incomplete cell, counting the trials that already reached the database;
+--rerun failed noisy runs those cells again from scratch and --restart
+starts a new sweep. The ETA is the mean time of the finished cells times the
+cells left, plus the mean server start-up time per model left.
+
+Config keys (see sweeps/*.json):
+  name              sweep name, runs are tagged sweep=<name>-<start time>
+  compose_file      compose file of the server, omit to benchmark a server
+                    that is already running (e.g. a local stand-in)
+  compose_command   default ["docker", "compose"]
+  container         container name, stopped and removed before each start
+  server            host:port of the server
+  probe             "embed" or "rerank", the readiness request
+  env               environment of compose and the load generator; values
+                    may use {model}, {variant} and other env entries
+  tags              run tags, e.g. {"hardware": "hpu"}
+  load_generator    command list; {server}, {dataset}, {model} and env
+                    entries are substituted, "{concurrency}" expands to the levels
+  workdir           directory the load generator runs in, default "."
+  concurrency       levels, e.g. [1, 4, 8, 16, 32, 64]
+  datasets          default dataset files
+  trials, max_trials, max_width, check   see trials.py
+  ready_timeout     seconds to wait for readiness, default 900
+  models            [{"name": ..., "env": {...}, "datasets": [...]}, ...]; an
+                    optional "variant" label (e.g. the pooling mode of
+                    loop_mteb.sh) tells apart entries of the same model: it
+                    becomes part of the cell names (<model>@<variant>/...)
+                    and the tag variant=<label>
+
+Example:
+    python sweep.py sweeps/hpu_embedding.json --models bge-m3
+    python sweep.py sweeps/hpu_embedding.json --models bge-m3@mean
+    python sweep.py sweeps/hpu_embedding.json --rerun failed
+"""
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+
+import requests
+
+from results_db import DEFAULT_DB, connect, query_runs
+from trials import aggregate, format_stats, unstable_metrics
+
+PROBES = {
+    "embed": ("/embed", {"inputs": "ready?"}),
+    "rerank": ("/rerank", {"query": "ready?", "texts": ["ready?"]}),
+}
+
+
+def load_config(path):
+    with open(path, encoding="utf8") as f:
+        config = json.load(f)
+    for key in ["name", "server", "load_generator", "concurrency", "models"]:
+        if key not in config:
+            raise ValueError(f"{path}: missing '{key}'")
+    config.setdefault("compose_command", ["docker", "compose"])
+    config.setdefault("probe", "embed")
+    config.setdefault("workdir", ".")
+    config.setdefault("trials", 1)
+    config.setdefault("max_trials", config["trials"])
+    config.setdefault("max_width", 0.1)
+    config.setdefault("check", ["qps", "p50", "p99"])
+    config.setdefault("ready_timeout", 900)
+    return config
+
+
+def model_label(model):
+    """Name of a model entry in cell names and --models: the model name, with @<variant> if it has one."""
+    return f"{model['name']}@{model['variant']}" if model.get("variant") else model["name"]
+
+
+def model_env(config, model):
+    """Environment of a model's server and load generator: global env, then the model's own."""
+    fields = {"model": model["name"], "variant": model.get("variant", "")}
+    env = {}
+    for key, value in {**config.get("env", {}), **model.get("env", {})}.items():
+        env[key] = str(value).format(**fields, **env)
+    return env
+
+
+def expand_command(template, fields, levels):
+    command = []
+    for arg in template:
+        if arg == "{concurrency}":
+            command += [str(c) for c in levels]
+        else:
+            command.append(arg.format(**fields))
+    return command
+
+
+def start_server(config, env):
+    container = config.get("container")
+    if container:
+        subprocess.run(["docker", "rm", "-f", container], stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    subprocess.run(config["compose_command"] + ["-f", config["compose_file"], "up", "-d"],
+                   env={**os.environ, **env}, check=True)
+
+
+def wait_ready(server, probe="embed", timeout=900, container=None):
+    """
+    Poll /health, then a one-text request, until both answer 200.
+
+    The poll interval starts at 50ms and grows to 500ms. Returns the seconds
+    waited; raises TimeoutError, or RuntimeError if the container exits.
+    """
+    path, body = PROBES[probe]
+    start = time.time()
+    delay = 0.05
+    next_check = start + 10
+    while True:
+        try:
+            if requests.get(f"http://{server}/health", timeout=2).status_code == 200:
+                if requests.post(f"http://{server}{path}", json=body, timeout=30).status_code == 200:
+                    return time.time() - start
+        except requests.RequestException:
+            pass
+        now = time.time()
+        if now - start > timeout:
+            raise TimeoutError(f"{server} not ready after {timeout}s")
+        if container and now > next_check:
+            next_check = now + 10
+            state = subprocess.run(["docker", "inspect", "-f", "{{.State.Running}}", container],
+                                   capture_output=True, text=True).stdout.strip()
+            if state != "true":
+                logs = subprocess.run(["docker", "logs", "--tail", "50", container], capture_output=True, text=True)
+                raise RuntimeError(f"container {container} is not running:\n{logs.stdout}{logs.stderr}")
+        time.sleep(delay)
+        delay = min(delay * 1.5, 0.5)
+
+
+def resource_tags(config):
+    """The serving container's cpuset and HABANA_VISIBLE_DEVICES, for compare_hardware.py."""
+    container = config.get("container")
+    if not container or not config.get("compose_file"):
+        return {}
+    tags = {}
+    cpuset = subprocess.run(["docker", "inspect", "-f", "{{.HostConfig.CpusetCpus}}", container],
+                            capture_output=True, text=True).stdout.strip()
+    devices = subprocess.run(["docker", "exec", container, "printenv", "HABANA_VISIBLE_DEVICES"],
+                             capture_output=True, text=True).stdout.strip()
+    if cpuset:
+        tags["cpuset"] = cpuset
+    if devices:
+        tags["devices"] = devices
+    return tags
+
+
+def dataset_name(path):
+    return os.path.splitext(os.path.basename(path))[0]
+
+
+def run_load(config, env, fields, levels, tags, db_path):
+    """One load generator process over levels; raises RuntimeError if it fails."""
+    command = expand_command(config["load_generator"], fields, levels)
+    child_env = {**os.environ, **env,
+                 "BENCH_TAGS": " ".join(f"{k}={v}" for k, v in tags.items()),
+                 "EMBED_BENCH_RESULTS_DB": os.path.abspath(db_path)}
+    print(f"----{' '.join(command)}", flush=True)
+    code = subprocess.run(command, env=child_env, cwd=config["workdir"]).returncode
+    if code:
+        raise RuntimeError(f"load generator exited with {code}")
+
+
+def cell_name(model, dataset, concurrency):
+    return f"{model}/{dataset_name(dataset)}/c{concurrency}"
+
+
+def format_duration(seconds):
+    hours, rest = divmod(int(seconds), 3600)
+    return f"{hours}h{rest // 60:02d}m" if hours else f"{rest // 60}m{rest % 60:02d}s"
+
+
+class SweepState:
+    """
+    Per-cell status and results of a sweep, written to a JSON file after every change.
+
+    A cell is pending, running, done, noisy (its CI stayed too wide after
+    max_trials) or failed. Its runs in the database are the ones tagged with
+    the sweep id, model and dataset and created after the cell's "since".
+    """
+
+    INCOMPLETE = ("pending", "running")
+
+    def __init__(self, path, data):
+        self.path = path
+        self.data = data
+
+    @classmethod
+    def open(cls, path, config_path, sweep_id, cells):
+        """Resume the state in path, or start one for sweep_id; cells new to the config are added as pending."""
+        if os.path.exists(path):
+            with open(path, encoding="utf8") as f:
+                state = cls(path, json.load(f))
+        else:
+            state = cls(path, {"sweep": sweep_id, "config": config_path, "created": time.time(),
+                               "startup": [], "cells": {}})
+        for name in cells:
+            state.data["cells"].setdefault(name, state.new_cell())
+        state.save()
+        return state
+
+    @staticmethod
+    def new_cell():
+        return {"status": "pending", "trials": 0, "since": time.time(), "duration": 0.0, "stats": {},
+                "unstable": [], "error": None}
+
+    def save(self):
+        tmp = self.path + ".tmp"
+        with open(tmp, "w", encoding="utf8") as f:
+            json.dump(self.data, f, indent=2)
+        os.replace(tmp, self.path)
+
+    def cell(self, name):
+        return self.data["cells"][name]
+
+    def update(self, name, **fields):
+        self.data["cells"][name].update(fields, updated=time.time())
+        self.save()
+
+    def rerun(self, statuses, names):
+        """Reset cells of names with one of statuses to pending; their earlier runs are no longer counted."""
+        reset = [n for n in names if self.cell(n)["status"] in statuses]
+        for name in reset:
+            self.data["cells"][name] = self.new_cell()
+        self.save()
+        return reset
+
+    def add_startup(self, seconds):
+        self.data["startup"].append(seconds)
+        self.save()
+
+    def progress(self, names):
+        """(finished, total, ETA in seconds or None) over names, from the durations of finished cells."""
+        cells = [self.cell(n) for n in names]
+        finished = [c["duration"] for c in cells if c["status"] not in self.INCOMPLETE and c["duration"]]
+        remaining = [n for n, c in zip(names, cells) if c["status"] in self.INCOMPLETE]
+        if not finished:
+            return len(cells) - len(remaining), len(cells), None
+        models = {n.split("/")[0] for n in remaining}
+        startup = sum(self.data["startup"]) / len(self.data["startup"]) if self.data["startup"] else 0.0
+        eta = sum(finished) / len(finished) * len(remaining) + startup * len(models)
+        return len(cells) - len(remaining), len(cells), eta
+
+
+def cell_stats(db_path, tags, since):
+    """{concurrency: (trials, stats)} of the runs with tags created after since[concurrency]."""
+    conn = connect(db_path)
+    where = " AND ".join(f"json_extract(config, '$.tags.{key}') = ?" for key in tags)
+    # a model entry without a variant must not pick up the runs of its variants
+    runs = [r for r in query_runs(conn, None, where, list(tags.values()))
+            if not r["config"].get("interrupted") and r["tags"].get("variant") == tags.get("variant")]
+    result = {}
+    for concurrency, start in since.items():
+        cell = [r for r in runs if r["concurrency"] == concurrency and r["created"] >= start]
+        result[concurrency] = (len(cell), aggregate(conn, cell, seed=0) if cell else {})
+    conn.close()
+    return result
+
+
+def run_dataset(config, env, model, dataset, levels, base_tags, db_path, state):
+    """
+    Trials of the given levels of one model and dataset, recorded in state.
+
+    Trials already in the database (from before a crash) are not repeated;
+    levels whose CI is too wide get more trials up to max_trials. A level
+    whose load run left no run record in the database is marked failed.
+    """
+    fields = {**env, "server": config["server"], "dataset": dataset, "model": model["name"],
+              "variant": model.get("variant", "")}
+    tags = {**base_tags, "model": model["name"], "dataset": dataset_name(dataset)}
+    if model.get("variant"):
+        tags["variant"] = model["variant"]
+    names = {c: cell_name(model_label(model), dataset, c) for c in levels}
+    since = {c: state.cell(names[c])["since"] for c in levels}
+    # trials attempted per level, so a run that lands no record is not repeated forever
+    attempts = {c: trials for c, (trials, _) in cell_stats(db_path, tags, since).items()}
+
+    def run(need, trial):
+        for c in need:
+            state.update(names[c], status="running")
+            attempts[c] += 1
+        start = time.time()
+        run_load(config, env, fields, need, {**tags, "trial": trial}, db_path)
+        # one process ran all levels, each gets an equal share of its time
+        for c in need:
+            state.update(names[c], duration=state.cell(names[c])["duration"] + (time.time() - start) / len(need))
+
+    for trial in range(1, config["trials"] + 1):
+        counts = cell_stats(db_path, tags, since)
+        need = [c for c in levels if counts[c][0] < trial]
+        if need:
+            run(need, trial)
+    while True:
+        stats = cell_stats(db_path, tags, since)
+        noisy = [c for c, (trials, s) in stats.items()
+                 if unstable_metrics(s, config["check"], config["max_width"])
+                 and max(trials, attempts[c]) < config["max_trials"]]
+        if not noisy:
+            break
+        trial = max(attempts[c] for c in noisy) + 1
+        print(f"{model_label(model)} {dataset}: re-running noisy levels {noisy} (trial {trial})", flush=True)
+        run(noisy, trial)
+    for c, (trials, s) in stats.items():
+        if trials < attempts[c]:
+            state.update(names[c], status="failed", trials=trials, stats=s,
+                         error=f"{attempts[c] - trials} of {attempts[c]} trials left no run record in {db_path}")
+            continue
+        unstable = unstable_metrics(s, config["check"], config["max_width"])
+        state.update(names[c], status="noisy" if unstable else "done", trials=trials, stats=s, unstable=unstable,
+                     error=None)
+
+
+def print_progress(state, names):
+    finished, total, eta = state.progress(names)
+    failed = sum(state.cell(n)["status"] == "failed" for n in names)
+    print(f"Progress: {finished}/{total} cells finished" + (f" ({failed} failed)" if failed else "")
+          + (f", ETA {format_duration(eta)}" if eta is not None and finished < total else ""), flush=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run a model x dataset x concurrency benchmark sweep",
+                                     formatter_class=argparse.RawDescriptionHelpFormatter, epilog=__doc__)
+    parser.add_argument("config", type=str, help="Sweep JSON file")
+    parser.add_argument("--db", type=str, default=DEFAULT_DB, help=f"Results database (default: {DEFAULT_DB})")
+    parser.add_argument("--models", type=str, nargs="+", default=None, help="Only these models of the config")
+    parser.add_argument("--state", type=str, default=None,
+                        help="Sweep state file, resumed if it exists (default: <name>.state.json)")
+    parser.add_argument("--restart", action="store_true", help="Discard the state file and start a new sweep")
+    parser.add_argument("--rerun", type=str, nargs="+", default=[], choices=["failed", "noisy"],
+                        help="Run cells with these statuses again, from scratch")
+    args = parser.parse_args()
+
+    config = load_config(args.config)
+    labels = [model_label(m) for m in config["models"]]
+    if len(set(labels)) < len(labels):
+        parser.error(f"{args.config}: model entries need distinct name/variant pairs")
+    models = [m for m in config["models"]
+              if not args.models or m["name"] in args.models or model_label(m) in args.models]
+    datasets = {model_label(m): m.get("datasets", config.get("datasets", [])) for m in models}
+    names = [cell_name(label, d, c) for label in datasets for d in datasets[label] for c in config["concurrency"]]
+    state_path = args.state or f"{config['name']}.state.json"
+    if args.restart and os.path.exists(state_path):
+        os.remove(state_path)
+    state = SweepState.open(state_path, args.config, f"{config['name']}-{time.strftime('%Y%m%d-%H%M%S')}", names)
+    sweep_id = state.data["sweep"]
+    if args.rerun:
+        print(f"Re-running {len(state.rerun(args.rerun, names))} {'/'.join(args.rerun)} cells")
+    print(f"Sweep {sweep_id} ({state_path}): {len(models)} models, concurrency {config['concurrency']}")
+    print_progress(state, names)
+
+    for model in models:
+        label = model_label(model)
+        todo = {d: [c for c in config["concurrency"]
+                    if state.cell(cell_name(label, d, c))["status"] in SweepState.INCOMPLETE]
+                for d in datasets[label]}
+        if not any(todo.values()):
+            continue
+        env = model_env(config, model)
+        try:
+            start = time.time()
+            if config.get("compose_file"):
+                start_server(config, env)
+            waited = wait_ready(config["server"], config["probe"], config["ready_timeout"],
+                                config.get("container") if config.get("compose_file") else None)
+            state.add_startup(time.time() - start)
+            print(f"{label}: server ready after {waited:.1f}s", flush=True)
+            tags = {**config.get("tags", {}), **resource_tags(config), "sweep": sweep_id}
+        except (subprocess.CalledProcessError, TimeoutError, RuntimeError) as e:
+            print(f"Error: {label}: {e}")
+            for d, levels in todo.items():
+                for c in levels:
+                    state.update(cell_name(label, d, c), status="failed", error=str(e))
+            continue
+        for dataset, levels in todo.items():
+            if not levels:
+                continue
+            try:
+                run_dataset(config, env, model, dataset, levels, tags, args.db, state)
+            except RuntimeError as e:
+                print(f"Error: {label} {dataset}: {e}")
+                for c in levels:
+                    if state.cell(cell_name(label, dataset, c))["status"] in SweepState.INCOMPLETE:
+                        state.update(cell_name(label, dataset, c), status="failed", error=str(e))
+            print_progress(state, names)
+
+    print(f"\n===== Sweep {sweep_id} =====")
+    failed = 0
+    for name in names:
+        cell = state.cell(name)
+        if cell["status"] == "failed":
+            failed += 1
+            print(f"{name}: FAILED ({cell['error']})")
+        elif cell["stats"]:
+            print(f"{name}: {cell['trials']} trials, {format_stats(cell['stats'])}"
+                  + (f"  UNSTABLE ({', '.join(cell['unstable'])})" if cell["unstable"] else ""))
+    if failed:
+        print(f"{failed} cells failed, run again with --rerun failed")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,53 @@
+import os
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, "log_parser"))
+
+from import_logs import import_file, rerank_log_record
+from results_db import connect, insert_record, query_runs
+
+STRESS_LOG = """总请求数: 320
+QPS: {qps} 请求/秒
+总耗时: 20.0 秒
+平均值: 0.10s
+中位数: 0.09s
+P90: 0.15s
+P95: 0.18s
+P99: 0.25s
+"""
+
+
+def write_log(directory, name, content):
+    path = os.path.join(str(directory), name)
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(content)
+    return path
+
+
+def test_trial_prefixed_stress_logs_join_one_cell(tmp_path):
+    first = write_log(tmp_path, "1_hpu_bge-m3_21_512_16_20250701_101500.log", STRESS_LOG.format(qps=16.0))
+    second = write_log(tmp_path, "hpu_bge-m3_21_512_16_20250701_103000.log", STRESS_LOG.format(qps=16.5))
+
+    conn = connect(str(tmp_path / "results.db"))
+    for path in [first, second]:
+        assert insert_record(conn, import_file(path, {}))
+    runs = query_runs(conn)
+
+    assert [r["tags"]["hardware"] for r in runs] == ["hpu", "hpu"]
+    assert [r["tags"].get("trial") for r in runs] == ["1", None]
+    # trials.py report keys its cells this way, compare_runs/compare_hardware on the same fields
+    cells = {(r["tool"], r["tags"]["hardware"], r["model"], r["dataset"], r["concurrency"]) for r in runs}
+    assert cells == {("stress_benchmark", "hpu", "bge-m3", "21_512", 16)}
+
+
+def test_rerank_requests_with_more_workers_than_queries(tmp_path):
+    content = "Total Concurrency: 8\nTotal Requests: 5\nTotal Test time: 3.0\n"
+    path = write_log(tmp_path, "hpu_500_bge-reranker-v2-m3_8_20250701_101500.log", content)
+
+    record = rerank_log_record(path, content, {})
+
+    # workers 0-4 send 5, 4, 3, 2, 1 requests, workers 5-7 none
+    assert record["summary"]["total_requests"] == 15
+    assert record["summary"]["requests_per_sec"] == 5.0
@@ -0,0 +1,181 @@
+#!/usr/bin/env python3
+"""
+Repeated trials per benchmark cell, aggregated with bootstrap confidence intervals.
+
+A cell is one model x dataset x concurrency on one hardware. `run` executes
+a load generator command K times, tagging every run record with
+cell=<name> trial=<i> (through BENCH_TAGS, which stress_benchmark.py and
+rerank_bench/concurrent_bench.py both read), then aggregates the trials:
+
+  qps          mean over trials, CI from resampling the trials
+  p50 ... p99  percentiles of the pooled latency histograms, CI from
+               resampling trials and then requests (bench_stats.py)
+
+A cell is unstable when the CI of any --check metric is wider than
+--max_width relative to its value; `run` then adds trials one at a time
+until it is stable or has --max_trials. `report` aggregates every cell in the
+database the same way (cells are grouped by tool, hardware, model, dataset
+and concurrency) and lists the unstable ones.
+
+Example:
+    python trials.py run --cell bge-m3/21_512/c16 -k 2 --max_trials 4 -- bash stress.sh embedding 16 21_512.json json
+    python trials.py report --hardware hpu
+"""
+
+import argparse
+import os
+import subprocess
+import sys
+import time
+
+import numpy as np
+
+from bench_stats import (CONFIDENCE, N_RESAMPLES, bootstrap_histogram_percentiles, bootstrap_means,
+                         histogram_percentiles, interval, relative_width)
+from results_db import (DEFAULT_DB, LATENCY_BUCKETS, LATENCY_HISTOGRAM, connect, histogram_counts, query_runs,
+                        run_metrics)
+
+PERCENTILES = [50, 90, 95, 99]
+LE = LATENCY_BUCKETS + [float("inf")]
+
+
+def aggregate(conn, runs, confidence=CONFIDENCE, n_resamples=N_RESAMPLES, seed=None):
+    """{metric: {"value", "low", "high", "width"}} over the trials of one cell, latencies in seconds."""
+    rng = np.random.default_rng(seed)
+    qps = [run_metrics(r)["qps"] for r in runs if run_metrics(r)["qps"]]
+    stats = {}
+    if qps:
+        low, high = interval(bootstrap_means(qps, n_resamples, rng), confidence)
+        value = float(np.mean(qps))
+        stats["qps"] = {"value": value, "low": low, "high": high, "width": relative_width(low, high, value)}
+    counts = [histogram_counts(conn, r["run_id"], LATENCY_HISTOGRAM[r["tool"]]) for r in runs]
+    counts = [c for c in counts if c and sum(c)]
+    if counts:
+        point = histogram_percentiles(np.sum(counts, axis=0), LE, PERCENTILES)
+        resampled = bootstrap_histogram_percentiles(counts, LE, PERCENTILES, n_resamples, rng)
+        for p in PERCENTILES:
+            low, high = interval(resampled[p], confidence)
+            value = float(point[p][0])
+            stats[f"p{p}"] = {"value": value, "low": low, "high": high, "width": relative_width(low, high, value)}
+    return stats
+
+
+def unstable_metrics(stats, check, max_width):
+    """Checked metrics whose relative CI width exceeds max_width."""
+    return [name for name in check if name in stats and stats[name]["width"] > max_width]
+
+
+def format_stats(stats):
+    parts = []
+    for name, s in stats.items():
+        scale, unit = (1, "") if name == "qps" else (1000, "ms")
+        parts.append(f"{name} {s['value'] * scale:.2f}{unit} [{s['low'] * scale:.2f}, {s['high'] * scale:.2f}] "
+                     f"(width {s['width']:.1%})")
+    return ", ".join(parts)
+
+
+def run_trial(command, cell, trial, db_path):
+    env = dict(os.environ)
+    env["BENCH_TAGS"] = f"{env.get('BENCH_TAGS', '')} cell={cell} trial={trial}".strip()
+    env["EMBED_BENCH_RESULTS_DB"] = os.path.abspath(db_path)
+    print(f"----trial {trial} of {cell}: {' '.join(command)}", flush=True)
+    return subprocess.run(command, env=env).returncode
+
+
+def cell_runs(conn, cell, since):
+    runs = query_runs(conn, None, "json_extract(config, '$.tags.cell') = ? AND created >= ?", [cell, since])
+    # levels stopped early by Ctrl-C (stress_benchmark.py) are not trials
+    return [r for r in runs if not r["config"].get("interrupted")]
+
+
+def run_cell(command, cell, db_path, trials=2, max_trials=4, check=("qps", "p50", "p99"), max_width=0.1,
+             confidence=CONFIDENCE):
+    """
+    Run trials of a cell until its CIs are narrow enough or max_trials ran.
+
+    Returns (stats, runs, unstable metric names); raises RuntimeError if a
+    trial's command fails.
+    """
+    since = time.time()
+    done = 0
+    while True:
+        while done < trials:
+            code = run_trial(command, cell, done + 1, db_path)
+            if code:
+                raise RuntimeError(f"trial {done + 1} of {cell} exited with {code}")
+            done += 1
+        conn = connect(db_path)
+        runs = cell_runs(conn, cell, since)
+        stats = aggregate(conn, runs, confidence)
+        conn.close()
+        if not runs:
+            raise RuntimeError(f"no run records of {cell} in {db_path}, is the load generator writing to it?")
+        unstable = unstable_metrics(stats, check, max_width)
+        print(f"{cell}: {len(runs)} trials, {format_stats(stats)}", flush=True)
+        if not unstable or done >= max_trials:
+            return stats, runs, unstable
+        print(f"{cell}: CI of {', '.join(unstable)} wider than {max_width:.0%}, running another trial", flush=True)
+        trials = done + 1
+
+
+def report(conn, runs, check, max_width, confidence):
+    cells = {}
+    for run in runs:
+        if run["concurrency"] is not None and not run["config"].get("interrupted"):
+            # sweep.py variants (e.g. pooling modes) of one model are separate cells
+            model = (run["model"] or "") + (f"@{run['tags']['variant']}" if run["tags"].get("variant") else "")
+            key = (run["tool"], run["tags"].get("hardware", ""), model, run["dataset"] or "", run["concurrency"])
+            cells.setdefault(key, []).append(run)
+    unstable_cells = 0
+    for key in sorted(cells):
+        tool, hardware, model, dataset, concurrency = key
+        stats = aggregate(conn, cells[key], confidence, seed=0)
+        unstable = unstable_metrics(stats, check, max_width)
+        unstable_cells += bool(unstable)
+        print(f"{tool} {hardware} {model} {dataset} c={concurrency}: {len(cells[key])} trials, {format_stats(stats)}"
+              + (f"  UNSTABLE ({', '.join(unstable)})" if unstable else ""))
+    print(f"\n{len(cells)} cells, {unstable_cells} with a CI wider than {max_width:.0%}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Repeated benchmark trials with confidence intervals",
+                                     formatter_class=argparse.RawDescriptionHelpFormatter, epilog=__doc__)
+    parser.add_argument("--db", type=str, default=DEFAULT_DB, help=f"Results database (default: {DEFAULT_DB})")
+    parser.add_argument("--check", type=str, nargs="+", default=["qps", "p50", "p99"],
+                        help="Metrics whose CI decides stability (default: qps p50 p99)")
+    parser.add_argument("--max_width", type=float, default=0.1,
+                        help="Largest CI width relative to the value of a stable cell (default: 0.1)")
+    parser.add_argument("--confidence", type=float, default=CONFIDENCE, help="Confidence level (default: 0.95)")
+    sub = parser.add_subparsers(dest="command", required=True)
+    run_parser = sub.add_parser("run", help="Run trials of one cell, re-running while it is unstable")
+    run_parser.add_argument("--cell", type=str, required=True, help="Cell name stored as the cell tag")
+    run_parser.add_argument("-k", "--trials", type=int, default=2, help="Trials to run (default: 2)")
+    run_parser.add_argument("--max_trials", type=int, default=4,
+                            help="Trials at most, including re-runs of an unstable cell (default: 4)")
+    run_parser.add_argument("benchmark", nargs=argparse.REMAINDER, help="-- load generator command")
+    report_parser = sub.add_parser("report", help="Aggregate every cell in the database")
+    report_parser.add_argument("--tool", type=str, default=None, choices=["stress_benchmark", "concurrent_bench"])
+    report_parser.add_argument("--hardware", type=str, default=None, help="Only runs with this hardware tag")
+    args = parser.parse_args()
+
+    if args.command == "run":
+        command = args.benchmark[1:] if args.benchmark[:1] == ["--"] else args.benchmark
+        if not command:
+            parser.error("run needs a load generator command after --")
+        try:
+            _, _, unstable = run_cell(command, args.cell, args.db, args.trials, max(args.max_trials, args.trials),
+                                      args.check, args.max_width, args.confidence)
+        except RuntimeError as e:
+            print(f"Error: {e}")
+            sys.exit(1)
+        if unstable:
+            print(f"{args.cell}: still unstable after {max(args.max_trials, args.trials)} trials ({', '.join(unstable)})")
+    else:
+        conn = connect(args.db)
+        where, params = ("json_extract(config, '$.tags.hardware') = ?", [args.hardware]) if args.hardware else ("", [])
+        report(conn, query_runs(conn, args.tool, where, params), args.check, args.max_width, args.confidence)
+        conn.close()
+
+
+if __name__ == "__main__":
+    main()